@@ -4,8 +4,12 @@ Seguindo estrutura modular (R001)
 """
 
 from . import config
+from . import cache
+from . import database
+from . import lake
 from . import loader
 from . import metrics
 from . import charts
+from . import snapshot
 
-__all__ = ['config', 'loader', 'metrics', 'charts']
+__all__ = ['config', 'cache', 'database', 'lake', 'loader', 'metrics', 'charts', 'snapshot']
@@ -117,12 +117,13 @@ class SRAGAgent:
         logger.error(f"Todas as chaves de API falharam. Último erro: {last_error}")
         return "Erro ao gerar insights de dados.", "Erro ao gerar insights de notícias."
 
-    def analyze_status(self) -> Dict[str, Any]:
+    def analyze_status(self, grids: bool = False) -> Dict[str, Any]:
         """
         Orquestração (R304):
         1. Busca métricas no banco
         2. Busca notícias recentes
         3. Sintetiza com LLM (com retry/fallback)
+        grids: gera também as grades por UF e faixa etária (seção de recortes do relatório)
         """
         logger.info("Agente iniciando análise...")
         
@@ -130,7 +131,7 @@ class SRAGAgent:
         metrics_data = self.db_tool.get_all_metrics()
         
         # 1.5. Generate Charts
-        charts_paths = self.db_tool.generate_charts(output_dir=config.OUTPUTS / "assets")
+        charts_paths = self.db_tool.generate_charts(output_dir=config.OUTPUTS / "assets", grids=grids)
         
         # 2. News Tool (R302)
         news_data = self.news_tool.fetch_srag_news()
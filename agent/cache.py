@@ -0,0 +1,155 @@
+"""
+Cache de dados em processo
+Leituras do banco e resultados derivados versionados por (mtime do arquivo, geração da ingestão),
+com limite de memória e descarte LRU
+"""
+
+import copy
+import pickle
+import sqlite3
+import logging
+import threading
+import pandas as pd
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from . import config, database
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# VERSÃO DO BANCO
+# ============================================================
+
+# Assinatura dos arquivos (mtime_ns, tamanho do banco e do -wal) -> geração lida do banco, por caminho
+_generations: Dict[str, Tuple[Tuple[int, ...], int]] = {}
+
+def read_generation(conn: sqlite3.Connection) -> int:
+    """Geração da ingestão registrada em config.METADATA_TABLE (0 se ainda não houver)."""
+    try:
+        row = conn.execute(
+            f"SELECT valor FROM {config.METADATA_TABLE} WHERE chave = 'geracao'"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return int(row[0]) if row else 0
+
+def _wal_stat(db_path: Path) -> Tuple[int, int]:
+    """(mtime_ns, tamanho) do arquivo -wal: em modo WAL os commits só chegam ao banco no checkpoint."""
+    try:
+        stat = Path(f"{db_path}-wal").stat()
+    except FileNotFoundError:
+        return 0, 0
+    return stat.st_mtime_ns, stat.st_size
+
+def database_version(db_path: Path) -> Optional[Tuple[int, int]]:
+    """
+    Versão do banco: (mtime_ns mais recente entre banco e -wal, geração da ingestão).
+    A geração só é relida do SQLite quando um dos arquivos muda no disco.
+    Returns: None se o banco não existir
+    """
+    try:
+        stat = Path(db_path).stat()
+    except FileNotFoundError:
+        return None
+    
+    wal_mtime, wal_size = _wal_stat(db_path)
+    signature = (stat.st_mtime_ns, stat.st_size, wal_mtime, wal_size)
+    known = _generations.get(str(db_path))
+    if known is None or known[0] != signature:
+        with database.read_connection(db_path) as conn:
+            known = (signature, read_generation(conn))
+        _generations[str(db_path)] = known
+    return max(stat.st_mtime_ns, wal_mtime), known[1]
+
+# ============================================================
+# CACHE LRU
+# ============================================================
+
+def _sizeof(value: Any) -> int:
+    """Tamanho aproximado em bytes de um valor cacheado."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+# Copy-on-write é sempre ativo a partir do pandas 3 (a opção mode.copy_on_write foi descontinuada)
+_PANDAS_COW = int(pd.__version__.split('.')[0]) >= 3
+
+def _copy_on_write() -> bool:
+    """Copy-on-write ativo: pandas 3, ou pandas 2 com pd.options.mode.copy_on_write = True."""
+    return _PANDAS_COW or pd.options.mode.copy_on_write is True
+
+def _detach(value: Any) -> Any:
+    """Cópia entregue ao chamador, para que alterações não contaminem o cache."""
+    if isinstance(value, pd.DataFrame):
+        # Com copy-on-write a cópia rasa basta (escritas copiam o bloco); sem ele, alterações
+        # in-place (df.loc[...] = ...) chegariam aos arrays do cache
+        return value.copy(deep=not _copy_on_write())
+    return copy.deepcopy(value)
+
+class DataCache:
+    """
+    Cache LRU com limite de memória, compartilhado entre loader e DatabaseTool.
+    Cada entrada guarda a versão do banco em que foi calculada e é recalculada quando ela muda.
+    """
+    
+    def __init__(self, max_bytes: int = config.CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[Any, Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+    
+    def get_or_load(self, db_path: Path, key: Hashable, load: Callable[[], Any]) -> Any:
+        """Retorna o valor cacheado para a versão atual do banco ou o calcula com load()."""
+        version = database_version(db_path)
+        if version is None:
+            return load()
+        
+        entry_key = (str(db_path), key)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(entry_key)
+                return _detach(entry[1])
+            self._discard_stale(str(db_path), version)
+        
+        value = load()
+        size = _sizeof(value)
+        with self._lock:
+            self._remove(entry_key)
+            if size <= self.max_bytes:
+                self._entries[entry_key] = (version, value, size)
+                self._bytes += size
+                self._evict()
+        return _detach(value)
+    
+    def discard(self, db_path: Path, key: Hashable):
+        """Remove uma entrada (ex: arquivo derivado apagado do disco)."""
+        with self._lock:
+            self._remove((str(db_path), key))
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def _remove(self, entry_key: Tuple[str, Hashable]):
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+    
+    def _discard_stale(self, db_path: str, version: Tuple[int, int]):
+        """Descarta entradas de versões anteriores do mesmo banco (nunca mais serão usadas)."""
+        stale = [k for k, (v, _, _) in self._entries.items() if k[0] == db_path and v != version]
+        for entry_key in stale:
+            self._remove(entry_key)
+    
+    def _evict(self):
+        """Descarta as entradas menos usadas até caber em max_bytes."""
+        while self._bytes > self.max_bytes and self._entries:
+            entry_key, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            logger.debug(f"Cache: descartado {entry_key[1]} ({size} bytes)")
+
+# Instância do processo (sobrevive aos reruns do Streamlit, que reutilizam os módulos)
+data_cache = DataCache()
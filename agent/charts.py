@@ -1,21 +1,126 @@
 """
 Módulo de geração de gráficos SRAG
-Implementa as visualizações obrigatórias (diária e mensal)
+Implementa as visualizações obrigatórias (diária e mensal) e seus recortes por UF e faixa etária
+Renderização headless (Agg) com a API orientada a objetos: as figuras não entram no
+registro global do pyplot e são liberadas ao final de cada renderização.
 """
 
-import matplotlib.pyplot as plt
+import io
+import os
+import re
+import hashlib
+import threading
+import matplotlib
+import matplotlib.dates as mdates
+import matplotlib.style
 import pandas as pd
 import numpy as np
-from datetime import timedelta
-from typing import Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import wraps
+from pathlib import Path
+from matplotlib.artist import setp
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from typing import Any, Callable, Dict, Hashable, List, Sequence, Tuple, Optional, Union
 import logging
 from . import config
-from .metrics import get_effective_end_date
+from .metrics import MISSING_DAY, NS_PER_DAY, day_array, effective_end_date_from_counts
+
+# Sem janelas nem toolkit gráfico (servidor/agente); vale também para quem usar pyplot
+matplotlib.use('Agg')
 
 logger = logging.getLogger(__name__)
 
-# Configurar estilo
-plt.style.use(config.PLOT_STYLE)
+def _new_figure(figsize: Tuple[int, int]) -> Tuple[Figure, "matplotlib.axes.Axes"]:
+    """Figura Agg independente do pyplot (coletada quando não há mais referências)."""
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.subplots()
+
+def _group_title(group: Optional[str]) -> str:
+    return f" - {group}" if group else ""
+
+def _styled(plot: Callable[..., Figure]) -> Callable[..., Figure]:
+    """Aplica config.PLOT_STYLE só durante o desenho (sem alterar o rcParams global)."""
+    @wraps(plot)
+    def wrapper(*args, **kwargs) -> Figure:
+        with matplotlib.style.context(config.PLOT_STYLE):
+            return plot(*args, **kwargs)
+    return wrapper
+
+# ============================================================
+# AGREGAÇÃO EM ARRAYS DE DIAS (Custo independente do número de casos)
+# ============================================================
+
+def _bin_days(days: np.ndarray) -> Tuple[int, np.ndarray]:
+    """Dias int64 (um por caso, MISSING_DAY se ausente) -> (primeiro dia, casos por dia) via bincount."""
+    days = np.asarray(days, dtype=np.int64)
+    valid = days[days != MISSING_DAY]
+    if valid.size == 0:
+        return 0, np.empty(0, dtype=np.int64)
+    first = int(valid.min())
+    return first, np.bincount(valid - first)
+
+def _bin_counts(daily_counts: pd.Series) -> Tuple[int, np.ndarray]:
+    """Contagens já agregadas (índice = dia, valores = casos) -> (primeiro dia, casos por dia)."""
+    days = day_array(pd.Series(daily_counts.index))
+    counts = np.asarray(daily_counts, dtype=np.int64)
+    valid = (days != MISSING_DAY) & (counts > 0)
+    days, counts = days[valid], counts[valid]
+    if days.size == 0:
+        return 0, np.empty(0, dtype=np.int64)
+    first = int(days.min())
+    binned = np.zeros(int(days.max()) - first + 1, dtype=np.int64)
+    np.add.at(binned, days - first, counts)
+    return first, binned
+
+def _day_index(first: int, size: int) -> np.ndarray:
+    return (first + np.arange(size, dtype=np.int64)).astype('datetime64[D]')
+
+def _effective_end(first: int, binned: np.ndarray, reference_date: Optional[pd.Timestamp]) -> pd.Timestamp:
+    """reference_date se informada; senão o P99.5 (metrics) calculado sobre os dias, não sobre os casos."""
+    if reference_date is not None:
+        return pd.Timestamp(reference_date)
+    return effective_end_date_from_counts(_day_index(first, binned.size), binned)
+
+def _daily_window(first: int, binned: np.ndarray, max_date: pd.Timestamp, last_n_days: int) -> pd.Series:
+    """Dias com casos em [max_date - last_n_days, max_date] (mesmos limites da comparação com datas)."""
+    upper = max_date.value
+    lower = upper - last_n_days * NS_PER_DAY
+    start = max(-(-lower // NS_PER_DAY) - first, 0)
+    stop = max(upper // NS_PER_DAY - first + 1, start)
+    window = binned[start:stop]
+    present = np.flatnonzero(window)
+    return pd.Series(window[present], index=pd.DatetimeIndex(_day_index(first + start, window.size)[present]))
+
+def _monthly_bins(first: int, binned: np.ndarray, max_date: pd.Timestamp) -> pd.Series:
+    """Casos por mês (PeriodIndex) dos dias até max_date; só meses com casos."""
+    binned = binned[:max(max_date.value // NS_PER_DAY - first + 1, 0)]
+    if binned.size == 0:
+        return pd.Series(np.empty(0, dtype=np.int64), index=pd.PeriodIndex([], freq='M'))
+    months = _day_index(first, binned.size).astype('datetime64[M]')
+    # Dias contíguos e ordenados: cada mês é um segmento do array (soma por reduceat)
+    starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+    totals = np.add.reduceat(binned, starts)
+    present = totals > 0
+    return pd.Series(totals[present], index=pd.DatetimeIndex(months[starts][present]).to_period('M'))
+
+def _moving_average(values: np.ndarray, window: int = 7) -> np.ndarray:
+    """
+    Média móvel centrada, igual a rolling(window, center=True).mean() para window ímpar:
+    diferenças da soma acumulada inteira (exata), NaN nas pontas.
+    """
+    average = np.full(values.size, np.nan)
+    if values.size >= window:
+        cumulative = np.concatenate(([0], np.cumsum(values, dtype=np.int64)))
+        half = window // 2
+        average[half:values.size - half] = (cumulative[window:] - cumulative[:-window]) / window
+    return average
+
+# ============================================================
+# GRÁFICOS (R211-R212)
+# ============================================================
 
 def plot_daily_cases(
     df: pd.DataFrame,
@@ -23,31 +128,60 @@ def plot_daily_cases(
     last_n_days: int = 30,
     figsize: Tuple[int, int] = (14, 6),
     save_path: Optional[str] = None
-) -> plt.Figure:
+) -> Figure:
     """
     Plota casos diários (últimos 30 dias).
     R211: Gráfico de linha, labels nos eixos, salva como PNG.
+    A tabela de casos não é copiada: a coluna de datas vira um array de dias (plot_daily_days).
     """
-    # Preparar dados
-    df = df.copy()
-    df[date_column] = pd.to_datetime(df[date_column], errors='coerce')
-    df = df[df[date_column].notna()]
-    
-    # Filtrar últimos N dias
-    # Filtrar últimos N dias
-    # Usar get_effective_end_date para consistência com métricas (ignorar outliers 2021)
-    max_date = get_effective_end_date(df, date_column)
-    min_date = max_date - timedelta(days=last_n_days)
-    df_filtered = df[df[date_column] >= min_date]
-    # Filtrar também limite superior para não aparecer o outlier se plotar além
-    df_filtered = df_filtered[df_filtered[date_column] <= max_date]
-    
-    # Contar casos por dia
-    daily_cases = df_filtered.groupby(df_filtered[date_column].dt.date).size()
-    daily_cases.index = pd.to_datetime(daily_cases.index)
-    
+    return plot_daily_days(day_array(df[date_column]), last_n_days, figsize, save_path)
+
+def plot_daily_days(
+    days: np.ndarray,
+    last_n_days: int = 30,
+    figsize: Tuple[int, int] = (14, 6),
+    save_path: Optional[str] = None,
+    reference_date: Optional[pd.Timestamp] = None
+) -> Figure:
+    """
+    Mesmo gráfico de plot_daily_cases a partir de dias int64, um por caso
+    (metrics.day_array ou loader.load_snapshot()['dt_notificacao'], sem cópia).
+    reference_date: data efetiva registrada na ingestão; None = calcular o P99.5
+    """
+    first, binned = _bin_days(days)
+    # Usar a data efetiva (P99.5) para consistência com métricas (ignorar outliers 2021)
+    max_date = _effective_end(first, binned, reference_date)
+    return _plot_daily(_daily_window(first, binned, max_date, last_n_days), last_n_days, figsize, save_path)
+
+def plot_daily_counts(
+    daily_counts: pd.Series,
+    last_n_days: int = 30,
+    figsize: Tuple[int, int] = (14, 6),
+    save_path: Optional[str] = None,
+    reference_date: Optional[pd.Timestamp] = None,
+    group: Optional[str] = None
+) -> Figure:
+    """
+    Mesmo gráfico de plot_daily_cases a partir de contagens diárias já agregadas
+    (índice = dia, valores = casos; ex: loader.load_daily_rollup().set_index('dia')['casos']).
+    reference_date: data efetiva registrada na ingestão; None = calcular o P99.5 das contagens
+    group: grupo exibido no título (ex: UF dos pacotes de render_chart_pack)
+    """
+    first, binned = _bin_counts(daily_counts)
+    max_date = _effective_end(first, binned, reference_date)
+    return _plot_daily(_daily_window(first, binned, max_date, last_n_days), last_n_days, figsize, save_path, group)
+
+@_styled
+def _plot_daily(
+    daily_cases: pd.Series,
+    last_n_days: int,
+    figsize: Tuple[int, int],
+    save_path: Optional[str],
+    group: Optional[str] = None
+) -> Figure:
+    """Desenha a série diária (R211) e salva como PNG se save_path for informado."""
     # Criar figura
-    fig, ax = plt.subplots(figsize=figsize)
+    fig, ax = _new_figure(figsize)
     
     # Plot
     ax.plot(daily_cases.index, daily_cases.values, 
@@ -56,21 +190,21 @@ def plot_daily_cases(
     
     # Adicionar média móvel de 7 dias
     if len(daily_cases) >= 7:
-        ma_7 = daily_cases.rolling(window=7, center=True).mean()
-        ax.plot(ma_7.index, ma_7.values, 
+        ma_7 = _moving_average(daily_cases.to_numpy())
+        ax.plot(daily_cases.index, ma_7, 
                 linewidth=2.5, color='#F18F01', 
                 linestyle='--', label='Média Móvel (7 dias)')
     
     # Formatação (R211)
-    ax.set_title(f'Casos Diários de SRAG - Últimos {last_n_days} Dias', 
+    ax.set_title(f'Casos Diários de SRAG{_group_title(group)} - Últimos {last_n_days} Dias', 
                 fontsize=14, fontweight='bold', pad=20)
     ax.set_xlabel('Data (DD/MM)', fontsize=12)
     ax.set_ylabel('Número de Casos', fontsize=12)
     ax.grid(True, alpha=0.3, linestyle='--')
     ax.legend(loc='upper left', fontsize=10)
     
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
+    setp(ax.get_xticklabels(), rotation=45, ha='right')
+    fig.tight_layout()
     
     if save_path:
         fig.savefig(save_path, dpi=config.DPI, bbox_inches='tight')
@@ -84,24 +218,57 @@ def plot_monthly_cases(
     last_n_months: int = 12,
     figsize: Tuple[int, int] = (14, 6),
     save_path: Optional[str] = None
-) -> plt.Figure:
+) -> Figure:
     """
     Plota casos mensais (últimos 12 meses).
     R212: Gráfico de barras, labels nos eixos, salva como PNG.
+    A tabela de casos não é copiada: a coluna de datas vira um array de dias (plot_monthly_days).
     """
-    # Preparar dados
-    df = df.copy()
-    df[date_column] = pd.to_datetime(df[date_column], errors='coerce')
-    df = df[df[date_column].notna()]
+    return plot_monthly_days(day_array(df[date_column]), last_n_months, figsize, save_path)
 
-    # Filtrar até data efetiva para tirar o mês vazio de 2021
-    max_date = get_effective_end_date(df, date_column)
-    df = df[df[date_column] <= max_date]
-    
-    # Agrupar por mês
-    df['month'] = df[date_column].dt.to_period('M')
-    monthly_cases = df.groupby('month').size().sort_index()
-    
+def plot_monthly_days(
+    days: np.ndarray,
+    last_n_months: int = 12,
+    figsize: Tuple[int, int] = (14, 6),
+    save_path: Optional[str] = None,
+    reference_date: Optional[pd.Timestamp] = None
+) -> Figure:
+    """
+    Mesmo gráfico de plot_monthly_cases a partir de dias int64, um por caso.
+    reference_date: data efetiva registrada na ingestão; None = calcular o P99.5
+    """
+    first, binned = _bin_days(days)
+    # Filtrar até a data efetiva para tirar o mês vazio de 2021
+    max_date = _effective_end(first, binned, reference_date)
+    return _plot_monthly(_monthly_bins(first, binned, max_date), last_n_months, figsize, save_path)
+
+def plot_monthly_counts(
+    daily_counts: pd.Series,
+    last_n_months: int = 12,
+    figsize: Tuple[int, int] = (14, 6),
+    save_path: Optional[str] = None,
+    reference_date: Optional[pd.Timestamp] = None,
+    group: Optional[str] = None
+) -> Figure:
+    """
+    Mesmo gráfico de plot_monthly_cases a partir de contagens diárias já agregadas
+    (índice = dia, valores = casos; ex: rollup diário do banco).
+    reference_date: data efetiva registrada na ingestão; None = calcular o P99.5 das contagens
+    group: grupo exibido no título (ex: UF dos pacotes de render_chart_pack)
+    """
+    first, binned = _bin_counts(daily_counts)
+    max_date = _effective_end(first, binned, reference_date)
+    return _plot_monthly(_monthly_bins(first, binned, max_date), last_n_months, figsize, save_path, group)
+
+@_styled
+def _plot_monthly(
+    monthly_cases: pd.Series,
+    last_n_months: int,
+    figsize: Tuple[int, int],
+    save_path: Optional[str],
+    group: Optional[str] = None
+) -> Figure:
+    """Desenha a série mensal (R212) e salva como PNG se save_path for informado."""
     # Filtrar últimos N meses
     if len(monthly_cases) > last_n_months:
         monthly_cases = monthly_cases.iloc[-last_n_months:]
@@ -110,7 +277,7 @@ def plot_monthly_cases(
     monthly_cases.index = monthly_cases.index.to_timestamp()
     
     # Criar figura
-    fig, ax = plt.subplots(figsize=figsize)
+    fig, ax = _new_figure(figsize)
     
     # Plot de barras (R212)
     bars = ax.bar(monthly_cases.index, monthly_cases.values, 
@@ -118,13 +285,13 @@ def plot_monthly_cases(
                   edgecolor='black', linewidth=1.2)
     
     # Formatação
-    ax.set_title(f'Casos Mensais de SRAG - Últimos {last_n_months} Meses', 
+    ax.set_title(f'Casos Mensais de SRAG{_group_title(group)} - Últimos {last_n_months} Meses', 
                 fontsize=14, fontweight='bold', pad=20)
     ax.set_xlabel('Mês/Ano (MM/YYYY)', fontsize=12)
     ax.set_ylabel('Número de Casos', fontsize=12)
     ax.grid(True, alpha=0.3, linestyle='--', axis='y')
     
-    plt.xticks(rotation=45, ha='right')
+    setp(ax.get_xticklabels(), rotation=45, ha='right')
     
     # Adicionar valores nas barras
     for bar in bars:
@@ -133,10 +300,395 @@ def plot_monthly_cases(
                 f'{int(height):,}',
                 ha='center', va='bottom', fontsize=9)
     
-    plt.tight_layout()
+    fig.tight_layout()
     
     if save_path:
         fig.savefig(save_path, dpi=config.DPI, bbox_inches='tight')
         logger.info(f"💾 Gráfico mensal salvo em: {save_path}")
     
     return fig
+
+# ============================================================
+# RECORTES POR GRUPO (UF e faixa etária)
+# ============================================================
+
+# Dimensões dos pacotes de gráficos (coluna do rollup -> rótulo nos títulos)
+PACK_DIMENSIONS: Dict[str, str] = {
+    'uf_sigla': 'UF',
+    'faixa_etaria': 'Faixa Etária',
+}
+
+def pack_groups(by: str) -> List[str]:
+    """Grupos de uma dimensão na ordem dos painéis (UFs por código IBGE, faixas em ordem)."""
+    if by == 'uf_sigla':
+        return list(config.UF_CODES)
+    if by == 'faixa_etaria':
+        return list(config.AGE_BAND_LABELS)
+    raise ValueError(f"Dimensão sem pacote de gráficos: {by} (use {list(PACK_DIMENSIONS)})")
+
+def pack_counts_from_rollup(rollup: pd.DataFrame, by: str) -> pd.DataFrame:
+    """
+    Rollup com a dimensão (loader.load_daily_rollup(group_by=[by])) -> casos por dia x grupo
+    (índice = dia, uma coluna por grupo com casos), agrupado uma única vez.
+    """
+    groups = pack_groups(by)
+    wide = rollup.pivot_table(index='dia', columns=by, values='casos', aggfunc='sum', fill_value=0)
+    if by == 'faixa_etaria':
+        # Rollup guarda o índice da faixa (config.AGE_BANDS)
+        wide.columns = [groups[int(band)] for band in wide.columns]
+    wide = wide[[group for group in groups if group in wide.columns]]
+    return wide.astype(np.int64).rename_axis(index='dia', columns=by)
+
+def pack_counts_from_cases(df: pd.DataFrame, by: str, date_column: str = 'dt_notificacao') -> pd.DataFrame:
+    """
+    Mesmo formato de pack_counts_from_rollup a partir da tabela de casos, sem filtrar uma
+    cópia por grupo: um único bincount sobre (grupo, dia). 'faixa_etaria' usa a coluna idade.
+    """
+    groups = pack_groups(by)
+    days = day_array(df[date_column])
+    if by == 'faixa_etaria':
+        ages = pd.to_numeric(df['idade'], errors='coerce').to_numpy(dtype=float)
+        codes = np.searchsorted(config.AGE_BANDS, ages, side='right') - 1
+        codes[np.isnan(ages)] = -1
+    else:
+        codes = pd.Categorical(df[by], categories=groups).codes.astype(np.int64)
+    
+    valid = (codes >= 0) & (days != MISSING_DAY)
+    days, codes = days[valid], codes[valid]
+    if days.size == 0:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name='dia'), columns=pd.Index([], name=by), dtype=np.int64)
+    first = int(days.min())
+    width = int(days.max()) - first + 1
+    binned = np.bincount(codes * width + (days - first), minlength=len(groups) * width).reshape(len(groups), width)
+    present = binned.any(axis=1)
+    return pd.DataFrame(
+        binned[present].T,
+        index=pd.DatetimeIndex(_day_index(first, width), name='dia'),
+        columns=pd.Index([group for group, keep in zip(groups, present) if keep], name=by)
+    )
+
+def _pack_bins(group_counts: pd.DataFrame) -> Dict[str, Tuple[int, np.ndarray]]:
+    return {group: _bin_counts(group_counts[group]) for group in group_counts.columns}
+
+def _pack_end(group_counts: pd.DataFrame, reference_date: Optional[pd.Timestamp]) -> pd.Timestamp:
+    """Data efetiva única do pacote (P99.5 do total): todos os painéis com a mesma janela."""
+    return _effective_end(*_bin_counts(group_counts.sum(axis=1)), reference_date)
+
+def _new_grid(panels: int, ncols: int, panel_size: Tuple[float, float] = (3.2, 2.4)) -> Tuple[Figure, List]:
+    """Figura Agg com uma grade de painéis; os eixos sobrando ficam ocultos."""
+    ncols = max(min(ncols, panels), 1)
+    nrows = max(-(-panels // ncols), 1)
+    fig = Figure(figsize=(panel_size[0] * ncols, panel_size[1] * nrows))
+    FigureCanvasAgg(fig)
+    axes = list(fig.subplots(nrows, ncols, squeeze=False).ravel())
+    for ax in axes[panels:]:
+        ax.set_visible(False)
+    return fig, axes[:panels]
+
+def plot_daily_grid(
+    group_counts: pd.DataFrame,
+    last_n_days: int = 30,
+    ncols: int = 6,
+    save_path: Optional[str] = None,
+    reference_date: Optional[pd.Timestamp] = None,
+    dimension: Optional[str] = None
+) -> Figure:
+    """
+    Small multiples do gráfico diário: um painel por grupo (colunas de group_counts,
+    ex: pack_counts_from_rollup), mesma janela de datas em todos.
+    dimension: rótulo da dimensão no título (ex: PACK_DIMENSIONS['uf_sigla'])
+    """
+    max_date = _pack_end(group_counts, reference_date)
+    windows = {
+        group: _daily_window(first, binned, max_date, last_n_days)
+        for group, (first, binned) in _pack_bins(group_counts).items()
+    }
+    return _plot_daily_grid(windows, last_n_days, ncols, save_path, dimension)
+
+@_styled
+def _plot_daily_grid(
+    windows: Dict[str, pd.Series],
+    last_n_days: int,
+    ncols: int,
+    save_path: Optional[str],
+    dimension: Optional[str]
+) -> Figure:
+    fig, axes = _new_grid(len(windows), ncols)
+    for ax, (group, daily_cases) in zip(axes, windows.items()):
+        ax.plot(daily_cases.index, daily_cases.values, marker='o', linewidth=1.2, markersize=2.5,
+                color=config.METRIC_COLORS['crescimento'], label='Casos Diários')
+        if len(daily_cases) >= 7:
+            ax.plot(daily_cases.index, _moving_average(daily_cases.to_numpy()), linewidth=1.5,
+                    color='#F18F01', linestyle='--', label='Média Móvel (7 dias)')
+        _format_panel(ax, group, '%d/%m')
+    
+    by = f" por {dimension}" if dimension else ""
+    fig.suptitle(f'Casos Diários de SRAG{by} - Últimos {last_n_days} Dias', fontsize=14, fontweight='bold')
+    if axes:
+        fig.legend(*axes[0].get_legend_handles_labels(), loc='upper right', fontsize=9)
+    return _finish_grid(fig, save_path, 'diário')
+
+def plot_monthly_grid(
+    group_counts: pd.DataFrame,
+    last_n_months: int = 12,
+    ncols: int = 6,
+    save_path: Optional[str] = None,
+    reference_date: Optional[pd.Timestamp] = None,
+    dimension: Optional[str] = None
+) -> Figure:
+    """Small multiples do gráfico mensal (mesmos parâmetros de plot_daily_grid)."""
+    max_date = _pack_end(group_counts, reference_date)
+    months = {
+        group: _monthly_bins(first, binned, max_date).iloc[-last_n_months:]
+        for group, (first, binned) in _pack_bins(group_counts).items()
+    }
+    return _plot_monthly_grid(months, last_n_months, ncols, save_path, dimension)
+
+@_styled
+def _plot_monthly_grid(
+    months: Dict[str, pd.Series],
+    last_n_months: int,
+    ncols: int,
+    save_path: Optional[str],
+    dimension: Optional[str]
+) -> Figure:
+    fig, axes = _new_grid(len(months), ncols)
+    for ax, (group, monthly_cases) in zip(axes, months.items()):
+        ax.bar(monthly_cases.index.to_timestamp(), monthly_cases.values, width=20,
+               color=config.METRIC_COLORS['mortalidade'], alpha=0.7, edgecolor='black', linewidth=0.6)
+        _format_panel(ax, group, '%m/%y')
+    
+    by = f" por {dimension}" if dimension else ""
+    fig.suptitle(f'Casos Mensais de SRAG{by} - Últimos {last_n_months} Meses', fontsize=14, fontweight='bold')
+    return _finish_grid(fig, save_path, 'mensal')
+
+def _format_panel(ax, group: str, date_format: str):
+    """Painel compacto: grupo no título, poucas datas no eixo x e eixo y próprio (escalas diferem)."""
+    ax.set_title(group, fontsize=10, fontweight='bold')
+    ax.xaxis.set_major_locator(mdates.AutoDateLocator(minticks=2, maxticks=4))
+    ax.xaxis.set_major_formatter(mdates.DateFormatter(date_format))
+    ax.tick_params(labelsize=7)
+    ax.grid(True, alpha=0.3, linestyle='--')
+
+def _finish_grid(fig: Figure, save_path: Optional[str], label: str) -> Figure:
+    fig.tight_layout(rect=(0, 0, 1, 0.96))
+    if save_path:
+        fig.savefig(save_path, dpi=config.DPI, bbox_inches='tight')
+        logger.info(f"💾 Grade do gráfico {label} salva em: {save_path}")
+    return fig
+
+# ============================================================
+# SERVIÇO DE RENDERIZAÇÃO (Processos paralelos)
+# ============================================================
+
+# Gráficos renderizáveis a partir das contagens diárias (índice = dia, valores = casos);
+# as grades recebem casos por dia x grupo (pack_counts_from_rollup)
+CHART_RENDERERS: Dict[str, Callable[..., Figure]] = {
+    'daily': plot_daily_counts,
+    'monthly': plot_monthly_counts,
+    'daily_grid': plot_daily_grid,
+    'monthly_grid': plot_monthly_grid,
+}
+
+# Entrada dos renderizadores: série (dia -> casos) ou tabela (dia x grupo -> casos)
+Counts = Union[pd.Series, pd.DataFrame]
+
+def render_chart(
+    kind: str,
+    daily_counts: Counts,
+    save_path: Optional[str] = None,
+    **options
+) -> Union[str, bytes]:
+    """
+    Renderiza um gráfico de CHART_RENDERERS e libera a figura ao final.
+    Returns: save_path (PNG gravado) ou os bytes do PNG se save_path for None
+    """
+    fig = CHART_RENDERERS[kind](daily_counts, **options)
+    try:
+        with matplotlib.style.context(config.PLOT_STYLE):
+            if save_path:
+                fig.savefig(save_path, dpi=config.DPI, bbox_inches='tight')
+                logger.info(f"💾 Gráfico '{kind}' salvo em: {save_path}")
+                return str(save_path)
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format='png', dpi=config.DPI, bbox_inches='tight')
+            return buffer.getvalue()
+    finally:
+        fig.clear()
+
+# Pool de processos do serviço: criado no primeiro uso e mantido entre relatórios
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _render_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if (config.CHART_WORKERS or 0) <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=config.CHART_WORKERS)
+        return _pool
+
+def shutdown_render_pool():
+    """Encerra os processos do serviço (recriados sob demanda)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+# Tarefa de renderização: (tipo em CHART_RENDERERS, contagens, caminho do PNG ou None, opções)
+RenderTask = Tuple[str, Counts, Optional[str], Dict[str, Any]]
+
+def _render_tasks(tasks: Dict[Hashable, RenderTask]) -> Dict[Hashable, Union[str, bytes]]:
+    """Renderiza tarefas independentes no pool (ou no processo atual se houver só uma)."""
+    def render_here():
+        return {name: render_chart(kind, counts, path, **options) for name, (kind, counts, path, options) in tasks.items()}
+    
+    pool = _render_pool()
+    if pool is None or len(tasks) <= 1:
+        return render_here()
+    
+    try:
+        futures = {
+            name: pool.submit(render_chart, kind, counts, path, **options)
+            for name, (kind, counts, path, options) in tasks.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+    except BrokenProcessPool:
+        # Processo encerrado (ex: falta de memória): descarta o pool e renderiza no processo atual
+        logger.warning("Pool de renderização indisponível; gerando gráficos no processo atual.")
+        shutdown_render_pool()
+        return render_here()
+
+def render_charts(
+    jobs: Dict[str, Tuple[str, Optional[str]]],
+    daily_counts: pd.Series,
+    **options
+) -> Dict[str, Union[str, bytes]]:
+    """
+    Renderiza gráficos independentes em paralelo (config.CHART_WORKERS processos).
+    jobs: {nome: (tipo em CHART_RENDERERS, caminho do PNG ou None para bytes)}
+    options: repassadas a todos os gráficos (ex: reference_date)
+    Returns: {nome: caminho ou bytes}
+    """
+    return _render_tasks({name: (kind, daily_counts, path, options) for name, (kind, path) in jobs.items()})
+
+# ============================================================
+# CACHE DE IMAGENS (Endereçado por conteúdo)
+# ============================================================
+
+# Versão do desenho: incrementar ao mudar _plot_daily/_plot_monthly (invalida as imagens salvas)
+RENDER_VERSION = 1
+CACHED_CHART = re.compile(r'^(?P<kind>[a-z_]+)-[0-9a-f]{16}\.png$')
+
+def chart_key(kind: str, daily_counts: Counts, options: Dict) -> str:
+    """
+    Hash (16 hex) da série de entrada e de tudo que altera a imagem: tipo do gráfico,
+    parâmetros (last_n_days, figsize, reference_date...), config.DPI, config.PLOT_STYLE,
+    versão do matplotlib e RENDER_VERSION.
+    """
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(daily_counts, index=True).to_numpy().tobytes())
+    if isinstance(daily_counts, pd.DataFrame):
+        # hash_pandas_object cobre só as linhas: os grupos (colunas) entram à parte
+        digest.update(repr(list(daily_counts.columns)).encode())
+    settings = (kind, sorted((k, repr(v)) for k, v in options.items()),
+                config.DPI, config.PLOT_STYLE, matplotlib.__version__, RENDER_VERSION)
+    digest.update(repr(settings).encode())
+    return digest.hexdigest()[:16]
+
+def _evict_cached_charts(output_dir: Path, keep: set):
+    """Mantém as config.CHART_CACHE_MAX_FILES imagens usadas mais recentemente (mtime) no diretório."""
+    cached = sorted(
+        (f for f in output_dir.iterdir() if CACHED_CHART.match(f.name) and f not in keep),
+        key=lambda f: f.stat().st_mtime_ns, reverse=True
+    )
+    for stale in cached[max(config.CHART_CACHE_MAX_FILES - len(keep), 0):]:
+        stale.unlink(missing_ok=True)
+
+def charts_on_disk(paths: Any) -> bool:
+    """
+    Todos os arquivos de um resultado de geração (caminho ou dicionários aninhados) existem?
+    Resultados guardados em cache podem apontar para imagens já removidas por _evict_cached_charts.
+    """
+    if isinstance(paths, dict):
+        return all(charts_on_disk(value) for value in paths.values())
+    return Path(paths).exists()
+
+def _render_cached(
+    tasks: Dict[Hashable, Tuple[str, Counts, Dict[str, Any]]],
+    output_dir: Path
+) -> Dict[Hashable, str]:
+    """tasks: {nome: (tipo, contagens, opções)} -> {nome: caminho do PNG em output_dir}"""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths, missing = {}, {}
+    for name, (kind, counts, options) in tasks.items():
+        path = output_dir / f"{kind}-{chart_key(kind, counts, options)}.png"
+        paths[name] = path
+        if path.exists():
+            os.utime(path)
+        else:
+            missing[name] = (kind, counts, str(path.with_name(f"{path.stem}.tmp.png")), options)
+    
+    if missing:
+        # Renderização num arquivo temporário + os.replace: leitores nunca veem PNG parcial
+        for name, rendered in _render_tasks(missing).items():
+            os.replace(rendered, paths[name])
+        _evict_cached_charts(output_dir, keep=set(paths.values()))
+    logger.info(f"Gráficos: {len(tasks) - len(missing)} reaproveitados, {len(missing)} renderizados")
+    return {name: str(path) for name, path in paths.items()}
+
+def render_charts_cached(
+    jobs: Dict[str, str],
+    daily_counts: pd.Series,
+    output_dir: Path,
+    **options
+) -> Dict[str, str]:
+    """
+    Gráficos de CHART_RENDERERS salvos em output_dir sob o hash do conteúdo (chart_key):
+    imagens já existentes são reaproveitadas sem passar pelo matplotlib; só as ausentes
+    são renderizadas (render_charts). Os acertos renovam o mtime usado no descarte LRU.
+    jobs: {nome: tipo em CHART_RENDERERS}
+    Returns: {nome: caminho do PNG}
+    """
+    return _render_cached({name: (kind, daily_counts, options) for name, kind in jobs.items()}, output_dir)
+
+def render_chart_pack(
+    group_counts: pd.DataFrame,
+    output_dir: Path,
+    kinds: Sequence[str] = ('daily', 'monthly'),
+    grids: bool = True,
+    individual: bool = True,
+    dimension: Optional[str] = None,
+    reference_date: Optional[pd.Timestamp] = None
+) -> Dict[str, Dict]:
+    """
+    Pacote de gráficos por grupo numa única leva paralela e cacheada (render_charts_cached):
+    a grade small multiples de cada tipo e/ou um gráfico por grupo e tipo.
+    group_counts: casos por dia x grupo (pack_counts_from_rollup / pack_counts_from_cases)
+    dimension: rótulo da dimensão nos títulos das grades (ex: PACK_DIMENSIONS['uf_sigla'])
+    reference_date: data efetiva comum a todos os gráficos; None = P99.5 do total
+    Returns: {'grids': {tipo: caminho}, 'groups': {grupo: {tipo: caminho}}}
+    """
+    reference_date = _pack_end(group_counts, reference_date)
+    tasks = {}
+    if grids:
+        for kind in kinds:
+            tasks[('grid', kind)] = (f"{kind}_grid", group_counts,
+                                     {'reference_date': reference_date, 'dimension': dimension})
+    if individual:
+        for group in group_counts.columns:
+            for kind in kinds:
+                tasks[('group', group, kind)] = (kind, group_counts[group],
+                                                 {'reference_date': reference_date, 'group': group})
+    
+    paths = _render_cached(tasks, output_dir)
+    pack = {'grids': {}, 'groups': {}}
+    for name, path in paths.items():
+        if name[0] == 'grid':
+            pack['grids'][name[1]] = path
+        else:
+            pack['groups'].setdefault(name[1], {})[name[2]] = path
+    return pack
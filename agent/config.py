@@ -21,11 +21,17 @@ ANALISE = PROJECT_ROOT / "analise"
 # Database Path
 DATABASE_PATH = DATA_DATABASE / "srag.db"
 
-# Arquivo principal
+# Arquivo principal, ou a série INFLUD: diretório (arquivos config.DATA_FILE_PATTERN)
+# ou glob, ex: str(DATA_RAW / "INFLUD*.csv*") (2019-2025, CSV puro, .zip ou .gz)
 DATA_FILE = r"c:\Users\UNIVERSO\OneDrive\Apps\Desktop\Indicium Health\srag-poc\data\raw\INFLUD20-26-06-2025.csv"
+DATA_FILE_PATTERN = "INFLUD*"
 
 # Database Settings
 TABLE_NAME = "srag_cases"
+METADATA_TABLE = "ingest_metadata"  # Marca d'água e estado da última ingestão
+ROLLUP_TABLE = "srag_daily_rollup"  # Contagens por dia x UF x sexo x faixa etária
+HISTOGRAM_TABLE = "srag_day_histogram"  # Casos por dia de notificação (referência P99.5)
+SOURCE_TABLE = "srag_source_files"  # Arquivos INFLUD de origem (arquivo_id -> nome, ano)
 
 # ============================================================
 # PARÂMETROS DE CARREGAMENTO
@@ -36,11 +42,60 @@ MAX_CHUNKS = None  # Process all data
 ENCODING = 'latin-1'
 SEPARATOR = ';'
 
+# Leitor do CSV: 'pandas' (parser C) ou 'pyarrow' (pyarrow.csv multithread, colunas já
+# tipadas; requer pyarrow)
+CSV_ENGINE = 'pandas'
+
+# Modo de ingestão: 'memory' (carrega o CSV inteiro antes de transformar),
+# 'streaming' (lê, transforma e grava chunk a chunk, com memória constante),
+# 'parallel' (chunks transformados num pool de processos, writer único),
+# 'incremental' (aplica apenas registros novos/alterados de um novo dump)
+# ou 'series' (vários arquivos INFLUD lidos em paralelo, um shard por arquivo;
+# usado automaticamente quando DATA_FILE resolve para mais de um arquivo)
+INGEST_MODE = 'streaming'
+INGEST_WORKERS = None  # Processos dos modos 'parallel' e 'series' (None = os.cpu_count())
+
+# R201: janela de análise em dias (13 meses) contados da data mais recente dos dados;
+# None mantém a série completa (ex: carga histórica 2019-2025)
+ANALYSIS_WINDOW_DAYS = 395
+
+# Backend analítico do DatabaseTool: 'sqlite' (rollups gravados na ingestão) ou
+# 'duckdb' (motor colunar embarcado, espelho local do SQLite; requer o pacote duckdb)
+STORAGE_BACKEND = 'sqlite'
+
+# Lago Parquet particionado por ano/mes/ano do arquivo (dados limpos), gravado a cada ingestão
+# se ativo (requer pyarrow); cada carga substitui apenas os meses que contém, do próprio dump
+PARQUET_LAKE = False
+PARQUET_LAKE_DIR = DATA_PROCESSED / "srag_lake"
+
+# Cache em processo das leituras do banco (invalidado a cada nova ingestão)
+CACHE_MAX_BYTES = 512 * 1024 * 1024  # Limite de memória (LRU)
+
+# Pool de conexões somente leitura do SQLite (reutilizadas entre sessões do dashboard)
+READ_POOL_SIZE = 8  # Conexões ociosas mantidas por banco
+READ_MMAP_BYTES = 1024 * 1024 * 1024  # I/O mapeado em memória (PRAGMA mmap_size)
+
+# Publicação de uma carga completa (srag.db.building -> srag.db): no Windows a troca falha
+# enquanto outro processo (ex: dashboard) mantém o banco aberto; tenta de novo com espera crescente
+PUBLISH_RETRIES = 6
+PUBLISH_RETRY_SECONDS = 0.5  # Primeira espera (dobra a cada tentativa)
+
+# Snapshot colunar (arrays .npy mapeados em memória) das colunas usadas por métricas
+# e gráficos, gravado ao lado do banco. Desligado por padrão: dashboard e agente leem os
+# rollups; só vale para análises em nível de caso (load_from_sqlite(..., compact=True))
+SNAPSHOT = False
+SNAPSHOT_COLUMNS = [
+    'dt_notificacao', 'teve_obito', 'teve_uti', 'esta_vacinado', 'idade', 'sexo', 'uf_sigla'
+]
+
 # ============================================================
 # MAPEAMENTO DE COLUNAS (R100)
 # ============================================================
 
 COLUMN_MAPPING = {
+    # IDENTIFICAÇÃO (chave da ingestão incremental, R202)
+    'NU_NOTIFIC': 'nu_notificacao',
+    
     # TEMPORAL
     'DT_NOTIFIC': 'dt_notificacao',
     'DT_SIN_PRI': 'dt_sintomas',
@@ -79,6 +134,21 @@ DATE_COLUMNS_CSV = [
     'DT_ENTUTI', 'DOSE_1_COV', 'DOSE_2_COV'
 ]
 
+# Códigos IBGE das UFs (uf_sigla é gravada no banco pelo código numérico)
+UF_CODES = {
+    'RO': 11, 'AC': 12, 'AM': 13, 'RR': 14, 'PA': 15, 'AP': 16, 'TO': 17,
+    'MA': 21, 'PI': 22, 'CE': 23, 'RN': 24, 'PB': 25, 'PE': 26, 'AL': 27, 'SE': 28, 'BA': 29,
+    'MG': 31, 'ES': 32, 'RJ': 33, 'SP': 35,
+    'PR': 41, 'SC': 42, 'RS': 43,
+    'MS': 50, 'MT': 51, 'GO': 52, 'DF': 53
+}
+
+# Faixas etárias dos rollups (limite inferior de cada faixa, em anos)
+AGE_BANDS = [0, 5, 12, 18, 30, 40, 50, 60, 70, 80]
+AGE_BAND_LABELS = [
+    f"{lower}-{upper - 1}" for lower, upper in zip(AGE_BANDS, AGE_BANDS[1:])
+] + [f"{AGE_BANDS[-1]}+"]
+
 # ============================================================
 # CONFIGURAÇÕES DE VISUALIZAÇÃO
 # ============================================================
@@ -87,6 +157,14 @@ PLOT_STYLE = 'ggplot'
 PLOT_PALETTE = 'husl'
 FIGURE_SIZE = (14, 10)
 DPI = 100
+CHART_WORKERS = 2  # Processos do serviço de renderização (<= 1 = no processo atual)
+CHART_CACHE_MAX_FILES = 200  # Imagens mantidas no cache por conteúdo de cada diretório (LRU)
+REPORT_GRIDS = False  # Grades por UF e faixa etária no relatório (run_agent; ~4,6 s a mais a frio)
+
+# Conversão HTML -> PDF dos relatórios (xhtml2pdf, um documento por processo)
+PDF_WORKERS = None  # Processos da conversão (None = os.cpu_count(); <= 1 = no processo atual)
+PDF_TIMEOUT_SECONDS = 180  # Prazo do lote de conversões (documentos não concluídos falham)
+PDF_CACHE_MAX_FILES = 100  # PDFs mantidos no cache por conteúdo do HTML (LRU)
 
 # Cores para métricas
 METRIC_COLORS = {
@@ -0,0 +1,550 @@
+"""
+Camada SQLite do SRAG
+Schema tipado da tabela de casos, codificação de colunas e carga em lote
+"""
+
+import os
+import queue
+import time
+import sqlite3
+import logging
+import numpy as np
+import pandas as pd
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# SCHEMA (R100 - Schema Target)
+# ============================================================
+
+EPOCH = date(1970, 1, 1)
+
+# Datas como número de dias desde 1970-01-01, flags como 0/1/NULL
+# e UF pelo código IBGE (config.UF_CODES)
+SCHEMA: List[Tuple[str, str]] = [
+    ('dt_notificacao', 'INTEGER NOT NULL'),
+    ('dt_obito', 'INTEGER'),
+    ('ano', 'INTEGER'),
+    ('mes', 'INTEGER'),
+    ('semana_epi', 'INTEGER'),
+    ('evolucao', 'INTEGER'),
+    ('teve_obito', 'INTEGER'),
+    ('foi_uti', 'INTEGER'),
+    ('teve_uti', 'INTEGER'),
+    ('vacina_status', 'INTEGER'),
+    ('esta_vacinado', 'INTEGER'),
+    ('doses_vacina', 'INTEGER'),
+    ('idade', 'INTEGER'),
+    ('sexo', 'INTEGER'),
+    ('uf_sigla', 'INTEGER'),
+    ('municipio_cod', 'INTEGER'),
+    ('registro_id', 'INTEGER'),
+    ('row_hash', 'INTEGER'),
+    ('arquivo_id', 'INTEGER'),  # Arquivo INFLUD de origem (config.SOURCE_TABLE)
+    ('ano_arquivo', 'INTEGER'),  # Ano do arquivo (INFLUD20 -> 2020)
+]
+
+COLUMNS = [name for name, _ in SCHEMA]
+DAY_COLUMNS = ['dt_notificacao', 'dt_obito']
+UF_NAMES = {code: sigla for sigla, code in config.UF_CODES.items()}
+
+# Pragmas de carga em lote, só para arquivos novos que ninguém lê ainda (_building_database,
+# shards da série): em caso de falha o arquivo é descartado e a carga refeita,
+# então o synchronous=OFF é seguro aqui
+BULK_LOAD_PRAGMAS = {
+    'synchronous': 'OFF',
+    'cache_size': -262144,  # 256 MB (valor negativo = KiB)
+    'temp_store': 'MEMORY',
+}
+
+# Atualização no lugar do banco publicado (ingestão incremental): é a única cópia,
+# então mantém a durabilidade do WAL (synchronous=NORMAL: commits sobrevivem a
+# queda do processo; o banco nunca fica corrompido)
+INCREMENTAL_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -262144,
+    'temp_store': 'MEMORY',
+}
+
+def apply_bulk_pragmas(conn: sqlite3.Connection):
+    """Configura a conexão de escrita para carga em lote num arquivo novo (journal em memória)."""
+    conn.execute("PRAGMA journal_mode = MEMORY")
+    for pragma, value in BULK_LOAD_PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+
+def apply_incremental_pragmas(conn: sqlite3.Connection):
+    """
+    Configura a conexão de escrita para atualizar o banco publicado: WAL (as leituras do
+    dashboard continuam vendo a versão anterior enquanto a ingestão grava) com synchronous=NORMAL.
+    """
+    for pragma, value in INCREMENTAL_PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+
+def end_bulk_load(conn: sqlite3.Connection):
+    """Após o commit: transfere o WAL para o banco e trunca o arquivo -wal."""
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+def remove_database(db_path: Path):
+    """Apaga um arquivo de banco e seus arquivos auxiliares (-wal, -shm, -journal)."""
+    for suffix in ['', '-wal', '-shm', '-journal']:
+        Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+
+def publish_database(building: Path, db_path: Path):
+    """
+    Troca atômica do banco publicado por um arquivo recém-construído (os.replace).
+    Consultas em andamento terminam no arquivo anterior (já aberto); o pool de leitura
+    reabre as conexões no novo. O -wal/-shm do arquivo anterior é descartado para não
+    ser aplicado ao novo (o banco construído é publicado sem WAL).
+    Windows: os.replace falha (PermissionError) enquanto outro processo mantém o banco
+    aberto (read_pool.discard só fecha as conexões deste processo); a troca é repetida
+    config.PUBLISH_RETRIES vezes com espera crescente. Se ainda falhar, o arquivo construído
+    é mantido (não é apagado) e o erro propagado: feche os leitores e renomeie-o para db_path.
+    """
+    read_pool.discard(db_path)
+    delay = config.PUBLISH_RETRY_SECONDS
+    for attempt in range(config.PUBLISH_RETRIES + 1):
+        try:
+            os.replace(building, db_path)
+            break
+        except PermissionError as e:
+            if attempt == config.PUBLISH_RETRIES:
+                logger.error(
+                    f"Banco em uso por outro processo; carga mantida em {building} "
+                    f"(feche os leitores e renomeie-o para {db_path.name}): {e}"
+                )
+                raise
+            logger.warning(f"Banco em uso ({e}); nova tentativa de publicação em {delay:.1f}s")
+            time.sleep(delay)
+            delay *= 2
+    for suffix in ['-wal', '-shm']:
+        try:
+            Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+        except OSError as e:  # Windows: arquivo ainda aberto por outro processo
+            logger.warning(f"Não foi possível remover {db_path}{suffix}: {e}")
+    logger.info(f"Banco publicado: {building.name} -> {db_path}")
+
+def create_table(conn: sqlite3.Connection, table: str = config.TABLE_NAME):
+    """(Re)cria a tabela de casos com o schema tipado (STRICT: tipos garantidos pelo SQLite)."""
+    columns = ', '.join(f"{name} {sql_type}" for name, sql_type in SCHEMA)
+    conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.execute(f"CREATE TABLE {table} ({columns}) STRICT")
+
+# Índices da tabela de casos, desenhados para as consultas reais (utils/benchmark_queries.py):
+# contagens por intervalo de datas, dia x UF e dia x flags de desfecho (e os totais de KPIs)
+# são respondidas só pelo índice de cobertura, sem acessar a tabela. Flags booleanas isoladas
+# têm seletividade baixa demais para o planner; registro_id/row_hash serve a ingestão incremental
+CASE_INDEXES = {
+    'idx_casos_cobertura': [
+        'dt_notificacao', 'uf_sigla', 'teve_obito', 'teve_uti', 'esta_vacinado', 'sexo', 'idade'
+    ],
+    'idx_registro': ['registro_id', 'row_hash'],
+}
+
+def create_indexes(conn: sqlite3.Connection, indexes: Optional[dict] = None, table: str = config.TABLE_NAME):
+    """Cria os índices da tabela de casos (padrão: CASE_INDEXES) e atualiza as estatísticas do planner."""
+    for name, columns in (indexes or CASE_INDEXES).items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({', '.join(columns)})")
+    # Estatísticas por amostragem: custo limitado mesmo em dezenas de milhões de linhas
+    conn.execute("PRAGMA analysis_limit = 1000")
+    conn.execute(f"ANALYZE {table}")
+
+def table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    """Verifica se uma tabela existe no banco."""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    return row is not None
+
+# ============================================================
+# CONEXÕES DE LEITURA (Pool)
+# ============================================================
+
+# Leitura com I/O mapeado em memória, cache de páginas próprio e query_only
+# (nenhuma escrita acidental pelas conexões do dashboard)
+READ_PRAGMAS = {
+    'mmap_size': config.READ_MMAP_BYTES,
+    'cache_size': -65536,  # 64 MB (valor negativo = KiB)
+    'temp_store': 'MEMORY',
+    'query_only': 1,
+}
+
+# Statements preparados mantidos por conexão (as consultas fixas de KPIs e
+# gráficos são reaproveitadas pelo texto SQL, sem novo parse)
+READ_CACHED_STATEMENTS = 256
+
+def open_read_connection(db_path: Path) -> sqlite3.Connection:
+    """Conexão somente leitura (URI mode=ro), em autocommit: cada SELECT vê o último commit."""
+    conn = sqlite3.connect(
+        f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True,
+        isolation_level=None, check_same_thread=False,
+        cached_statements=READ_CACHED_STATEMENTS
+    )
+    for pragma, value in READ_PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    return conn
+
+class ReadPool:
+    """
+    Conexões de leitura reutilizadas entre chamadas e sessões do Streamlit.
+    Cada conexão é usada por uma thread por vez (retirada do pool durante o uso);
+    até config.READ_POOL_SIZE conexões ociosas ficam abertas por banco.
+    Conexões abertas num arquivo já substituído (publish_database) são descartadas.
+    """
+    
+    def __init__(self, size: int = config.READ_POOL_SIZE):
+        self.size = size
+        self._idle: Dict[str, "queue.LifoQueue[Tuple[sqlite3.Connection, int]]"] = {}
+    
+    def _queue(self, db_path: Path) -> "queue.LifoQueue[Tuple[sqlite3.Connection, int]]":
+        # setdefault é atômico no CPython: uma única fila por banco
+        return self._idle.setdefault(str(Path(db_path).resolve()), queue.LifoQueue(self.size))
+    
+    @contextmanager
+    def connection(self, db_path: Path) -> Iterator[sqlite3.Connection]:
+        """Empresta uma conexão aquecida (ou abre uma nova) e a devolve ao final."""
+        idle = self._queue(db_path)
+        inode = os.stat(db_path).st_ino
+        conn = None
+        while conn is None:
+            try:
+                conn, opened_inode = idle.get_nowait()
+            except queue.Empty:
+                conn, opened_inode = open_read_connection(db_path), inode
+            if opened_inode != inode:
+                conn.close()
+                conn = None
+        try:
+            yield conn
+        except sqlite3.DatabaseError:
+            # Estado incerto (ex: banco corrompido/substituído): não volta ao pool
+            conn.close()
+            raise
+        else:
+            try:
+                idle.put_nowait((conn, inode))
+            except queue.Full:
+                conn.close()
+    
+    def discard(self, db_path: Path):
+        """Fecha as conexões ociosas de um banco (ex: antes de substituir o arquivo)."""
+        idle = self._idle.get(str(Path(db_path).resolve()))
+        while idle is not None:
+            try:
+                idle.get_nowait()[0].close()
+            except queue.Empty:
+                break
+    
+    def close_all(self):
+        """Fecha as conexões ociosas de todos os bancos."""
+        for db_path in list(self._idle):
+            self.discard(db_path)
+
+# Pool do processo (compartilhado por loader, cache e DatabaseTool)
+read_pool = ReadPool()
+
+def read_connection(db_path: Path = None):
+    """Atalho: with database.read_connection(path) as conn: ..."""
+    return read_pool.connection(db_path or config.DATABASE_PATH)
+
+# ============================================================
+# ROLLUPS DIÁRIOS (Pré-agregação na ingestão)
+# ============================================================
+
+# Dimensões do rollup: dia x UF x sexo x faixa etária (índice em config.AGE_BANDS)
+ROLLUP_KEYS = ['dia', 'uf_sigla', 'sexo', 'faixa_etaria']
+
+# Medidas: casos, eventos de cada flag e casos com a flag informada (denominadores R202-R204)
+ROLLUP_MEASURES = [
+    'casos',
+    'obitos', 'casos_desfecho',
+    'casos_uti', 'casos_uti_informado',
+    'casos_vacinados', 'casos_vacina_informada',
+]
+
+def _age_band_sql(column: str = 'idade') -> str:
+    """Expressão SQL da faixa etária (índice em config.AGE_BANDS; NULL se idade ausente)."""
+    bands = list(enumerate(config.AGE_BANDS))
+    cases = ' '.join(f"WHEN {column} >= {lower} THEN {i}" for i, lower in reversed(bands))
+    return f"CASE {cases} END"
+
+def rollup_select(table: str = config.TABLE_NAME, where: str = '') -> str:
+    """
+    SELECT que agrega a tabela de casos no formato do rollup diário.
+    where: filtro SQL opcional (ex: só os dias afetados por uma ingestão incremental)
+    """
+    condition = f"WHERE {where}" if where else ''
+    return f"""
+        SELECT
+            dt_notificacao AS dia, uf_sigla, sexo, {_age_band_sql()} AS faixa_etaria,
+            COUNT(*) AS casos,
+            COALESCE(SUM(teve_obito), 0) AS obitos, COUNT(teve_obito) AS casos_desfecho,
+            COALESCE(SUM(teve_uti), 0) AS casos_uti, COUNT(teve_uti) AS casos_uti_informado,
+            COALESCE(SUM(esta_vacinado), 0) AS casos_vacinados, COUNT(esta_vacinado) AS casos_vacina_informada
+        FROM {table}
+        {condition}
+        GROUP BY 1, 2, 3, 4
+    """
+
+def daily_rollup_query(source: str = config.ROLLUP_TABLE, group_by: Sequence[str] = ()) -> str:
+    """
+    Consulta das contagens diárias somadas por dia + dimensões pedidas.
+    source: config.ROLLUP_TABLE ou uma subconsulta no formato de rollup_select()
+    """
+    keys = ', '.join(['dia', *group_by])
+    sums = ', '.join(f"CAST(SUM({name}) AS BIGINT) AS {name}" for name in ROLLUP_MEASURES)
+    # NULLS FIRST explícito: mesma ordem no SQLite e no DuckDB (padrão NULLS LAST)
+    order = ', '.join(f"{key} NULLS FIRST" for key in ['dia', *group_by])
+    return f"SELECT {keys}, {sums} FROM {source} GROUP BY {keys} ORDER BY {order}"
+
+def build_rollups(conn: sqlite3.Connection):
+    """(Re)constrói config.ROLLUP_TABLE a partir da tabela de casos (chamado ao final da ingestão)."""
+    keys = ', '.join(f"{name} INTEGER" for name in ROLLUP_KEYS)
+    measures = ', '.join(f"{name} INTEGER NOT NULL" for name in ROLLUP_MEASURES)
+    conn.execute(f"DROP TABLE IF EXISTS {config.ROLLUP_TABLE}")
+    conn.execute(f"CREATE TABLE {config.ROLLUP_TABLE} ({keys}, {measures}) STRICT")
+    conn.execute(f"INSERT INTO {config.ROLLUP_TABLE} {rollup_select()}")
+    conn.execute(f"CREATE INDEX idx_rollup_dia ON {config.ROLLUP_TABLE}(dia)")
+
+def update_rollups(conn: sqlite3.Connection, days: Sequence[int], cutoff_day: Optional[int] = None):
+    """
+    Atualiza config.ROLLUP_TABLE só nos dias afetados por uma ingestão incremental: as linhas
+    desses dias são reagregadas da tabela de casos (idx_casos_cobertura) e os dias anteriores
+    ao corte R201 (cutoff_day) são removidos. Sem rollup gravado, reconstrói tudo.
+    days: dias (desde 1970-01-01) com registros removidos ou inseridos
+    """
+    if not table_exists(conn, config.ROLLUP_TABLE):
+        build_rollups(conn)
+        return
+    if cutoff_day is not None:
+        conn.execute(f"DELETE FROM {config.ROLLUP_TABLE} WHERE dia < ?", (cutoff_day,))
+        days = [day for day in days if day >= cutoff_day]
+    conn.execute("DROP TABLE IF EXISTS temp._dias_rollup")
+    conn.execute("CREATE TEMP TABLE _dias_rollup (dia INTEGER PRIMARY KEY)")
+    conn.executemany("INSERT INTO _dias_rollup (dia) VALUES (?)", [(int(day),) for day in days])
+    conn.execute(f"DELETE FROM {config.ROLLUP_TABLE} WHERE dia IN (SELECT dia FROM _dias_rollup)")
+    conn.execute(
+        f"INSERT INTO {config.ROLLUP_TABLE} "
+        f"{rollup_select(where='dt_notificacao IN (SELECT dia FROM _dias_rollup)')}"
+    )
+    conn.execute("DROP TABLE _dias_rollup")
+
+# ============================================================
+# HISTOGRAMA DIÁRIO (Data efetiva P99.5)
+# ============================================================
+
+# Casos por dia de notificação: domínio de poucos milhares de dias, mantido na
+# ingestão (somando os histogramas de cada chunk) e gravado junto com os dados
+
+def day_histogram(dates: pd.Series) -> pd.Series:
+    """Contagem de casos por dia (índice = dias desde 1970-01-01) de um chunk transformado."""
+    days = _days(dates).dropna().astype(np.int64)
+    return days.value_counts().sort_index().rename_axis('dia').rename('casos')
+
+def merge_histograms(total: Optional[pd.Series], chunk: pd.Series) -> pd.Series:
+    """Soma dois histogramas diários (o histograma é combinável chunk a chunk)."""
+    if total is None:
+        return chunk
+    return total.add(chunk, fill_value=0).astype(np.int64)
+
+def subtract_histograms(total: pd.Series, removed: pd.Series) -> pd.Series:
+    """Desconta de um histograma diário as contagens de registros apagados (dias zerados saem)."""
+    result = total.sub(removed, fill_value=0).astype(np.int64)
+    return result[result > 0]
+
+def build_day_histogram(
+    conn: sqlite3.Connection,
+    table: str = config.TABLE_NAME,
+    where: str = '',
+    params: Sequence = ()
+) -> pd.Series:
+    """
+    Histograma diário a partir da tabela de casos (coberto por idx_casos_cobertura).
+    where/params: filtro SQL extra (ex: só os registros que uma ingestão incremental vai apagar)
+    """
+    condition = f"AND ({where})" if where else ''
+    df = pd.read_sql(f"""
+        SELECT dt_notificacao AS dia, COUNT(*) AS casos
+        FROM {table}
+        WHERE dt_notificacao IS NOT NULL {condition}
+        GROUP BY dt_notificacao
+    """, conn, params=tuple(params))
+    return df.set_index('dia')['casos'].astype(np.int64)
+
+def stored_day_histogram(conn: sqlite3.Connection) -> Optional[pd.Series]:
+    """Histograma gravado em config.HISTOGRAM_TABLE (índice em dias); None se ausente."""
+    if not table_exists(conn, config.HISTOGRAM_TABLE):
+        return None
+    df = pd.read_sql(f"SELECT dia, casos FROM {config.HISTOGRAM_TABLE} ORDER BY dia", conn)
+    return df.set_index('dia')['casos'].astype(np.int64)
+
+def write_day_histogram(conn: sqlite3.Connection, histogram: pd.Series):
+    """(Re)grava config.HISTOGRAM_TABLE."""
+    conn.execute(f"DROP TABLE IF EXISTS {config.HISTOGRAM_TABLE}")
+    conn.execute(
+        f"CREATE TABLE {config.HISTOGRAM_TABLE} (dia INTEGER PRIMARY KEY, casos INTEGER NOT NULL) STRICT"
+    )
+    conn.executemany(
+        f"INSERT INTO {config.HISTOGRAM_TABLE} (dia, casos) VALUES (?, ?)",
+        zip(histogram.index.tolist(), histogram.tolist())
+    )
+
+def read_day_histogram(conn: sqlite3.Connection) -> Optional[pd.DataFrame]:
+    """Histograma gravado ('dia' datetime64, 'casos'); None em bancos anteriores ao histograma."""
+    if not table_exists(conn, config.HISTOGRAM_TABLE):
+        return None
+    return decode_frame(pd.read_sql(f"SELECT dia, casos FROM {config.HISTOGRAM_TABLE} ORDER BY dia", conn))
+
+def read_effective_end_date(conn: sqlite3.Connection) -> Optional[pd.Timestamp]:
+    """Data efetiva (P99.5) registrada na última ingestão (None se ausente)."""
+    try:
+        row = conn.execute(
+            f"SELECT valor FROM {config.METADATA_TABLE} WHERE chave = 'data_efetiva'"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return pd.Timestamp(row[0]) if row and row[0] else None
+
+# ============================================================
+# ARQUIVOS DE ORIGEM (Série INFLUD)
+# ============================================================
+
+def write_sources(conn: sqlite3.Connection, sources: Sequence[Tuple[int, str, Optional[int]]]):
+    """(Re)grava config.SOURCE_TABLE com (arquivo_id, arquivo, ano) de cada arquivo da carga."""
+    conn.execute(f"DROP TABLE IF EXISTS {config.SOURCE_TABLE}")
+    conn.execute(
+        f"CREATE TABLE {config.SOURCE_TABLE} "
+        f"(arquivo_id INTEGER PRIMARY KEY, arquivo TEXT NOT NULL UNIQUE, ano INTEGER) STRICT"
+    )
+    conn.executemany(f"INSERT INTO {config.SOURCE_TABLE} (arquivo_id, arquivo, ano) VALUES (?, ?, ?)", sources)
+
+def register_source(conn: sqlite3.Connection, name: str, year: Optional[int]) -> int:
+    """arquivo_id de um arquivo (novo id se ainda não registrado); usado pela ingestão incremental."""
+    if not table_exists(conn, config.SOURCE_TABLE):
+        write_sources(conn, [])
+    row = conn.execute(f"SELECT arquivo_id FROM {config.SOURCE_TABLE} WHERE arquivo = ?", (name,)).fetchone()
+    if row is not None:
+        return row[0]
+    source_id = conn.execute(f"SELECT COALESCE(MAX(arquivo_id), 0) + 1 FROM {config.SOURCE_TABLE}").fetchone()[0]
+    conn.execute(f"INSERT INTO {config.SOURCE_TABLE} (arquivo_id, arquivo, ano) VALUES (?, ?, ?)", (source_id, name, year))
+    return source_id
+
+# ============================================================
+# CODIFICAÇÃO (DataFrame <-> SQLite)
+# ============================================================
+
+def date_to_day(value: date) -> int:
+    """Converte uma data no número de dias desde 1970-01-01 (formato gravado no banco)."""
+    return (value - EPOCH).days
+
+def _days(values: pd.Series) -> pd.Series:
+    """Datas (datetime.date/None) -> dias desde 1970-01-01 (Int64 anulável)."""
+    dates = pd.to_datetime(values).to_numpy(dtype='datetime64[D]')
+    days = pd.Series(dates.astype(np.int64), index=values.index, dtype='Int64')
+    return days.mask(np.isnat(dates))
+
+def _integers(values: pd.Series) -> pd.Series:
+    """Códigos, flags e contagens -> Int64 anulável (mesma truncagem de int(valor))."""
+    numeric = pd.to_numeric(values, errors='coerce')
+    if pd.api.types.is_float_dtype(numeric):
+        numeric = np.trunc(numeric)
+    return numeric.astype('Int64')
+
+def _uf_codes(values: pd.Series) -> pd.Series:
+    """Siglas de UF -> códigos (config.UF_CODES), normalizadas; siglas desconhecidas viram NULL com aviso."""
+    siglas = values.astype('string').str.strip().str.upper()
+    codes = siglas.map(config.UF_CODES).astype('Int64')
+    unmapped = siglas[codes.isna() & siglas.notna() & (siglas != '')]
+    if len(unmapped):
+        logger.warning(
+            f"{len(unmapped)} registros com UF desconhecida gravados como NULL: "
+            f"{sorted(unmapped.unique())}"
+        )
+    return codes
+
+def encode_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Converte a saída de transform_data para os tipos do SCHEMA."""
+    encoded = {}
+    for name in COLUMNS:
+        if name in DAY_COLUMNS:
+            encoded[name] = _days(df[name])
+        elif name == 'uf_sigla':
+            encoded[name] = _uf_codes(df[name])
+        else:
+            encoded[name] = _integers(df[name])
+    return pd.DataFrame(encoded, index=df.index)
+
+def _rows(encoded: pd.DataFrame) -> Iterator[tuple]:
+    """Linhas como tuplas de int/None do Python (tipos aceitos pelo executemany)."""
+    columns = []
+    for name in COLUMNS:
+        values = encoded[name]
+        data = values.to_numpy(dtype=np.int64, na_value=0).astype(object)
+        columns.append(np.where(values.isna().to_numpy(), None, data))
+    return zip(*columns)
+
+def insert_frame(conn: sqlite3.Connection, df: pd.DataFrame, table: str = config.TABLE_NAME) -> int:
+    """Insere um chunk transformado via executemany (na transação corrente da conexão)."""
+    placeholders = ', '.join('?' for _ in COLUMNS)
+    conn.executemany(
+        f"INSERT INTO {table} ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+        _rows(encode_frame(df))
+    )
+    return len(df)
+
+# Tipos compactos para leitura em pandas (decode_frame(compact=True)): flags booleanas
+# anuláveis, códigos DATASUS e contagens em inteiros pequenos, UF/município categóricos
+COMPACT_DTYPES = {
+    'ano': 'Int16',
+    'mes': 'Int8',
+    'semana_epi': 'Int8',
+    'evolucao': 'Int8',
+    'teve_obito': 'boolean',
+    'foi_uti': 'Int8',
+    'teve_uti': 'boolean',
+    'vacina_status': 'Int8',
+    'esta_vacinado': 'boolean',
+    'doses_vacina': 'Int8',
+    'idade': 'Int16',
+    'sexo': 'Int8',
+    'uf_sigla': 'category',
+    'municipio_cod': 'category',
+    'arquivo_id': 'Int16',
+    'ano_arquivo': 'Int16',
+}
+
+def _compact(values: pd.Series, dtype: str) -> pd.Series:
+    """Converte uma coluna decodificada para o tipo compacto."""
+    if dtype == 'category':
+        return values.astype('category')
+    if dtype == 'boolean':
+        return _integers(values).astype('boolean')
+    return _integers(values).astype(dtype)
+
+def decode_frame(df: pd.DataFrame, compact: bool = False) -> pd.DataFrame:
+    """
+    Converte colunas lidas do banco para uso em pandas (dias -> datetime64, código IBGE -> sigla).
+    compact: usa COMPACT_DTYPES (várias vezes menor que os float64/object do read_sql)
+    """
+    for name in DAY_COLUMNS + ['dia']:
+        if name in df.columns:
+            if pd.api.types.is_numeric_dtype(df[name]):
+                df[name] = pd.to_datetime(df[name], unit='D')
+            else:
+                # Bancos gerados antes do schema tipado guardam datas como texto ISO
+                df[name] = pd.to_datetime(df[name])
+    if 'uf_sigla' in df.columns and pd.api.types.is_numeric_dtype(df['uf_sigla']):
+        df['uf_sigla'] = df['uf_sigla'].map(UF_NAMES)
+    if 'faixa_etaria' in df.columns:
+        # Índice da faixa (NULL sem idade): Int64 independentemente do motor que leu
+        df['faixa_etaria'] = _integers(df['faixa_etaria'])
+    if compact:
+        for name, dtype in COMPACT_DTYPES.items():
+            if name in df.columns:
+                df[name] = _compact(df[name], dtype)
+    return df
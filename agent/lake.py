@@ -0,0 +1,216 @@
+"""
+Lago Parquet do SRAG particionado por ano/mes e ano do arquivo de origem
+Dados limpos (saída de transform_data) em partições Hive (ano=AAAA/mes=M/ano_arquivo=AAAA);
+cada ingestão substitui apenas os meses que contém, e só as linhas do próprio dump: um mês
+presente em dois dumps anuais (ex: janeiro/2021 no INFLUD20 e no INFLUD21) mantém as do outro.
+Leitura com poda de partições e colunas.
+"""
+
+import os
+import shutil
+import logging
+import pandas as pd
+from datetime import date
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence
+from . import config, database
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # dependência opcional (config.PARQUET_LAKE)
+    pa = None
+    ds = None
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# SCHEMA
+# ============================================================
+
+# ano_arquivo (ano do dump, estável entre bancos; arquivo_id é a ordem das origens de cada carga)
+PARTITION_COLUMNS = ['ano', 'mes', 'ano_arquivo']
+HIVE_NULL = '__HIVE_DEFAULT_PARTITION__'  # Diretório das partições com valor nulo
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow é necessário para o lago Parquet (pip install pyarrow)")
+
+def lake_schema() -> "pa.Schema":
+    """Tipos do lago: datas date32, flags booleanas, códigos em inteiros pequenos, UF texto."""
+    _require_pyarrow()
+    types = {
+        'dt_notificacao': pa.date32(), 'dt_obito': pa.date32(),
+        'ano': pa.int16(), 'mes': pa.int8(), 'semana_epi': pa.int8(),
+        'evolucao': pa.int8(), 'teve_obito': pa.bool_(),
+        'foi_uti': pa.int8(), 'teve_uti': pa.bool_(),
+        'vacina_status': pa.int8(), 'esta_vacinado': pa.bool_(), 'doses_vacina': pa.int8(),
+        'idade': pa.int16(), 'sexo': pa.int8(), 'uf_sigla': pa.string(), 'municipio_cod': pa.int32(),
+        'registro_id': pa.int64(), 'row_hash': pa.int64(),
+        'arquivo_id': pa.int16(), 'ano_arquivo': pa.int16(),
+    }
+    return pa.schema([(name, types[name]) for name in database.COLUMNS])
+
+def to_arrow(encoded: pd.DataFrame) -> "pa.Table":
+    """Chunk no formato do banco (database.encode_frame ou lido do SQLite) -> tabela Arrow do lago."""
+    schema = lake_schema()
+    arrays = []
+    for field in schema:
+        if field.name == 'uf_sigla':
+            names = encoded[field.name].map(database.UF_NAMES)
+            arrays.append(pa.array(names, type=pa.string(), from_pandas=True))
+            continue
+        values = pa.array(database._integers(encoded[field.name]), type=pa.int64())
+        if field.name in database.DAY_COLUMNS:
+            values = values.cast(pa.int32())
+        arrays.append(values.cast(field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def _partitioning() -> "ds.Partitioning":
+    schema = lake_schema()
+    return ds.partitioning(pa.schema([schema.field(name) for name in PARTITION_COLUMNS]), flavor='hive')
+
+# ============================================================
+# ESCRITA
+# ============================================================
+
+def write_chunk(table: "pa.Table", staging: Path, index: int):
+    """Grava um chunk no diretório de staging (um arquivo por partição tocada)."""
+    ds.write_dataset(
+        table, staging, format='parquet', partitioning=_partitioning(),
+        basename_template=f"parte-{index:05d}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore'
+    )
+
+def staging_dir(lake_dir: Path = None) -> Path:
+    """Diretório temporário ao lado do lago (mesmo sistema de arquivos, para os.replace)."""
+    lake_dir = Path(lake_dir or config.PARQUET_LAKE_DIR)
+    staging = lake_dir.parent / f"{lake_dir.name}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    return staging
+
+def _split_legacy_months(lake_dir: Path):
+    """
+    Lagos gravados só com ano/mes: os arquivos direto no diretório do mês (com a coluna
+    ano_arquivo) são regravados nas subpartições ano_arquivo=AAAA antes da publicação.
+    """
+    field = lake_schema().field('ano_arquivo')
+    for month in sorted(lake_dir.glob('ano=*/mes=*')):
+        files = sorted(month.glob('*.parquet'))
+        if not files:
+            continue
+        table = ds.dataset([str(f) for f in files], format='parquet').to_table()
+        ds.write_dataset(
+            table, month, format='parquet',
+            partitioning=ds.partitioning(pa.schema([field]), flavor='hive'),
+            basename_template="legado-{i}.parquet", existing_data_behavior='overwrite_or_ignore'
+        )
+        for f in files:
+            f.unlink()
+        logger.info(f"Lago Parquet: {month.relative_to(lake_dir)} convertida para ano_arquivo=")
+
+def partition_path(ano: int, mes: int, ano_arquivo: Optional[int]) -> str:
+    """Caminho relativo de uma partição (ano_arquivo ausente: partição nula do Hive)."""
+    source = HIVE_NULL if ano_arquivo is None else ano_arquivo
+    return f"ano={ano}/mes={mes}/ano_arquivo={source}"
+
+def publish(
+    staging: Path,
+    lake_dir: Path = None,
+    cutoff: Optional[date] = None,
+    partitions: Iterable[str] = ()
+) -> List[str]:
+    """
+    Move as partições do staging para o lago, substituindo partição a partição
+    (os.replace): meses ausentes do staging e linhas de outros dumps permanecem intactos.
+    cutoff: início da janela R201 dos dados exportados; o mês que a contém chega truncado
+    e não substitui a partição completa já gravada por um dump anterior.
+    partitions: partições exportadas (partition_path); as que não vierem no staging ficaram
+    sem linhas e são removidas do lago
+    Returns: partições publicadas (ex: 'ano=2021/mes=3/ano_arquivo=2021')
+    """
+    lake_dir = Path(lake_dir or config.PARQUET_LAKE_DIR)
+    _split_legacy_months(lake_dir)
+    truncated = None
+    if cutoff is not None and cutoff.day > 1:
+        truncated = f"ano={cutoff.year}/mes={cutoff.month}"
+    published = []
+    for partition in sorted(staging.glob('ano=*/mes=*/ano_arquivo=*')):
+        relative = partition.relative_to(staging)
+        target = lake_dir / relative
+        if relative.parent.as_posix() == truncated and target.exists():
+            logger.info(f"Lago Parquet: {relative} mantida (mês do corte R201 {cutoff}, exportado incompleto)")
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.exists():
+            previous = target.with_name(f"{target.name}.old")
+            shutil.rmtree(previous, ignore_errors=True)
+            os.replace(target, previous)
+            os.replace(partition, target)
+            shutil.rmtree(previous, ignore_errors=True)
+        else:
+            os.replace(partition, target)
+        published.append(relative.as_posix())
+    for relative in sorted(set(partitions) - set(published)):
+        target = lake_dir / relative
+        if target.exists() and Path(relative).parent.as_posix() != truncated:
+            shutil.rmtree(target)
+            logger.info(f"Lago Parquet: {relative} removida (sem registros no banco)")
+    shutil.rmtree(staging, ignore_errors=True)
+    logger.info(f"Lago Parquet: {len(published)} partições publicadas em {lake_dir}")
+    return published
+
+def write_lake(
+    chunks: Iterable[pd.DataFrame],
+    lake_dir: Path = None,
+    cutoff: Optional[date] = None,
+    partitions: Iterable[str] = ()
+) -> List[str]:
+    """Grava chunks no formato do banco (colunas database.COLUMNS) e publica as partições (ver publish)."""
+    staging = staging_dir(lake_dir)
+    for i, chunk in enumerate(chunks):
+        write_chunk(to_arrow(chunk), staging, i)
+    return publish(staging, lake_dir, cutoff, partitions)
+
+# ============================================================
+# LEITURA (Poda de partições e colunas)
+# ============================================================
+
+def _month_bound(year: int, month: int, after: bool) -> "ds.Expression":
+    """(ano, mes) >= (year, month) se after, senão <=: comparações simples nas chaves de partição."""
+    ano, mes = ds.field('ano'), ds.field('mes')
+    if after:
+        return (ano > year) | ((ano == year) & (mes >= month))
+    return (ano < year) | ((ano == year) & (mes <= month))
+
+def read_lake(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    columns: Optional[Sequence[str]] = None,
+    lake_dir: Path = None
+) -> pd.DataFrame:
+    """
+    Lê o lago filtrando dt_notificacao em [start, end].
+    As partições (ano, mes) fora do intervalo não são abertas; só as colunas pedidas são lidas.
+    """
+    _require_pyarrow()
+    lake_dir = Path(lake_dir or config.PARQUET_LAKE_DIR)
+    if not lake_dir.exists():
+        return pd.DataFrame(columns=list(columns or database.COLUMNS))
+
+    dataset = ds.dataset(lake_dir, format='parquet', partitioning=_partitioning(), schema=lake_schema())
+    date_column = ds.field('dt_notificacao')
+    expression = None
+    # Filtro nas chaves de partição: o pyarrow descarta os diretórios fora do intervalo
+    # sem abri-los; o filtro em dt_notificacao recorta os meses das pontas
+    bounds = []
+    if start is not None:
+        bounds += [_month_bound(start.year, start.month, after=True), date_column >= pa.scalar(start, pa.date32())]
+    if end is not None:
+        bounds += [_month_bound(end.year, end.month, after=False), date_column <= pa.scalar(end, pa.date32())]
+    for bound in bounds:
+        expression = bound if expression is None else expression & bound
+
+    table = dataset.to_table(columns=list(columns) if columns else None, filter=expression)
+    return table.to_pandas(date_as_object=False)
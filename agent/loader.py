@@ -7,10 +7,29 @@ import pandas as pd
 import sqlite3
 import logging
 import numpy as np
+import io
+import os
+import re
+import glob
+import shutil
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
-from datetime import datetime, timedelta
-from typing import Tuple, Optional
-from . import config
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple, Optional
+from . import cache, config, database, lake, metrics, snapshot
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pa_compute
+    import pyarrow.csv as pa_csv
+except ImportError:  # dependência opcional (config.CSV_ENGINE = 'pyarrow')
+    pa = None
+    pa_compute = None
+    pa_csv = None
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +65,31 @@ def clean_date(date_str):
     except:
         return None
 
+def clean_date_series(dates: pd.Series) -> pd.Series:
+    """
+    R101 (vetorizado): mesmas regras de clean_date aplicadas a uma coluna inteira.
+    Os dumps do DATASUS têm poucas centenas de datas distintas em milhões de linhas,
+    então cada string distinta é interpretada uma única vez e o resultado é
+    espalhado pelas linhas via códigos do factorize.
+    Returns: Series object com datetime.date ou None (idêntica a .apply(clean_date))
+    """
+    codes, uniques = pd.factorize(dates, use_na_sentinel=True)
+    uniques = pd.Series(np.asarray(uniques, dtype=object), dtype=object)
+
+    # DD/MM/YYYY (DATASUS padrão) com fallback YYYY-MM-DD (ISO)
+    parsed = pd.to_datetime(uniques, format='%d/%m/%Y', errors='coerce')
+    fallback = parsed.isna()
+    if fallback.any():
+        parsed[fallback] = pd.to_datetime(uniques[fallback], format='%Y-%m-%d', errors='coerce')
+
+    # Validações (R101): data futura ou anterior a 2019 viram None
+    valid = parsed.notna() & (parsed <= datetime.now()) & (parsed.dt.year >= 2019)
+
+    # Última posição guarda o None usado pelo sentinela -1 (valores ausentes)
+    cleaned = np.full(len(uniques) + 1, None, dtype=object)
+    cleaned[:-1][valid.to_numpy()] = parsed[valid].dt.date.to_numpy()
+    return pd.Series(cleaned[codes], index=dates.index, dtype=object)
+
 def classify_outcome(evolucao_value):
     """
     R102: Classificação de Desfecho (Óbito)
@@ -116,193 +160,1130 @@ def classify_vaccination(row) -> Tuple[Optional[bool], int]:
             
     return None, 0 # Desconhecido
 
+# ============================================================
+# CLASSIFICADORES VETORIZADOS (R102-R104)
+# ============================================================
+
+# Tabelas de consulta indexadas pelo código DATASUS: 1=True, 0=False, -1=Ignorado (None)
+OUTCOME_LOOKUP = np.array([-1, 0, 1, 1, -1, -1, -1, -1, -1, -1], dtype=np.int8)  # 1=Cura, 2/3=Óbito
+YES_NO_LOOKUP = np.array([-1, 1, 0, -1, -1, -1, -1, -1, -1, -1], dtype=np.int8)  # 1=Sim, 2=Não
+
+def _lookup_codes(values: pd.Series, lookup: np.ndarray) -> np.ndarray:
+    """Traduz códigos DATASUS via tabela de consulta. Códigos fora da tabela/NaN viram -1."""
+    numeric = pd.to_numeric(values, errors='coerce')
+    if not pd.api.types.is_numeric_dtype(values):
+        # int('1.0') falha na versão por linha: texto só vale como literal inteiro
+        is_text = values.map(lambda v: isinstance(v, str), na_action='ignore').fillna(False).astype(bool)
+        integer_text = values.astype('string').str.fullmatch(r'\s*[+-]?\d+\s*').fillna(False).astype(bool)
+        numeric = numeric.where(~is_text | integer_text)
+    numeric = numeric.to_numpy(dtype=np.float64, na_value=np.nan)
+    codes = np.trunc(numeric)  # Mesma truncagem de int(valor)
+    in_table = (codes >= 0) & (codes < len(lookup))
+    result = np.full(len(codes), -1, dtype=np.int8)
+    result[in_table] = lookup[codes[in_table].astype(np.intp)]
+    return result
+
+def _to_boolean(flags: np.ndarray, index: pd.Index) -> pd.Series:
+    """Converte flags int8 (1/0/-1) em Series boolean anulável."""
+    return pd.Series(pd.arrays.BooleanArray(flags == 1, flags < 0), index=index)
+
+def classify_outcome_series(evolucao: pd.Series) -> pd.Series:
+    """R102 (vetorizado): mesma regra de classify_outcome. Returns: Series boolean anulável"""
+    return _to_boolean(_lookup_codes(evolucao, OUTCOME_LOOKUP), evolucao.index)
+
+def classify_icu_series(uti: pd.Series) -> pd.Series:
+    """R103 (vetorizado): mesma regra de classify_icu. Returns: Series boolean anulável"""
+    return _to_boolean(_lookup_codes(uti, YES_NO_LOOKUP), uti.index)
+
+def classify_vaccination_frame(df: pd.DataFrame) -> Tuple[pd.Series, pd.Series]:
+    """
+    R104 (vetorizado): mesma regra de classify_vaccination, com máscaras por coluna.
+    Dose registrada = valor não nulo e diferente de string vazia.
+    Returns: (esta_vacinado boolean anulável, doses_vacina int8)
+    """
+    def has_dose(col: str) -> np.ndarray:
+        if col not in df.columns:
+            return np.zeros(len(df), dtype=bool)
+        values = df[col]
+        return (values.notna() & (values.astype(object) != '')).to_numpy(dtype=bool)
+
+    has_dose1 = has_dose('DOSE_1_COV')
+    has_dose2 = has_dose('DOSE_2_COV')
+    doses = has_dose1.astype(np.int8) + has_dose2.astype(np.int8)
+
+    # Fallback para coluna genérica VACINA apenas quando não há doses COVID
+    if 'VACINA' in df.columns:
+        flags = _lookup_codes(df['VACINA'], YES_NO_LOOKUP)
+    else:
+        flags = np.full(len(df), -1, dtype=np.int8)
+    flags[doses > 0] = 1
+
+    return _to_boolean(flags, df.index), pd.Series(doses, index=df.index, dtype=np.int8)
+
+# ============================================================
+# CHAVES DE REGISTRO (R202 / Ingestão Incremental)
+# ============================================================
+
+# Campos estáveis de um caso sem NU_NOTIFIC (não mudam quando o desfecho é atualizado)
+IDENTITY_COLUMNS = ['dt_notificacao', 'idade', 'sexo', 'uf_sigla', 'municipio_cod']
+
+def _hash_frame(frame: pd.DataFrame) -> np.ndarray:
+    """
+    Hash estável por linha (int64), independente do dtype inferido em cada chunk:
+    valores numéricos são comparados como float64 (1 == 1.0 == '1') e os demais como texto.
+    """
+    column_hashes = {}
+    for col in frame.columns:
+        values = frame[col]
+        if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            column_hashes[col] = pd.util.hash_array(values.to_numpy(dtype=np.float64, na_value=np.nan))
+        else:
+            numeric = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+            text = values.astype(object).where(values.notna(), '').astype(str).to_numpy(dtype=object)
+            column_hashes[col] = np.where(
+                np.isnan(numeric), pd.util.hash_array(text), pd.util.hash_array(numeric)
+            )
+    combined = pd.util.hash_pandas_object(pd.DataFrame(column_hashes, index=frame.index), index=False)
+    return combined.to_numpy().view(np.int64)
+
+def _record_keys(raw: pd.DataFrame, df_final: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Impressões digitais dos registros transformados.
+    registro_id: NU_NOTIFIC + município quando existir, senão hash dos IDENTITY_COLUMNS
+    row_hash: hash de todo o conteúdo (detecta desfechos atualizados, ex: EVOLUCAO tardia)
+    """
+    registro_id = _hash_frame(df_final[IDENTITY_COLUMNS])
+    if 'NU_NOTIFIC' in raw.columns:
+        has_id = raw['NU_NOTIFIC'].notna().to_numpy()
+        by_id = _hash_frame(pd.DataFrame({
+            'nu_notificacao': raw['NU_NOTIFIC'],
+            'municipio_cod': df_final['municipio_cod']
+        }))
+        registro_id = np.where(has_id, by_id, registro_id)
+    return registro_id, _hash_frame(df_final)
+
 # ============================================================
 # PIPELINE DE CARREGAMENTO
 # ============================================================
 
-def load_from_csv(
-    filepath: Optional[str] = None, 
+# Marcas de origem de cada registro (colunas de database.SCHEMA)
+SOURCE_COLUMNS = ['arquivo_id', 'ano_arquivo']
+
+def source_year(filepath: str) -> Optional[int]:
+    """Ano de um arquivo da série pelo nome (INFLUD20-26-06-2025.csv -> 2020)."""
+    match = re.search(r'INFLUD(\d{2})', Path(filepath).name.upper())
+    return 2000 + int(match.group(1)) if match else None
+
+def resolve_sources(source: Optional[str] = None) -> List[Path]:
+    """
+    Arquivos INFLUD de uma origem: arquivo único, diretório (config.DATA_FILE_PATTERN) ou glob,
+    ordenados por ano. CSV puro, .zip ou .gz (compressão inferida pela extensão no read_csv).
+    """
+    source = str(source or config.DATA_FILE)
+    path = Path(source)
+    if path.is_dir():
+        files = [f for f in path.glob(config.DATA_FILE_PATTERN) if f.is_file()]
+    elif glob.has_magic(source):
+        files = [Path(f) for f in glob.glob(source) if Path(f).is_file()]
+    else:
+        return [path]
+    if not files:
+        raise FileNotFoundError(f"Nenhum arquivo INFLUD encontrado em: {source}")
+    return sorted(files, key=lambda f: (source_year(f) or 0, f.name))
+
+# Leitor pyarrow (config.CSV_ENGINE): todas as colunas lidas como string (um valor sujo,
+# ex: UTI='x', não aborta a leitura). Datas, doses e textos seguem como string (limpos por
+# clean_date_series/transform_data); códigos DATASUS e numéricos viram int64/float64 por
+# chunk quando todos os valores são numéricos, como o pandas infere (senão ficam texto)
+ARROW_TEXT_COLUMNS = set(config.DATE_COLUMNS_CSV) | {'NU_NOTIFIC', 'CS_SEXO', 'SG_UF_NOT', 'ID_MUNICIP'}
+ARROW_BLOCK_SIZE = 16 * 1024 * 1024  # Bytes por bloco (unidade de paralelismo do parser)
+
+def _csv_engine() -> str:
+    """Motor de leitura configurado; 'pyarrow' sem o pacote instalado volta ao pandas."""
+    if config.CSV_ENGINE == 'pyarrow' and pa_csv is None:
+        logger.warning("config.CSV_ENGINE = 'pyarrow', mas pyarrow não está instalado. Usando pandas.")
+        return 'pandas'
+    return config.CSV_ENGINE
+
+def _pandas_chunks(filepath: str, columns: List[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Parser C do pandas, apenas as colunas mapeadas."""
+    return pd.read_csv(
+        filepath,
+        sep=config.SEPARATOR,
+        encoding=config.ENCODING,
+        chunksize=chunk_size,
+        low_memory=False,
+        usecols=lambda c: c.strip().upper() in columns # Carrega apenas colunas mapeadas
+    )
+
+@contextmanager
+def _open_raw(filepath: str) -> Iterator[Any]:
+    """
+    Stream binário do arquivo: .zip pelo primeiro membro, .gz/.bz2 descomprimidos pelo pyarrow.
+    Fecha o stream (e o arquivo .zip) ao sair do bloco.
+    """
+    if str(filepath).lower().endswith('.zip'):
+        with zipfile.ZipFile(filepath) as archive, archive.open(archive.namelist()[0]) as member:
+            yield member
+    else:
+        with pa.input_stream(str(filepath), compression='detect') as stream:
+            yield stream
+
+def _arrow_chunks(filepath: str, columns: List[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    pyarrow.csv em blocos paralelos (threads nativas, sem colunas object intermediárias):
+    só as colunas pedidas são convertidas, já tipadas; os lotes são reagrupados em chunks
+    de chunk_size linhas, como no pandas.
+    """
+    with _open_raw(filepath) as raw:
+        header = io.TextIOWrapper(raw, encoding=config.ENCODING).readline()
+    names = [c.strip().strip('"').upper() for c in header.rstrip('\r\n').split(config.SEPARATOR)]
+    
+    def to_frame(table: "pa.Table", start: int) -> pd.DataFrame:
+        for i, name in enumerate(table.column_names):
+            if name in ARROW_TEXT_COLUMNS:
+                continue
+            # Inteiro (float64 no pandas se houver vazios), senão float64; um valor não
+            # numérico no chunk deixa a coluna como texto, como no pandas
+            for numeric_type in (pa.int64(), pa.float64()):
+                try:
+                    table = table.set_column(i, name, pa_compute.cast(table[name], numeric_type))
+                    break
+                except pa.ArrowInvalid:
+                    pass
+        # Índice contínuo entre chunks, como no read_csv(chunksize=...)
+        df = table.to_pandas()
+        df.index = pd.RangeIndex(start, start + len(df))
+        return df
+    
+    with _open_raw(filepath) as raw:
+        reader = pa_csv.open_csv(
+            raw,
+            read_options=pa_csv.ReadOptions(
+                column_names=names, skip_rows=1, encoding=config.ENCODING,
+                block_size=ARROW_BLOCK_SIZE, use_threads=True
+            ),
+            parse_options=pa_csv.ParseOptions(delimiter=config.SEPARATOR),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=[c for c in columns if c in names],
+                column_types={c: pa.string() for c in columns},
+                strings_can_be_null=True
+            )
+        )
+        
+        pending, rows, start = [], 0, 0
+        for batch in reader:
+            pending.append(batch)
+            rows += batch.num_rows
+            while rows >= chunk_size:
+                table = pa.Table.from_batches(pending)
+                yield to_frame(table.slice(0, chunk_size), start)
+                pending = table.slice(chunk_size).to_batches()
+                rows -= chunk_size
+                start += chunk_size
+        if rows:
+            yield to_frame(pa.Table.from_batches(pending), start)
+
+def iter_csv_chunks(
+    filepath: Optional[str] = None,
     chunk_size: Optional[int] = None,
-    max_chunks: Optional[int] = None
-) -> pd.DataFrame:
-    """Implementa Step 1 e 2 do Pipeline: Load & Select"""
+    max_chunks: Optional[int] = None,
+    columns: Optional[List[str]] = None,
+    source_id: int = 1
+) -> Iterator[pd.DataFrame]:
+    """
+    Step 1 e 2 em modo iterador: lê o CSV bruto chunk a chunk (R100).
+    columns: colunas originais a carregar (padrão: config.COLUNAS_SELECIONADAS)
+    source_id: arquivo_id gravado em cada registro (com o ano do arquivo em ano_arquivo)
+    Colunas ausentes no layout do ano (ex: VACINA_COV antes de 2021) vêm vazias.
+    Motor de leitura: config.CSV_ENGINE ('pandas' ou 'pyarrow').
+    """
     filepath = filepath or config.DATA_FILE
     chunk_size = chunk_size or config.CHUNK_SIZE
     max_chunks = max_chunks or config.MAX_CHUNKS
-    
-    logger.info(f"📂 Lendo CSV bruto: {Path(filepath).name} (R100)")
-    
+
     # Colunas originais para carregar (chaves do mapping)
-    cols_to_load = config.COLUNAS_SELECIONADAS
-    
-    chunks = []
+    cols_to_load = columns or config.COLUNAS_SELECIONADAS
+    year = source_year(filepath)
+    read_chunks = _arrow_chunks if _csv_engine() == 'pyarrow' else _pandas_chunks
+
     try:
-        for i, chunk in enumerate(pd.read_csv(
-            filepath,
-            sep=config.SEPARATOR,
-            encoding=config.ENCODING,
-            chunksize=chunk_size,
-            low_memory=False,
-            usecols=lambda c: c in cols_to_load # Carrega apenas colunas mapeadas
-        )):
-            chunks.append(chunk)
-            if max_chunks and len(chunks) >= max_chunks:
+        for i, chunk in enumerate(read_chunks(filepath, cols_to_load, chunk_size)):
+            # Layouts anuais: nomes normalizados e colunas faltantes preenchidas com NaN
+            chunk.columns = [c.strip().upper() for c in chunk.columns]
+            chunk = chunk.reindex(columns=cols_to_load)
+            chunk['arquivo_id'] = source_id
+            chunk['ano_arquivo'] = year
+            yield chunk
+            if max_chunks and i + 1 >= max_chunks:
                 logger.info(f"⚠️ Limitado a {max_chunks} chunks para teste")
                 break
-                
-        df = pd.concat(chunks, ignore_index=True)
-        logger.info(f"raw_rows: {len(df)}")
-        return df
     except Exception as e:
         logger.error(f"Erro ao ler CSV: {e}")
         raise
 
-def transform_data(df: pd.DataFrame) -> pd.DataFrame:
-    """Implementa Step 3: Transform & Clean (R101-R104, R200-R203)"""
+def load_from_csv(
+    filepath: Optional[str] = None, 
+    chunk_size: Optional[int] = None,
+    max_chunks: Optional[int] = None
+) -> pd.DataFrame:
+    """Implementa Step 1 e 2 do Pipeline: Load & Select"""
+    filepath = filepath or config.DATA_FILE
+    logger.info(f"📂 Lendo CSV bruto: {Path(filepath).name} (R100)")
+
+    chunks = list(iter_csv_chunks(filepath, chunk_size, max_chunks))
+    df = pd.concat(chunks, ignore_index=True)
+    logger.info(f"raw_rows: {len(df)}")
+    return df
+
+def transform_data(
+    df: pd.DataFrame,
+    reference_date: Optional[date] = None,
+    apply_window: bool = True
+) -> pd.DataFrame:
+    """
+    Implementa Step 3: Transform & Clean (R101-R104, R200-R203)
+
+    reference_date: data de referência do corte de 13 meses (R201). Se omitida,
+    usa o max(dt_notificacao) do próprio df. O modo streaming informa o max do
+    arquivo inteiro, para que cada chunk seja filtrado como no carregamento completo.
+    apply_window: False adia o corte R201 (modo 'series': a referência é a da série inteira)
+    """
     logger.info("⚡ Transformando dados (R101-R104)...")
     
     # 1. Limpeza de Datas (R101)
-    # Aplicar clean_date nas colunas mapeadas de data
-    # Mapping: DT_NOTIFIC -> dt_notificacao, etc.
-    
-    # Work on a copy with renamed columns for clarity or process original then rename?
-    # Strategy: Process originals, then map to new Schema
-    
-    # Dates
-    df['dt_notificacao_clean'] = df['DT_NOTIFIC'].apply(clean_date)
-    df['dt_obito_clean'] = df['DT_EVOLUCA'].apply(clean_date)
+    # Vetorizado: uma interpretação por data distinta
+    # Mapping: DT_NOTIFIC -> dt_notificacao, DT_EVOLUCA -> dt_obito
+    dt_notificacao = clean_date_series(df['DT_NOTIFIC'])
     
     # R200: Required Fields
-    original_len = len(df)
-    df = df[df['dt_notificacao_clean'].notna()].copy()
-    logger.info(f"Dropados {original_len - len(df)} registros sem data de notificação (R200)")
+    keep = dt_notificacao.notna().to_numpy(copy=True)
+    logger.info(f"Dropados {int((~keep).sum())} registros sem data de notificação (R200)")
     
     # R201: Filtro Temporal (Últimos 13 meses RELATIVOS AOS DADOS)
     # Como estamos processando dados históricos (2020), usar max(data) do dataset
-    if not df.empty:
-        max_data_dataset = df['dt_notificacao_clean'].max()
-        cutoff_date = max_data_dataset - timedelta(days=395)
-        df = df[df['dt_notificacao_clean'] >= cutoff_date].copy()
-        logger.info(f"Registros após filtro de 13 meses (ref: {max_data_dataset}): {len(df)} (R201)")
-    else:
+    window_days = config.ANALYSIS_WINDOW_DAYS if apply_window else None
+    if not keep.any():
         logger.warning("Dataset vazio após limpeza de datas.")
+    elif window_days is not None:
+        if reference_date is not None:
+            max_data_dataset = reference_date
+        else:
+            max_data_dataset = dt_notificacao[keep].max()
+        cutoff_date = max_data_dataset - timedelta(days=window_days)
+        keep[keep] = (dt_notificacao[keep] >= cutoff_date).to_numpy()
+        logger.info(f"Registros após filtro de 13 meses (ref: {max_data_dataset}): {int(keep.sum())} (R201)")
     
-    # R202: Deduplicação (Simplificado por dt_notificacao se NU_NOTIFIC n/a)
-    # Assumindo que não temos ID único confiável além das linhas, skip complex dedupe for now unless explicit ID col exist
+    # Um único recorte (R200 + R201), sem cópias intermediárias a cada filtro.
+    # O df de entrada não é alterado; as colunas do schema são montadas em df_final.
+    df = df[keep]
     
     # Computed Fields (Schema Target)
-    df['dt_notificacao'] = df['dt_notificacao_clean'] # Already date object
-    df['dt_obito'] = df['dt_obito_clean']
+    df_final = pd.DataFrame(index=df.index)
+    df_final['dt_notificacao'] = dt_notificacao[keep] # Already date object
+    df_final['dt_obito'] = clean_date_series(df['DT_EVOLUCA'])
     
     # Extrair ano/mes/semana de objetos date
     # Precisamos converter para pd.Timestamp para usar acessores .dt
-    temp_dates = pd.to_datetime(df['dt_notificacao'])
-    df['ano'] = temp_dates.dt.year
-    df['mes'] = temp_dates.dt.month
-    df['semana_epi'] = temp_dates.dt.isocalendar().week
+    temp_dates = pd.to_datetime(df_final['dt_notificacao'])
+    df_final['ano'] = temp_dates.dt.year
+    df_final['mes'] = temp_dates.dt.month
+    df_final['semana_epi'] = temp_dates.dt.isocalendar().week
     
     # Outcomes (R102)
-    df['evolucao_raw'] = df['EVOLUCAO']
-    df['teve_obito'] = df['EVOLUCAO'].apply(classify_outcome)
+    df_final['evolucao'] = df['EVOLUCAO']
+    df_final['teve_obito'] = classify_outcome_series(df['EVOLUCAO'])
     
     # ICU (R103)
-    df['foi_uti_raw'] = df['UTI']
-    df['teve_uti'] = df['UTI'].apply(classify_icu)
+    df_final['foi_uti'] = df['UTI']
+    df_final['teve_uti'] = classify_icu_series(df['UTI'])
     
     # Vaccination (R104)
-    # Apply row-wise
-    vac_res = df.apply(classify_vaccination, axis=1)
-    df['esta_vacinado'] = [x[0] for x in vac_res]
-    df['doses_vacina'] = [x[1] for x in vac_res]
-    df['vacina_status_raw'] = df['VACINA']
+    # Máscaras vetorizadas (sem apply row-wise)
+    df_final['vacina_status'] = df['VACINA']
+    df_final['esta_vacinado'], df_final['doses_vacina'] = classify_vaccination_frame(df)
     
     # Demographics
-    df['idade'] = pd.to_numeric(df['NU_IDADE_N'], errors='coerce')
+    idade = pd.to_numeric(df['NU_IDADE_N'], errors='coerce')
     # R203: Age Validation
-    df.loc[(df['idade'] < 0) | (df['idade'] > 120), 'idade'] = None
+    df_final['idade'] = idade.mask((idade < 0) | (idade > 120))
     
-    df['sexo'] = pd.to_numeric(df['CS_SEXO'], errors='coerce') # 1=M, 2=F typically, but check parsing if M/F str
-    # Se sexo for M/F string no CSV:
-    # 1=M, 2=F mapping logic if needed. Assuming DATASUS raw is usually M/F strings or code. 
-    # CSV sample inspection would be good. Standardizing to code:
+    # CS_SEXO vem como string M/F/I no CSV DATASUS. Padronizando para código:
+    # 1=M, 2=F, 9=Ignorado
     sex_map = {'M': 1, 'F': 2, 'I': 9}
-    df['sexo'] = df['CS_SEXO'].map(sex_map).fillna(9).astype(int)
+    df_final['sexo'] = df['CS_SEXO'].map(sex_map).fillna(9).astype(int)
     
-    df['uf_sigla'] = df['SG_UF_NOT']
+    df_final['uf_sigla'] = df['SG_UF_NOT']
     # Ensure column exists or handle gracefully
-    df['municipio_cod'] = df['CO_MUN_NOT'] if 'CO_MUN_NOT' in df.columns else None
+    df_final['municipio_cod'] = df['CO_MUN_NOT'] if 'CO_MUN_NOT' in df.columns else None
     
-    # Select Final Schema Columns
+    # Final Schema Columns (raw columns renamed for clarity in SQL:
+    # EVOLUCAO -> evolucao, UTI -> foi_uti, VACINA -> vacina_status)
     final_cols = [
         'dt_notificacao', 'dt_obito', 'ano', 'mes', 'semana_epi',
-        'evolucao_raw', 'teve_obito',
-        'foi_uti_raw', 'teve_uti',
-        'vacina_status_raw', 'esta_vacinado', 'doses_vacina',
+        'evolucao', 'teve_obito',
+        'foi_uti', 'teve_uti',
+        'vacina_status', 'esta_vacinado', 'doses_vacina',
         'idade', 'sexo', 'uf_sigla', 'municipio_cod'
     ]
     
-    # Rename mapping for raw columns to match schema expected keys if needed
-    # Renaming for clarity in SQL
-    rename_map = {
-        'evolucao_raw': 'evolucao',
-        'foi_uti_raw': 'foi_uti',
-        'vacina_status_raw': 'vacina_status'
+    # R202: Chaves de registro (NU_NOTIFIC quando existir, senão hash estável da linha)
+    # usadas pela ingestão incremental para detectar registros novos ou alterados
+    df_final['registro_id'], df_final['row_hash'] = _record_keys(df, df_final[final_cols])
+    
+    # Arquivo de origem (marcado na leitura por iter_csv_chunks)
+    for name in SOURCE_COLUMNS:
+        df_final[name] = df[name] if name in df.columns else None
+    return df_final[final_cols + ['registro_id', 'row_hash'] + SOURCE_COLUMNS]
+
+def _write_chunk(
+    conn: sqlite3.Connection,
+    df: pd.DataFrame,
+    replace: bool = False,
+    table: str = config.TABLE_NAME
+):
+    """Grava um chunk transformado na tabela alvo (recria a tabela tipada se replace=True)."""
+    if replace:
+        database.create_table(conn, table)
+    database.insert_frame(conn, df, table)
+
+def _create_indexes(conn: sqlite3.Connection):
+    """Indexes (Critical) - criados uma única vez, após a carga (database.CASE_INDEXES)."""
+    database.create_indexes(conn)
+
+def _finalize_ingest(
+    conn: sqlite3.Connection,
+    metadata: Dict[str, Any],
+    histogram: Optional[pd.Series] = None,
+    sources: Sequence[Path] = ()
+):
+    """
+    Índices, rollups diários, histograma e metadados: executados uma única vez ao final de cada carga.
+    histogram: histograma diário acumulado durante a carga (None = recalcular a partir da tabela)
+    sources: arquivos de origem, na ordem dos arquivo_id (1, 2, ...)
+    Valida as contagens (metadata['registros']) antes de gravar metadados e snapshot.
+    """
+    database.write_sources(conn, [(i, Path(f).name, source_year(f)) for i, f in enumerate(sources, 1)])
+    _create_indexes(conn)
+    database.build_rollups(conn)
+    reference = _store_day_histogram(conn, histogram)
+    _validate_counts(conn, int(metadata['registros']))
+    generation = _next_generation(conn)
+    _write_metadata(conn, {**metadata, **reference, 'geracao': generation})
+    _write_snapshot(conn, generation)
+
+def _validate_counts(conn: sqlite3.Connection, expected_rows: int):
+    """Tabela de casos, rollup diário e histograma devem somar os registros gravados."""
+    counts = {
+        config.TABLE_NAME: f"SELECT COUNT(*) FROM {config.TABLE_NAME}",
+        config.ROLLUP_TABLE: f"SELECT COALESCE(SUM(casos), 0) FROM {config.ROLLUP_TABLE}",
+        config.HISTOGRAM_TABLE: f"SELECT COALESCE(SUM(casos), 0) FROM {config.HISTOGRAM_TABLE}",
+    }
+    for table, query in counts.items():
+        rows = conn.execute(query).fetchone()[0]
+        if rows != expected_rows:
+            raise ValueError(f"Validação da carga falhou: {table} com {rows} registros (esperado {expected_rows})")
+
+def _write_snapshot(conn: sqlite3.Connection, generation: int):
+    """Snapshot colunar da geração se config.SNAPSHOT (opcional: uma falha não invalida a carga no banco)."""
+    if not config.SNAPSHOT:
+        return
+    try:
+        snapshot.write_snapshot(conn, config.DATABASE_PATH, generation)
+    except OSError as e:
+        logger.warning(f"Snapshot colunar não gravado: {e}. Leituras usarão o SQLite.")
+
+def _store_day_histogram(conn: sqlite3.Connection, histogram: Optional[pd.Series] = None) -> Dict[str, str]:
+    """
+    Grava o histograma diário e calcula a data efetiva (P99.5) a partir dele.
+    Returns: metadado 'data_efetiva' (vazio se não há datas)
+    """
+    if histogram is None:
+        histogram = database.build_day_histogram(conn)
+    database.write_day_histogram(conn, histogram)
+    if histogram.empty:
+        return {'data_efetiva': ''}
+    
+    days = pd.to_datetime(histogram.index.to_numpy(), unit='D')
+    effective_date = metrics.effective_end_date_from_counts(days, histogram.to_numpy())
+    logger.info(f"Data efetiva (P99.5) registrada: {effective_date.date()}")
+    return {'data_efetiva': effective_date.isoformat()}
+
+def _next_generation(conn: sqlite3.Connection) -> int:
+    """Próxima geração da ingestão (versão dos dados usada pelo cache de leitura)."""
+    return cache.read_generation(conn) + 1
+
+def file_watermark(filepath: str) -> Dict[str, str]:
+    """Marca d'água do arquivo de origem (nome, tamanho, mtime) registrada a cada ingestão."""
+    stat = Path(filepath).stat()
+    return {
+        'arquivo': Path(filepath).name,
+        'tamanho_bytes': str(stat.st_size),
+        'modificado_em': datetime.fromtimestamp(stat.st_mtime).isoformat()
     }
+
+def sources_watermark(files: Sequence[Path]) -> Dict[str, str]:
+    """Marca d'água de uma série: nomes, tamanho total e mtime mais recente."""
+    marks = [file_watermark(f) for f in files]
+    return {
+        'arquivo': ', '.join(m['arquivo'] for m in marks),
+        'tamanho_bytes': str(sum(int(m['tamanho_bytes']) for m in marks)),
+        'modificado_em': max(m['modificado_em'] for m in marks)
+    }
+
+def _write_metadata(conn: sqlite3.Connection, values: Dict[str, Any]):
+    """Grava pares chave/valor na tabela de metadados de ingestão."""
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {config.METADATA_TABLE} (chave TEXT PRIMARY KEY, valor TEXT)"
+    )
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {config.METADATA_TABLE} (chave, valor) VALUES (?, ?)",
+        [(k, str(v)) for k, v in values.items()]
+    )
+
+def read_metadata(conn: sqlite3.Connection) -> Dict[str, str]:
+    """Lê a tabela de metadados de ingestão (vazia se ainda não existir)."""
+    try:
+        return dict(conn.execute(f"SELECT chave, valor FROM {config.METADATA_TABLE}").fetchall())
+    except sqlite3.OperationalError:
+        return {}
+
+@contextmanager
+def _building_database() -> Iterator[sqlite3.Connection]:
+    """
+    Carga completa num arquivo novo ao lado do banco (srag.db -> srag.db.building), publicado
+    com os.replace só depois do commit e da validação: o dashboard continua lendo o banco
+    anterior durante toda a carga e passa ao novo de uma vez. Em caso de falha o arquivo
+    parcial é apagado e o banco publicado fica intacto. Se só a publicação falhar (banco
+    aberto por outro processo no Windows), o arquivo construído é mantido.
+    """
+    config.DATA_DATABASE.mkdir(parents=True, exist_ok=True)
+    building = config.DATABASE_PATH.with_name(f"{config.DATABASE_PATH.name}.building")
+    database.remove_database(building)
     
-    df_final = df[final_cols].rename(columns=rename_map)
-    return df_final
+    conn = sqlite3.connect(building)
+    try:
+        # Arquivo privado: sem WAL nem disputa de locks com os leitores
+        database.apply_bulk_pragmas(conn)
+        # Herda a geração publicada: versões do cache e do snapshot seguem crescentes
+        _write_metadata(conn, {'geracao': _published_generation()})
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.close()
+        database.remove_database(building)
+        raise
+    conn.close()
+    database.publish_database(building, config.DATABASE_PATH)
 
-def ingest_to_sqlite(df: pd.DataFrame):
+def _published_generation() -> int:
+    """Geração do banco publicado em config.DATABASE_PATH (0 se ainda não existir)."""
+    version = cache.database_version(config.DATABASE_PATH)
+    return version[1] if version else 0
+
+def ingest_to_sqlite(
+    df: pd.DataFrame,
+    watermark: Optional[Dict[str, str]] = None,
+    sources: Sequence[Path] = ()
+):
     """Implementa Step 4: Load to SQLite (Schema Def)"""
     logger.info("🗄️ Ingerindo no SQLite (Schema Target)...")
     
-    db_path = config.DATABASE_PATH
-    config.DATA_DATABASE.mkdir(parents=True, exist_ok=True)
+    # Schema tipado (database.SCHEMA) em vez dos tipos inferidos pelo to_sql.
+    # Carga via executemany numa única transação; índices criados ao final.
+    
+    histogram = database.day_histogram(df['dt_notificacao'])
+    with _building_database() as conn:
+        # Save
+        _write_chunk(conn, df, replace=True)
+        _finalize_ingest(
+            conn, {**(watermark or {}), 'registros': len(df), 'modo': 'full'},
+            histogram, sources
+        )
+    
+    logger.info(f"✅ Ingestão completa: {len(df)} registros na tabela {config.TABLE_NAME}")
+    if _lake_enabled():
+        lake.write_lake([database.encode_frame(df)], cutoff=_lake_cutoff(histogram.index.max()))
+
+# ============================================================
+# LAGO PARQUET (config.PARQUET_LAKE)
+# ============================================================
+
+def _lake_enabled() -> bool:
+    """Lago ativo em config e pyarrow disponível."""
+    if not config.PARQUET_LAKE:
+        return False
+    if lake.pa is None:
+        logger.warning("config.PARQUET_LAKE ativo, mas pyarrow não está instalado. Lago não gravado.")
+        return False
+    return True
+
+def _lake_cutoff(last_day: Optional[int]) -> Optional[date]:
+    """
+    Início da janela R201 dos dados gravados (dia mais recente - config.ANALYSIS_WINDOW_DAYS):
+    o mês que o contém chega incompleto ao lago (lake.publish).
+    last_day: dt_notificacao mais recente, em dias desde 1970-01-01 (None/NaN = banco vazio)
+    """
+    if last_day is None or pd.isna(last_day) or config.ANALYSIS_WINDOW_DAYS is None:
+        return None
+    reference_date = database.EPOCH + timedelta(days=int(last_day))
+    return reference_date - timedelta(days=config.ANALYSIS_WINDOW_DAYS)
+
+def export_parquet_lake(
+    chunk_size: Optional[int] = None,
+    days: Optional[Iterable[int]] = None,
+    ano_arquivo: Optional[int] = None
+) -> List[str]:
+    """
+    Exporta a tabela de casos para o lago Parquet (config.PARQUET_LAKE_DIR), substituindo
+    apenas os meses presentes no banco (exceto o mês do corte R201 já presente no lago).
+    Usado após a ingestão incremental ou para criar o lago a partir de um banco existente.
+    days/ano_arquivo: exporta só os meses desses dias (desde 1970-01-01) do dump ano_arquivo,
+    as partições tocadas por uma ingestão incremental
+    Returns: partições publicadas
+    """
+    with database.read_connection() as conn:
+        cutoff = _lake_cutoff(conn.execute(f"SELECT MAX(dt_notificacao) FROM {config.TABLE_NAME}").fetchone()[0])
+        query = f"SELECT {', '.join(database.COLUMNS)} FROM {config.TABLE_NAME}"
+        params, partitions = [], []
+        if days is not None:
+            months = sorted({(d.year, d.month) for d in (database.EPOCH + timedelta(days=int(day)) for day in days)})
+            if not months:
+                return []
+            ranges = []
+            for year, month in months:
+                first = date(year, month, 1)
+                following = date(year + month // 12, month % 12 + 1, 1)
+                ranges.append("dt_notificacao BETWEEN ? AND ?")
+                params += [database.date_to_day(first), database.date_to_day(following) - 1]
+                partitions.append(lake.partition_path(year, month, ano_arquivo))
+            query += f" WHERE ano_arquivo IS ? AND ({' OR '.join(ranges)})"
+            params.insert(0, ano_arquivo)
+        chunks = pd.read_sql(query, conn, params=params, chunksize=chunk_size or config.CHUNK_SIZE)
+        return lake.write_lake(chunks, cutoff=cutoff, partitions=partitions)
+
+def load_from_parquet(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    columns: Optional[Sequence[str]] = None
+) -> pd.DataFrame:
+    """
+    Lê os dados limpos do lago Parquet com dt_notificacao em [start, end].
+    Só as partições ano/mes do intervalo e as colunas pedidas são lidas; ex: últimos 30 dias
+    para plot_daily_cases:
+        end = load_effective_end_date().date()
+        load_from_parquet(end - timedelta(days=30), end, ['dt_notificacao'])
+    """
+    return lake.read_lake(start, end, columns)
+
+# ============================================================
+# PIPELINE STREAMING (Memória constante)
+# ============================================================
+
+def scan_reference_date(
+    filepath: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    max_chunks: Optional[int] = None
+) -> Optional[date]:
+    """
+    Primeira passada do modo streaming: lê apenas DT_NOTIFIC e retorna a maior
+    data válida (R101), usada como referência do corte de 13 meses (R201).
+    """
+    max_date = None
+    for chunk in iter_csv_chunks(filepath, chunk_size, max_chunks, columns=['DT_NOTIFIC']):
+        dates = clean_date_series(chunk['DT_NOTIFIC']).dropna()
+        if not dates.empty:
+            chunk_max = dates.max()
+            max_date = chunk_max if max_date is None else max(max_date, chunk_max)
+    return max_date
+
+def _write_transformed(
+    frames: Iterable[pd.DataFrame],
+    watermark: Optional[Dict[str, str]] = None,
+    sources: Sequence[Path] = ()
+) -> int:
+    """
+    Writer único: grava em ordem os chunks já transformados e cria os índices ao final.
+    Returns: total de registros gravados
+    """
+    total_rows = 0
+    histogram = None
+    lake_staging = lake.staging_dir() if _lake_enabled() else None
+    with _building_database() as conn:
+        for i, df_chunk in enumerate(frames):
+            _write_chunk(conn, df_chunk, replace=(i == 0))
+            total_rows += len(df_chunk)
+            histogram = database.merge_histograms(histogram, database.day_histogram(df_chunk['dt_notificacao']))
+            if lake_staging is not None:
+                lake.write_chunk(lake.to_arrow(database.encode_frame(df_chunk)), lake_staging, i)
+        
+        _finalize_ingest(conn, {**(watermark or {}), 'registros': total_rows, 'modo': 'full'}, histogram, sources)
     
-    conn = sqlite3.connect(db_path)
+    logger.info(f"✅ Ingestão completa: {total_rows} registros na tabela {config.TABLE_NAME}")
+    if lake_staging is not None:
+        lake.publish(lake_staging, cutoff=_lake_cutoff(histogram.index.max() if histogram is not None else None))
+    return total_rows
+
+def ingest_streaming(
+    filepath: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    max_chunks: Optional[int] = None
+) -> int:
+    """
+    Steps 1-4 chunk a chunk: cada chunk é lido, transformado e gravado no SQLite
+    assim que chega, mantendo a memória em poucos chunks mesmo para a série completa.
+    O resultado é idêntico a load_from_csv -> transform_data -> ingest_to_sqlite.
+    Returns: total de registros gravados
+    """
+    filepath = filepath or config.DATA_FILE
+    logger.info(f"📂 Ingestão streaming: {Path(filepath).name} (R100)")
     
-    # Create Table Schema Manually to ensure types
-    # df.to_sql does generic types, good to enforce structure if needed
-    # Rationale: to_sql is faster for PoC. Indexes are critical.
+    reference_date = scan_reference_date(filepath, chunk_size, max_chunks)
+    logger.info(f"Data de referência R201 (primeira passada): {reference_date}")
     
+    frames = (
+        transform_data(chunk, reference_date=reference_date)
+        for chunk in iter_csv_chunks(filepath, chunk_size, max_chunks)
+    )
+    return _write_transformed(frames, file_watermark(filepath), [filepath])
+
+def _transform_in_pool(
+    chunks: Iterable[pd.DataFrame],
+    reference_date: Optional[date],
+    workers: int
+) -> Iterator[pd.DataFrame]:
+    """
+    Distribui transform_data de cada chunk num pool de processos e devolve os
+    resultados na ordem de leitura. A janela de tarefas em voo é limitada
+    (2x workers) para manter a memória constante.
+    """
+    transform = partial(transform_data, reference_date=reference_date)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(transform, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def ingest_parallel(
+    filepath: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    max_chunks: Optional[int] = None,
+    workers: Optional[int] = None
+) -> int:
+    """
+    Steps 1-4 com a transformação de cada chunk em processos paralelos
+    (config.INGEST_WORKERS) e um único writer gravando no SQLite em ordem.
+    O resultado é idêntico ao do modo streaming.
+    Returns: total de registros gravados
+    """
+    filepath = filepath or config.DATA_FILE
+    workers = workers or config.INGEST_WORKERS or os.cpu_count() or 1
+    logger.info(f"📂 Ingestão paralela ({workers} workers): {Path(filepath).name} (R100)")
+    
+    reference_date = scan_reference_date(filepath, chunk_size, max_chunks)
+    logger.info(f"Data de referência R201 (primeira passada): {reference_date}")
+    
+    chunks = iter_csv_chunks(filepath, chunk_size, max_chunks)
+    return _write_transformed(
+        _transform_in_pool(chunks, reference_date, workers), file_watermark(filepath), [filepath]
+    )
+
+# ============================================================
+# SÉRIE INFLUD (Vários arquivos em paralelo)
+# ============================================================
+
+def _ingest_shard(
+    filepath: Path,
+    source_id: int,
+    shard_path: Path,
+    chunk_size: Optional[int] = None,
+    max_chunks: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Worker do modo 'series': lê e transforma um arquivo inteiro num banco shard próprio
+    (sem o corte R201, aplicado na junção com a referência da série inteira).
+    Returns: {'shard', 'registros', 'data_referencia'} (maior dt_notificacao válida do arquivo)
+    """
+    conn = sqlite3.connect(shard_path)
+    database.apply_bulk_pragmas(conn)
+    rows, reference_date = 0, None
     try:
-        # Save
-        df.to_sql(config.TABLE_NAME, conn, if_exists='replace', index=False)
+        for i, chunk in enumerate(iter_csv_chunks(filepath, chunk_size, max_chunks, source_id=source_id)):
+            df_chunk = transform_data(chunk, apply_window=False)
+            _write_chunk(conn, df_chunk, replace=(i == 0))
+            rows += len(df_chunk)
+            if not df_chunk.empty:
+                chunk_max = df_chunk['dt_notificacao'].max()
+                reference_date = chunk_max if reference_date is None else max(reference_date, chunk_max)
+        conn.commit()
+    finally:
+        conn.close()
+    return {'shard': shard_path, 'registros': rows, 'data_referencia': reference_date}
+
+def ingest_series(
+    source: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    max_chunks: Optional[int] = None,
+    workers: Optional[int] = None
+) -> int:
+    """
+    Carga completa da série INFLUD (diretório ou glob, ver resolve_sources): cada arquivo é
+    lido e transformado por um processo próprio num shard SQLite, e os shards são unidos no
+    banco novo com INSERT ... SELECT (sem passar os dados pelo pandas de novo). O tempo total
+    fica próximo ao do maior arquivo, não à soma de todos.
+    R201 usa a data mais recente da série inteira (config.ANALYSIS_WINDOW_DAYS).
+    Returns: total de registros gravados
+    """
+    files = resolve_sources(source)
+    workers = min(len(files), workers or config.INGEST_WORKERS or os.cpu_count() or 1)
+    logger.info(f"📂 Ingestão da série ({len(files)} arquivos, {workers} workers): "
+                f"{', '.join(f.name for f in files)} (R100)")
+    
+    config.DATA_DATABASE.mkdir(parents=True, exist_ok=True)
+    shard_dir = config.DATA_DATABASE / f"{config.DATABASE_PATH.stem}_shards.tmp"
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    shard_dir.mkdir()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_ingest_shard, f, i, shard_dir / f"{i:02d}.db", chunk_size, max_chunks)
+                for i, f in enumerate(files, 1)
+            ]
+            shards = [future.result() for future in futures]
+        
+        dates = [s['data_referencia'] for s in shards if s['data_referencia'] is not None]
+        reference_date = max(dates) if dates else None
+        cutoff_day = None
+        if reference_date is not None and config.ANALYSIS_WINDOW_DAYS is not None:
+            cutoff_day = database.date_to_day(reference_date - timedelta(days=config.ANALYSIS_WINDOW_DAYS))
+        logger.info(f"Data de referência R201 (série): {reference_date}")
         
-        # Indexes (Critical)
+        total_rows = 0
+        columns = ', '.join(database.COLUMNS)
+        with _building_database() as conn:
+            database.create_table(conn)
+            for shard in shards:
+                if shard['registros'] == 0:
+                    continue
+                # ATTACH/DETACH fora de transação
+                conn.commit()
+                conn.execute("ATTACH DATABASE ? AS shard", (str(shard['shard']),))
+                where = "" if cutoff_day is None else f"WHERE dt_notificacao >= {cutoff_day}"
+                total_rows += conn.execute(
+                    f"INSERT INTO {config.TABLE_NAME} ({columns}) "
+                    f"SELECT {columns} FROM shard.{config.TABLE_NAME} {where}"
+                ).rowcount
+                conn.commit()
+                conn.execute("DETACH DATABASE shard")
+            
+            _finalize_ingest(
+                conn, {**sources_watermark(files), 'registros': total_rows, 'modo': 'series'},
+                sources=files
+            )
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+    
+    logger.info(f"✅ Ingestão da série completa: {total_rows} registros na tabela {config.TABLE_NAME}")
+    if _lake_enabled():
+        export_parquet_lake(chunk_size)
+    return total_rows
+
+# ============================================================
+# INGESTÃO INCREMENTAL (Novos dumps DATASUS)
+# ============================================================
+
+STAGING_TABLE = f"{config.TABLE_NAME}_staging"
+
+def _table_is_current(conn: sqlite3.Connection) -> bool:
+    """Verifica se a tabela alvo existe com o schema tipado atual (incluindo as chaves R202)."""
+    columns = [(row[1], row[2]) for row in conn.execute(f"PRAGMA table_info({config.TABLE_NAME})")]
+    return columns == [(name, sql_type.split()[0]) for name, sql_type in database.SCHEMA]
+
+def ingest_incremental(
+    filepath: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    max_chunks: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    Aplica um novo dump (ex: INFLUD20-DD-MM-YYYY.csv) sobre o banco existente sem recarga completa:
+    1. Transforma o dump chunk a chunk numa tabela de staging
+    2. Compara (registro_id, row_hash) com o banco e separa registros novos e alterados
+    3. Remove os registros do mesmo ano de arquivo (ano_arquivo) que saíram do dump
+       (as demais origens de um banco da série ficam intactas)
+    4. Substitui apenas os registros novos/alterados (ex: EVOLUCAO preenchida tardiamente)
+    5. Reaplica a janela de 13 meses (R201) com a referência do novo dump
+    A marca d'água do arquivo fica em config.METADATA_TABLE; um dump já aplicado é ignorado.
+    Returns: contagens {'novos', 'alterados', 'removidos_dump', 'removidos_janela'}
+    """
+    filepath = filepath or config.DATA_FILE
+    watermark = file_watermark(filepath)
+    
+    config.DATA_DATABASE.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(config.DATABASE_PATH)
+    try:
+        database.apply_incremental_pragmas(conn)
+        if not _table_is_current(conn):
+            conn.close()
+            logger.info("Banco sem o schema atual/chaves de registro: executando carga completa (streaming)")
+            total_rows = ingest_streaming(filepath, chunk_size, max_chunks)
+            return {'novos': total_rows, 'alterados': 0, 'removidos_dump': 0, 'removidos_janela': 0}
+        
+        previous = read_metadata(conn)
+        if all(previous.get(k) == v for k, v in watermark.items()):
+            logger.info(f"Dump {watermark['arquivo']} já aplicado (marca d'água inalterada)")
+            return {'novos': 0, 'alterados': 0, 'removidos_dump': 0, 'removidos_janela': 0}
+        
+        logger.info(f"📂 Ingestão incremental: {watermark['arquivo']} (R100)")
+        reference_date = scan_reference_date(filepath, chunk_size, max_chunks)
+        logger.info(f"Data de referência R201 (primeira passada): {reference_date}")
+        
+        # 1. Staging
+        year = source_year(filepath)
+        source_id = database.register_source(conn, Path(filepath).name, year)
+        for i, chunk in enumerate(iter_csv_chunks(filepath, chunk_size, max_chunks, source_id=source_id)):
+            df_chunk = transform_data(chunk, reference_date=reference_date)
+            _write_chunk(conn, df_chunk, replace=(i == 0), table=STAGING_TABLE)
+        
+        # 2. Diferença por multiconjunto (registro_id, row_hash, n) nos dois sentidos, contra
+        # os registros do mesmo ano de arquivo (IS também compara ano NULL, nome fora do padrão)
         cursor = conn.cursor()
-        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_dt_notificacao ON {config.TABLE_NAME}(dt_notificacao)")
-        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_ano_mes ON {config.TABLE_NAME}(ano, mes)")
-        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_teve_obito ON {config.TABLE_NAME}(teve_obito)")
-        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_teve_uti ON {config.TABLE_NAME}(teve_uti)")
+        for statement in [
+            "DROP TABLE IF EXISTS temp._novo",
+            "DROP TABLE IF EXISTS temp._atual",
+            "DROP TABLE IF EXISTS temp._alterados",
+            f"""CREATE TEMP TABLE _novo AS
+                SELECT registro_id, row_hash, COUNT(*) AS n FROM {STAGING_TABLE}
+                GROUP BY registro_id, row_hash""",
+            f"""CREATE TEMP TABLE _atual AS
+                SELECT registro_id, row_hash, COUNT(*) AS n FROM {config.TABLE_NAME}
+                WHERE ano_arquivo IS :ano AND registro_id IN (SELECT registro_id FROM _novo)
+                GROUP BY registro_id, row_hash""",
+            """CREATE TEMP TABLE _alterados AS
+                SELECT registro_id FROM (SELECT * FROM _novo EXCEPT SELECT * FROM _atual)
+                UNION
+                SELECT registro_id FROM (SELECT * FROM _atual EXCEPT SELECT * FROM _novo)""",
+        ]:
+            cursor.execute(statement, {'ano': year})
+        novos, alterados = cursor.execute("""
+            SELECT
+                SUM(registro_id NOT IN (SELECT registro_id FROM _atual)),
+                SUM(registro_id IN (SELECT registro_id FROM _atual))
+            FROM _alterados
+        """).fetchone()
+        
+        # Contagens por dia dos registros que saem (retirados do dump/alterados) e dos que
+        # entram: histograma, rollups e lago são atualizados só nesses dias, sem reagregar
+        # a tabela inteira
+        leaving = database.build_day_histogram(
+            conn, where=(
+                "ano_arquivo IS ? AND (registro_id NOT IN (SELECT registro_id FROM _novo)"
+                " OR registro_id IN (SELECT registro_id FROM _alterados))"
+            ), params=(year,)
+        )
+        entering = database.build_day_histogram(
+            conn, STAGING_TABLE, where="registro_id IN (SELECT registro_id FROM _alterados)"
+        )
+        touched_days = leaving.index.union(entering.index)
+        histogram = database.stored_day_histogram(conn)
+        if histogram is not None:
+            histogram = database.merge_histograms(database.subtract_histograms(histogram, leaving), entering)
+        
+        # 3. Registros que o DATASUS retirou do dump (mesmo ano de arquivo)
+        removidos_dump = cursor.execute(f"""
+            DELETE FROM {config.TABLE_NAME}
+            WHERE ano_arquivo IS ? AND registro_id NOT IN (SELECT registro_id FROM _novo)
+        """, (year,)).rowcount
         
+        # 4. Substituir apenas os registros novos/alterados
+        columns = ', '.join(row[1] for row in conn.execute(f"PRAGMA table_info({STAGING_TABLE})"))
+        cursor.execute(
+            f"DELETE FROM {config.TABLE_NAME} "
+            f"WHERE ano_arquivo IS ? AND registro_id IN (SELECT registro_id FROM _alterados)",
+            (year,)
+        )
+        cursor.execute(f"""
+            INSERT INTO {config.TABLE_NAME} ({columns})
+            SELECT {columns} FROM {STAGING_TABLE}
+            WHERE registro_id IN (SELECT registro_id FROM _alterados)
+        """)
+        
+        # 5. R201: janela de 13 meses relativa ao novo dump
+        removidos, cutoff_day = 0, None
+        if reference_date is not None and config.ANALYSIS_WINDOW_DAYS is not None:
+            cutoff_day = database.date_to_day(reference_date - timedelta(days=config.ANALYSIS_WINDOW_DAYS))
+            removidos = cursor.execute(
+                f"DELETE FROM {config.TABLE_NAME} WHERE dt_notificacao < ?", (cutoff_day,)
+            ).rowcount
+            touched_days = touched_days[touched_days >= cutoff_day]
+            if histogram is not None:
+                histogram = histogram[histogram.index >= cutoff_day]
+        
+        total_rows = cursor.execute(f"SELECT COUNT(*) FROM {config.TABLE_NAME}").fetchone()[0]
+        if histogram is not None and int(histogram.sum()) != total_rows:
+            logger.warning("Histograma diário divergente da tabela de casos; recalculando.")
+            histogram = None
+        database.update_rollups(conn, touched_days, cutoff_day)
+        reference = _store_day_histogram(conn, histogram)
+        generation = _next_generation(conn)
+        _write_metadata(conn, {
+            **watermark, **reference,
+            'registros': total_rows, 'modo': 'incremental', 'geracao': generation
+        })
+        # Snapshot colunar (config.SNAPSHOT) não é regravado: os arrays seguem a ordem física
+        # da tabela e não admitem atualização parcial. A nova geração o invalida (leituras
+        # voltam ao SQLite) até a próxima carga completa
+        cursor.execute(f"DROP TABLE {STAGING_TABLE}")
         conn.commit()
-        logger.info(f"✅ Ingestão completa: {len(df)} registros na tabela {config.TABLE_NAME}")
+        database.end_bulk_load(conn)
+        if _lake_enabled():
+            if config.PARQUET_LAKE_DIR.exists():
+                export_parquet_lake(chunk_size, days=touched_days, ano_arquivo=year)
+            else:
+                export_parquet_lake(chunk_size)
         
+        result = {
+            'novos': int(novos or 0), 'alterados': int(alterados or 0),
+            'removidos_dump': removidos_dump, 'removidos_janela': removidos
+        }
+        logger.info(f"✅ Ingestão incremental completa: {result} ({total_rows} registros na tabela)")
+        return result
     finally:
         conn.close()
 
+def run_pipeline(
+    filepath: Optional[str] = None,
+    max_chunks: Optional[int] = None,
+    mode: Optional[str] = None
+):
+    """
+    Executa o pipeline completo (Steps 1-4) no modo configurado em config.INGEST_MODE:
+    'memory' (carrega o arquivo inteiro), 'streaming' (chunk a chunk),
+    'parallel' (chunks transformados num pool de processos),
+    'incremental' (aplica apenas o que mudou desde o último dump) ou
+    'series' (vários arquivos INFLUD em paralelo).
+    Um diretório ou glob com mais de um arquivo usa sempre o modo 'series'.
+    """
+    mode = mode or config.INGEST_MODE
+    if mode != 'series' and len(resolve_sources(filepath)) > 1:
+        if mode == 'incremental':
+            raise ValueError("A ingestão incremental aplica um único dump; use o modo 'series' para a série")
+        logger.info(f"Origem com vários arquivos: modo '{mode}' substituído por 'series'")
+        mode = 'series'
+    
+    if mode == 'series':
+        ingest_series(filepath, max_chunks=max_chunks)
+    elif mode == 'streaming':
+        ingest_streaming(filepath, max_chunks=max_chunks)
+    elif mode == 'parallel':
+        ingest_parallel(filepath, max_chunks=max_chunks)
+    elif mode == 'incremental':
+        ingest_incremental(filepath, max_chunks=max_chunks)
+    elif mode == 'memory':
+        df_raw = load_from_csv(filepath, max_chunks=max_chunks)
+        filepath = filepath or config.DATA_FILE
+        ingest_to_sqlite(transform_data(df_raw), file_watermark(filepath), [filepath])
+    else:
+        raise ValueError(f"Modo de ingestão desconhecido: {mode}")
+
 # ============================================================
 # INTERFACE DE LEITURA (Para o Agente)
 # ============================================================
 
-def load_from_sqlite() -> pd.DataFrame:
-    """Reads cleaned data for Metrics/Charts"""
+def load_from_sqlite(columns: Optional[Sequence[str]] = None, compact: bool = False) -> pd.DataFrame:
+    """
+    Reads cleaned data for Metrics/Charts
+    columns: projeção (apenas as colunas pedidas de database.COLUMNS; None = todas)
+    compact: tipos compactos (database.COMPACT_DTYPES: flags booleanas, inteiros pequenos, UF categórica)
+    """
     if not config.DATABASE_PATH.exists():
         return pd.DataFrame()
-        
-    conn = sqlite3.connect(config.DATABASE_PATH)
-    try:
+    
+    if columns is not None:
+        columns = tuple(columns)
+        unknown = [name for name in columns if name not in database.COLUMNS]
+        if unknown:
+            raise ValueError(f"Colunas desconhecidas em {config.TABLE_NAME}: {unknown}")
+    
+    # Cache versionado: relê o banco apenas após uma nova ingestão
+    return cache.data_cache.get_or_load(
+        config.DATABASE_PATH, ('casos', columns, compact), partial(_read_cases, columns, compact)
+    )
+
+def _read_cases(columns: Optional[Tuple[str, ...]] = None, compact: bool = False) -> pd.DataFrame:
+    # Colunas quentes em formato compacto: montadas do snapshot mapeado em memória
+    if compact and columns and set(columns) <= set(config.SNAPSHOT_COLUMNS):
+        arrays = load_snapshot()
+        if arrays is not None:
+            return snapshot.to_frame(arrays, columns)
+    
+    with database.read_connection() as conn:
         # Read all for now, Metrics module handles filtering
-        df = pd.read_sql(f"SELECT * FROM {config.TABLE_NAME}", conn)
+        select = '*' if columns is None else ', '.join(columns)
+        df = pd.read_sql(f"SELECT {select} FROM {config.TABLE_NAME}", conn)
+    
+    # Ensure dates are datetime objects for pandas manip
+    # (dias -> datetime64, código IBGE -> sigla da UF)
+    return database.decode_frame(df, compact=compact)
+
+def load_snapshot() -> Optional[Dict[str, np.ndarray]]:
+    """
+    Arrays somente leitura (mapeados em memória, sem cópia) das colunas config.SNAPSHOT_COLUMNS,
+    no formato de metrics.metrics_kernel. None se config.SNAPSHOT estiver desligado ou o
+    snapshot não corresponder à geração do banco.
+    """
+    if not config.SNAPSHOT:
+        return None
+    version = cache.database_version(config.DATABASE_PATH)
+    if version is None:
+        return None
+    return snapshot.open_snapshot(config.DATABASE_PATH, version[1])
+
+def load_daily_rollup(group_by: Sequence[str] = (), db_path: Optional[Path] = None) -> pd.DataFrame:
+    """
+    Contagens diárias pré-agregadas para Metrics/Charts (config.ROLLUP_TABLE).
+    group_by: dimensões extras além do dia ('uf_sigla', 'sexo', 'faixa_etaria').
+    db_path: banco a ler (padrão: config.DATABASE_PATH)
+    Returns: DataFrame com 'dia' (datetime64), dimensões pedidas e database.ROLLUP_MEASURES
+    """
+    db_path = Path(db_path or config.DATABASE_PATH)
+    if not db_path.exists():
+        return pd.DataFrame()
+    
+    group_by = tuple(group_by)
+    return cache.data_cache.get_or_load(
+        db_path, ('rollup', group_by), partial(_read_daily_rollup, db_path, group_by)
+    )
+
+def _read_daily_rollup(db_path: Path, group_by: Tuple[str, ...]) -> pd.DataFrame:
+    with database.read_connection(db_path) as conn:
+        if database.table_exists(conn, config.ROLLUP_TABLE):
+            source = config.ROLLUP_TABLE
+        elif database.table_exists(conn, config.TABLE_NAME):
+            # Banco gerado antes dos rollups: agrega direto da tabela de casos
+            logger.warning("Rollup diário ausente; agregando a partir da tabela de casos.")
+            source = f"({database.rollup_select()})"
+        else:
+            return pd.DataFrame()
         
-        # Ensure dates are datetime objects for pandas manip
-        if 'dt_notificacao' in df.columns:
-            df['dt_notificacao'] = pd.to_datetime(df['dt_notificacao'])
-            
-        return df
-    finally:
-        conn.close()
+        df = pd.read_sql(database.daily_rollup_query(source, group_by), conn)
+    return database.decode_frame(df)
+
+def load_effective_end_date(db_path: Optional[Path] = None) -> Optional[pd.Timestamp]:
+    """
+    Data efetiva (P99.5) registrada na última ingestão: consulta O(1) em vez de
+    recalcular o percentil sobre todas as datas (None em bancos anteriores ao histograma).
+    """
+    db_path = Path(db_path or config.DATABASE_PATH)
+    if not db_path.exists():
+        return None
+    return cache.data_cache.get_or_load(db_path, 'data_efetiva', partial(_read_effective_end_date, db_path))
+
+def _read_effective_end_date(db_path: Path) -> Optional[pd.Timestamp]:
+    with database.read_connection(db_path) as conn:
+        return database.read_effective_end_date(conn)
 
 # Alias for compatibility with run_agent.py
 def clean_data(df):
@@ -3,73 +3,93 @@ Módulo de cálculo de métricas SRAG
 R200: Implementa EXATAMENTE 4 métricas (R201, R202, R203, R204)
 """
 
+import sqlite3
 import pandas as pd
 import numpy as np
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, Optional
-from . import config
+from typing import Dict, Optional, Tuple
+from . import config, database
 
 logger = logging.getLogger(__name__)
 
 
-def get_effective_end_date(df: pd.DataFrame, date_column: str) -> pd.Timestamp:
+# ============================================================
+# KERNEL DE MÉTRICAS (NumPy, passagem única)
+# ============================================================
+
+# Dias desde 1970-01-01 em int64; ausente = valor inteiro do NaT
+MISSING_DAY = np.iinfo(np.int64).min
+NS_PER_DAY = 86_400 * 10**9
+
+# Flags em int8: -1 = não informado, 0 = não, 1 = sim
+FLAG_MISSING, FLAG_NO, FLAG_YES = -1, 0, 1
+
+def day_array(values: pd.Series) -> np.ndarray:
+    """Datas (qualquer unidade/texto) -> dias desde 1970-01-01 em int64 (MISSING_DAY se ausente)."""
+    dates = pd.to_datetime(values, errors='coerce').to_numpy(dtype='datetime64[D]')
+    return dates.view(np.int64)
+
+def flag_array(values: pd.Series, true_value=True) -> np.ndarray:
+    """Coluna booleana/anulável -> flags int8 (FLAG_MISSING, FLAG_NO, FLAG_YES)."""
+    missing = values.isna().to_numpy()
+    flags = values.eq(true_value).fillna(False).to_numpy(dtype=bool).astype(np.int8)
+    flags[missing] = FLAG_MISSING
+    return flags
+
+def _histogram_percentile(timestamps: np.ndarray, cumulative: np.ndarray, q: float) -> float:
     """
-    Determina a data final efetiva ignorando outliers no futuro ou erros de digitação.
-    Usa o Percentil 99.5 das datas como corte.
+    Percentil (método 'linear' do np.percentile) de valores com repetição, dados como
+    valores ordenados + contagem acumulada (o último valor deve ter contagem > 0).
     """
-    try:
-        # Converter para timestamp (int64) para estatística
-        valid_dates = df[df[date_column].notna()][date_column]
-        if valid_dates.empty:
-            return pd.Timestamp.now()
-            
-        timestamps = valid_dates.astype('int64')
-        p99_5 = np.percentile(timestamps, 99.5)
-        
-        effective_date = pd.to_datetime(p99_5)
-        
-        # Validar se não dropou "demais" (Ex: mais de 60 dias do max real)
-        # Se for um dataset histórico "limpo", o max real deve ser usado se a densidade for alta
-        # Mas para garantir robustez:
-        max_real = valid_dates.max()
-        if (max_real - effective_date).days > 365:
-            # Se o P99.5 está a mais de um ano do fim, algo está estranho, 
-            # mas vamos confiar no P99.5 para evitar aquele 2021 isolado
-            logger.warning(f"Data efetiva (P99.5) {effective_date.date()} muito distante do MAX {max_real.date()}. Usando P99.5.")
-            
-        return effective_date
-    except Exception as e:
-        logger.warning(f"Erro ao calcular data efetiva: {e}. Usando MAX.")
-        return df[date_column].max()
+    total = int(cumulative[-1])
+    virtual_index = (total - 1) * (q / 100)
+    previous_index = int(np.floor(virtual_index))
+    next_index = min(previous_index + 1, total - 1)
+    gamma = virtual_index - previous_index
+    
+    previous_value = timestamps[np.searchsorted(cumulative, previous_index, side='right')]
+    next_value = timestamps[np.searchsorted(cumulative, next_index, side='right')]
+    diff = next_value - previous_value
+    if gamma >= 0.5:
+        return next_value - diff * (1 - gamma)
+    return previous_value + diff * gamma
 
-def calculate_case_growth_rate(
-    df: pd.DataFrame,
-    date_column: str = 'dt_notificacao'
+def _effective_end_from_histogram(timestamps: np.ndarray, cumulative: np.ndarray) -> pd.Timestamp:
+    """Data efetiva (P99.5) a partir de timestamps em ns ordenados + contagem acumulada."""
+    effective_date = pd.to_datetime(_histogram_percentile(timestamps, cumulative, 99.5))
+    
+    # Validar se não dropou "demais": P99.5 muito distante do MAX real
+    max_real = pd.Timestamp(timestamps[-1])
+    if (max_real - effective_date).days > 365:
+        logger.warning(f"Data efetiva (P99.5) {effective_date.date()} muito distante do MAX {max_real.date()}. Usando P99.5.")
+    return effective_date
+
+def _growth_from_histogram(
+    timestamps: np.ndarray,
+    cumulative: np.ndarray,
+    reference_date: Optional[pd.Timestamp] = None
 ) -> Dict[str, float]:
     """
-    R201: Taxa de Aumento de Casos
-    Compara últimos 30 dias vs 30 dias anteriores.
-    Fórmula: ((casos_30d - casos_30d_ant) / casos_30d_ant) * 100
+    R201 a partir de timestamps em ns ordenados + contagem acumulada.
+    reference_date: data efetiva já conhecida (ex: registrada na ingestão); None = calcular o P99.5
     """
-    df = df.copy()
-    df[date_column] = pd.to_datetime(df[date_column], errors='coerce')
-    df = df[df[date_column].notna()]
-    
-    if df.empty:
+    if cumulative.size == 0 or cumulative[-1] == 0:
         return {'growth_rate': 0.0, 'current_period_cases': 0, 'previous_period_cases': 0, 'growth_absolute': 0}
     
     # Usar data efetiva (P99.5) para ignorar outliers de 2021 isolados
-    max_date = get_effective_end_date(df, date_column)
+    max_date = reference_date if reference_date is not None else _effective_end_from_histogram(timestamps, cumulative)
     logger.info(f"Data de referência para métricas (P99.5): {max_date.date()}")
     
-    # Período atual (últimos 30 dias a partir da data efetiva)
-    date_start_current = max_date - timedelta(days=30)
-    casos_30d = len(df[df[date_column] > date_start_current])
+    def cases_up_to(limit: pd.Timestamp) -> int:
+        position = np.searchsorted(timestamps, limit.value, side='right')
+        return int(cumulative[position - 1]) if position > 0 else 0
     
-    # Período anterior (30 dias anteriores)
+    # Período atual (últimos 30 dias) e anterior (30 dias antes dele)
+    date_start_current = max_date - timedelta(days=30)
     date_start_prev = date_start_current - timedelta(days=30)
-    casos_30d_ant = len(df[(df[date_column] > date_start_prev) & (df[date_column] <= date_start_current)])
+    casos_30d = int(cumulative[-1]) - cases_up_to(date_start_current)
+    casos_30d_ant = cases_up_to(date_start_current) - cases_up_to(date_start_prev)
     
     # Cálculo (R201)
     growth_absolute = casos_30d - casos_30d_ant
@@ -82,6 +102,115 @@ def calculate_case_growth_rate(
         'growth_absolute': int(growth_absolute)
     }
 
+def _day_histogram(days: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Dias int64 -> (timestamps em ns de cada dia do intervalo, contagem acumulada) via bincount."""
+    valid = days[days != MISSING_DAY]
+    if valid.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    first = valid.min()
+    cumulative = np.cumsum(np.bincount(valid - first))
+    timestamps = (first + np.arange(cumulative.size, dtype=np.int64)) * NS_PER_DAY
+    return timestamps, cumulative
+
+def _flag_counts(flags: np.ndarray) -> Tuple[int, int]:
+    """Flags int8 -> (casos com a flag informada, casos com a flag = sim)."""
+    _, no, yes = np.bincount(flags.astype(np.intp) + 1, minlength=3)[:3]
+    return int(no + yes), int(yes)
+
+def _rate(numerator: int, denominator: int) -> float:
+    """Percentual arredondado em 2 casas (0.0 se não há denominador)."""
+    return round((numerator / denominator * 100) if denominator > 0 else 0.0, 2)
+
+def _mortality(flags: np.ndarray) -> Dict[str, float]:
+    total_cases, deaths = _flag_counts(flags)
+    return {'total_cases': total_cases, 'deaths': deaths, 'mortality_rate': _rate(deaths, total_cases)}
+
+def _icu(flags: np.ndarray) -> Dict[str, float]:
+    total_cases, icu_cases = _flag_counts(flags)
+    return {'total_cases': total_cases, 'icu_cases': icu_cases, 'icu_rate': _rate(icu_cases, total_cases)}
+
+def _vaccination(flags: np.ndarray) -> Dict[str, float]:
+    total_cases, vaccinated = _flag_counts(flags)
+    return {'total_cases': total_cases, 'vaccinated': vaccinated, 'vaccination_rate': _rate(vaccinated, total_cases)}
+
+def metrics_kernel(
+    days: np.ndarray,
+    outcome: np.ndarray,
+    icu: np.ndarray,
+    vaccinated: np.ndarray
+) -> Dict[str, Dict]:
+    """
+    Calcula as 4 métricas (com denominadores) em uma passagem por array, sem DataFrames
+    intermediários. days: int64 (dias desde 1970-01-01); flags: int8 (-1/0/1).
+    """
+    return {
+        'growth': _growth_from_histogram(*_day_histogram(np.asarray(days, dtype=np.int64))),
+        'mortality': _mortality(np.asarray(outcome, dtype=np.int8)),
+        'icu': _icu(np.asarray(icu, dtype=np.int8)),
+        'vaccination': _vaccination(np.asarray(vaccinated, dtype=np.int8))
+    }
+
+# ============================================================
+# MÉTRICAS (R201-R204)
+# ============================================================
+
+def get_effective_end_date(df: pd.DataFrame, date_column: str) -> pd.Timestamp:
+    """
+    Determina a data final efetiva ignorando outliers no futuro ou erros de digitação.
+    Usa o Percentil 99.5 das datas como corte.
+    """
+    try:
+        valid_dates = df[df[date_column].notna()][date_column]
+        if valid_dates.empty:
+            return pd.Timestamp.now()
+        
+        # Timestamps em ns independentemente da unidade da coluna (pandas >= 2 usa s/ms/us/ns)
+        timestamps, counts = np.unique(
+            valid_dates.to_numpy(dtype='datetime64[ns]').view(np.int64), return_counts=True
+        )
+        return _effective_end_from_histogram(timestamps, np.cumsum(counts))
+    except Exception as e:
+        logger.warning(f"Erro ao calcular data efetiva: {e}. Usando MAX.")
+        return df[date_column].max()
+
+def effective_end_date_from_counts(days: pd.Series, counts: pd.Series) -> pd.Timestamp:
+    """
+    Mesma data efetiva (P99.5) de get_effective_end_date, calculada a partir de
+    contagens diárias (ex: rollup) sem expandir uma linha por caso.
+    """
+    timestamps, cumulative = _counts_histogram(days, counts)
+    if cumulative.size == 0:
+        return pd.Timestamp.now()
+    return _effective_end_from_histogram(timestamps, cumulative)
+
+def _counts_histogram(days: pd.Series, counts: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """(datas, contagens) -> (timestamps em ns ordenados, contagem acumulada)."""
+    timestamps = pd.to_datetime(pd.Series(np.asarray(days))).to_numpy(dtype='datetime64[ns]')
+    counts = np.asarray(counts, dtype=np.int64)
+    valid = ~np.isnat(timestamps) & (counts > 0)
+    timestamps = timestamps[valid].view(np.int64)
+    order = np.argsort(timestamps, kind='stable')
+    return timestamps[order], np.cumsum(counts[valid][order])
+
+def _growth_from_counts(
+    days: pd.Series,
+    counts: pd.Series,
+    reference_date: Optional[pd.Timestamp] = None
+) -> Dict[str, float]:
+    """R201 a partir de contagens diárias (mesma regra de calculate_case_growth_rate)."""
+    return _growth_from_histogram(*_counts_histogram(days, counts), reference_date)
+
+def calculate_case_growth_rate(
+    df: pd.DataFrame,
+    date_column: str = 'dt_notificacao'
+) -> Dict[str, float]:
+    """
+    R201: Taxa de Aumento de Casos
+    Compara últimos 30 dias vs 30 dias anteriores.
+    Fórmula: ((casos_30d - casos_30d_ant) / casos_30d_ant) * 100
+    """
+    return _growth_from_histogram(*_day_histogram(day_array(df[date_column])))
+
 def calculate_mortality_rate(
     df: pd.DataFrame,
     outcome_column: str = 'teve_obito',
@@ -91,20 +220,8 @@ def calculate_mortality_rate(
     R202: Taxa de Mortalidade
     Fórmula: (total_óbitos / total_casos) * 100
     """
-    # Filtrar apenas casos com evolução definida (R202)
-    # teve_obito is boolean or None (NaN)
-    df_valid = df[df[outcome_column].notna()].copy()
-    
-    total_cases = len(df_valid)
-    deaths = (df_valid[outcome_column] == death_value).sum()
-    
-    mortality_rate = (deaths / total_cases * 100) if total_cases > 0 else 0.0
-    
-    return {
-        'total_cases': int(total_cases),
-        'deaths': int(deaths),
-        'mortality_rate': round(mortality_rate, 2)
-    }
+    # Apenas casos com evolução definida (R202)
+    return _mortality(flag_array(df[outcome_column], death_value))
 
 def calculate_icu_occupancy_rate(
     df: pd.DataFrame,
@@ -115,19 +232,8 @@ def calculate_icu_occupancy_rate(
     R203: Taxa de Ocupação de UTI
     Fórmula: (casos_uti / total_casos) * 100
     """
-    # Filtrar registros com informação de UTI (R203)
-    df_valid = df[df[icu_column].notna()].copy()
-    
-    total_cases = len(df_valid)
-    icu_cases = (df_valid[icu_column] == icu_yes_value).sum()
-    
-    icu_rate = (icu_cases / total_cases * 100) if total_cases > 0 else 0.0
-    
-    return {
-        'total_cases': int(total_cases),
-        'icu_cases': int(icu_cases),
-        'icu_rate': round(icu_rate, 2)
-    }
+    # Apenas registros com informação de UTI (R203)
+    return _icu(flag_array(df[icu_column], icu_yes_value))
 
 def calculate_vaccination_rate(
     df: pd.DataFrame,
@@ -138,36 +244,115 @@ def calculate_vaccination_rate(
     R204: Taxa de Vacinação
     Fórmula: (casos_vacinados / total_casos) * 100
     """
-    # Tratar valores ausentes adequadamente (R204)
-    # Data workflow says: esta_vacinado Boolean
-    df_valid = df[df[vaccine_column].notna()].copy()
+    # Valores ausentes ficam fora do denominador (R204)
+    return _vaccination(flag_array(df[vaccine_column], vaccinated_value))
+
+def calculate_all_metrics(df: pd.DataFrame) -> Dict[str, Dict]:
+    """
+    Calcula todas as 4 métricas-chave obrigatórias.
+    """
+    logger.info("=" * 80)
+    logger.info("CÁLCULO DE MÉTRICAS OBRIGATÓRIAS (ENGENHARIA)")
+    logger.info("=" * 80)
+    
+    metrics = metrics_kernel(
+        day_array(df['dt_notificacao']),
+        flag_array(df['teve_obito']),
+        flag_array(df['teve_uti']),
+        flag_array(df['esta_vacinado'])
+    )
     
-    total_cases = len(df_valid)
-    vaccinated = (df_valid[vaccine_column] == vaccinated_value).sum()
+    return _log_metrics(metrics)
+
+def calculate_all_metrics_from_daily(
+    daily: pd.DataFrame,
+    reference_date: Optional[pd.Timestamp] = None
+) -> Dict[str, Dict]:
+    """
+    Calcula as 4 métricas a partir do rollup diário (loader.load_daily_rollup),
+    com o mesmo formato de calculate_all_metrics. O custo depende do número de dias,
+    não do número de casos.
+    reference_date: data efetiva registrada na ingestão (loader.load_effective_end_date)
+    """
+    logger.info("=" * 80)
+    logger.info("CÁLCULO DE MÉTRICAS OBRIGATÓRIAS (ROLLUP DIÁRIO)")
+    logger.info("=" * 80)
     
-    vaccination_rate = (vaccinated / total_cases * 100) if total_cases > 0 else 0.0
+    totals = {name: int(daily[name].sum()) for name in [
+        'obitos', 'casos_desfecho', 'casos_uti', 'casos_uti_informado',
+        'casos_vacinados', 'casos_vacina_informada'
+    ]}
     
-    return {
-        'total_cases': int(total_cases),
-        'vaccinated': int(vaccinated),
-        'vaccination_rate': round(vaccination_rate, 2)
+    metrics = {
+        'growth': _growth_from_counts(daily['dia'], daily['casos'], reference_date),
+        'mortality': {
+            'total_cases': totals['casos_desfecho'],
+            'deaths': totals['obitos'],
+            'mortality_rate': _rate(totals['obitos'], totals['casos_desfecho'])
+        },
+        'icu': {
+            'total_cases': totals['casos_uti_informado'],
+            'icu_cases': totals['casos_uti'],
+            'icu_rate': _rate(totals['casos_uti'], totals['casos_uti_informado'])
+        },
+        'vaccination': {
+            'total_cases': totals['casos_vacina_informada'],
+            'vaccinated': totals['casos_vacinados'],
+            'vaccination_rate': _rate(totals['casos_vacinados'], totals['casos_vacina_informada'])
+        }
     }
+    
+    return _log_metrics(metrics)
 
-def calculate_all_metrics(df: pd.DataFrame) -> Dict[str, Dict]:
+def calculate_all_metrics_sql(conn: sqlite3.Connection, table: str = config.TABLE_NAME) -> Dict[str, Dict]:
     """
-    Calcula todas as 4 métricas-chave obrigatórias.
+    Calcula as 4 métricas com consultas agregadas sobre a tabela de casos (SQL pushdown),
+    com o mesmo formato de calculate_all_metrics e sem carregar os casos em memória.
     """
     logger.info("=" * 80)
-    logger.info("CÁLCULO DE MÉTRICAS OBRIGATÓRIAS (ENGENHARIA)")
+    logger.info("CÁLCULO DE MÉTRICAS OBRIGATÓRIAS (SQL)")
     logger.info("=" * 80)
     
+    # R202-R204: COUNT(coluna) ignora NULL, igual ao filtro notna() do caminho pandas
+    deaths, outcomes, icu_cases, icu_known, vaccinated, vaccine_known = conn.execute(f"""
+        SELECT
+            COALESCE(SUM(teve_obito), 0), COUNT(teve_obito),
+            COALESCE(SUM(teve_uti), 0), COUNT(teve_uti),
+            COALESCE(SUM(esta_vacinado), 0), COUNT(esta_vacinado)
+        FROM {table}
+    """).fetchone()
+    
+    # R201: histograma diário gravado na ingestão (ou GROUP BY coberto por idx_casos_cobertura)
+    # -> P99.5 e janelas de 30 dias
+    days, reference_date = None, None
+    if table == config.TABLE_NAME:
+        days = database.read_day_histogram(conn)
+        reference_date = database.read_effective_end_date(conn)
+    if days is None:
+        days = database.decode_frame(database.build_day_histogram(conn, table).reset_index())
+    
     metrics = {
-        'growth': calculate_case_growth_rate(df),
-        'mortality': calculate_mortality_rate(df),
-        'icu': calculate_icu_occupancy_rate(df),
-        'vaccination': calculate_vaccination_rate(df)
+        'growth': _growth_from_counts(days['dia'], days['casos'], reference_date),
+        'mortality': {
+            'total_cases': int(outcomes),
+            'deaths': int(deaths),
+            'mortality_rate': _rate(deaths, outcomes)
+        },
+        'icu': {
+            'total_cases': int(icu_known),
+            'icu_cases': int(icu_cases),
+            'icu_rate': _rate(icu_cases, icu_known)
+        },
+        'vaccination': {
+            'total_cases': int(vaccine_known),
+            'vaccinated': int(vaccinated),
+            'vaccination_rate': _rate(vaccinated, vaccine_known)
+        }
     }
     
+    return _log_metrics(metrics)
+
+def _log_metrics(metrics: Dict[str, Dict]) -> Dict[str, Dict]:
     logger.info(f"✓ Crescimento (30d): {metrics['growth']['growth_rate']:+.2f}%")
     logger.info(f"✓ Mortalidade: {metrics['mortality']['mortality_rate']:.2f}%")
     logger.info(f"✓ Ocupação UTI: {metrics['icu']['icu_rate']:.2f}%")
@@ -3,14 +3,180 @@ Módulo de geração de relatórios SRAG
 R400-R410: Estrutura obrigatória e cores do sistema
 """
 
+import os
+import shutil
+import hashlib
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
 import logging
 from . import config
 from xhtml2pdf import pisa
 
 logger = logging.getLogger(__name__)
 
+# ============================================================
+# CONVERSÃO HTML -> PDF (Processos paralelos, cache por conteúdo)
+# ============================================================
+
+def html_to_pdf(html_content: str, output_path: str) -> bool:
+    """Converte HTML string para arquivo PDF usando xhtml2pdf (roda nos processos do pool)."""
+    try:
+        with open(output_path, "wb") as result_file:
+            # pisa.CreatePDF expects text, not bytes for the source, but binary for dest
+            pisa_status = pisa.CreatePDF(html_content, dest=result_file)
+        
+        if pisa_status.err:
+            logger.error(f"Erro ao gerar PDF: {pisa_status.err}")
+            return False
+        return True
+    except Exception as e:
+        logger.error(f"Exceção na conversão PDF (Detalhe): {e}", exc_info=True)
+        return False
+
+# Pool de processos da conversão: criado no primeiro uso e compartilhado entre relatórios
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
+def _pdf_workers() -> int:
+    return config.PDF_WORKERS if config.PDF_WORKERS is not None else (os.cpu_count() or 1)
+
+def _conversion_pool() -> Optional[ProcessPoolExecutor]:
+    global _pdf_pool
+    if _pdf_workers() <= 1:
+        return None
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(max_workers=_pdf_workers())
+        return _pdf_pool
+
+def shutdown_pdf_pool(terminate: bool = False):
+    """
+    Encerra o pool da conversão (recriado sob demanda).
+    terminate: não espera e cancela as tarefas pendentes (lote que estourou o prazo). Uma
+    conversão já em execução não é interrompida: o processo segue até terminá-la e sai
+    """
+    global _pdf_pool
+    with _pdf_pool_lock:
+        pool, _pdf_pool = _pdf_pool, None
+    if pool is not None:
+        pool.shutdown(wait=not terminate, cancel_futures=terminate)
+
+def pdf_cache_key(html_content: str, volatile: Sequence[str] = ()) -> str:
+    """
+    Hash (16 hex) do HTML sem os trechos voláteis (ex: horário 'Gerado em'), que mudariam
+    a chave a cada execução sem alterar o conteúdo do relatório.
+    """
+    for text in volatile:
+        html_content = html_content.replace(text, '')
+    return hashlib.sha256(html_content.encode('utf-8')).hexdigest()[:16]
+
+def _evict_cached_pdfs(cache_dir: Path, keep: set):
+    """Mantém os config.PDF_CACHE_MAX_FILES PDFs usados mais recentemente (mtime)."""
+    cached = sorted(
+        (f for f in cache_dir.glob('*.pdf') if f not in keep and not f.name.endswith('.tmp.pdf')),
+        key=lambda f: f.stat().st_mtime_ns, reverse=True
+    )
+    for stale in cached[max(config.PDF_CACHE_MAX_FILES - len(keep), 0):]:
+        stale.unlink(missing_ok=True)
+
+def _finished(futures: Dict[Path, Future]) -> Dict[Path, bool]:
+    """Resultados das conversões concluídas (sem as canceladas ou que falharam no pool)."""
+    return {
+        path: future.result() for path, future in futures.items()
+        if future.done() and not future.cancelled() and future.exception() is None
+    }
+
+def _convert_pending(pending: Dict[Path, Tuple[str, str]], timeout: Optional[float]) -> Dict[Path, bool]:
+    """{destino: (html, arquivo temporário)} -> {destino: sucesso}, no pool com um prazo para o lote."""
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    results, retried = {}, False
+    while pending:
+        pool = _conversion_pool()
+        if pool is None:
+            # No processo atual (config.PDF_WORKERS <= 1): sem como interromper por timeout
+            results.update({path: html_to_pdf(html, tmp) for path, (html, tmp) in pending.items()})
+            break
+        
+        futures = {}
+        try:
+            for path, (html, tmp) in pending.items():
+                futures[path] = pool.submit(html_to_pdf, html, tmp)
+        except BrokenProcessPool:
+            pass
+        remaining = max(deadline - time.monotonic(), 0) if deadline is not None else None
+        _, late = wait(futures.values(), timeout=remaining)
+        results.update(_finished(futures))
+        pending = {path: job for path, job in pending.items() if path not in results}
+        
+        if late:
+            # Prazo do lote esgotado: descarta o pool (cancela o que não começou) e desiste do resto
+            logger.error(f"Conversão PDF excedeu {timeout}s; {len(pending)} documentos não convertidos.")
+            shutdown_pdf_pool(terminate=True)
+            results.update({path: False for path in pending})
+            break
+        if not pending:
+            break
+        # Processo encerrado (ex: falta de memória): reenvia uma vez num pool novo, depois desiste
+        shutdown_pdf_pool(terminate=True)
+        if retried:
+            logger.error(f"Pool de conversão PDF encerrado novamente; {len(pending)} documentos não convertidos.")
+            results.update({path: False for path in pending})
+            break
+        logger.warning(f"Pool de conversão PDF encerrado; reenviando {len(pending)} documentos num pool novo.")
+        retried = True
+    return results
+
+def convert_documents(
+    documents: Dict[Path, str],
+    cache_dir: Path,
+    volatile: Sequence[str] = (),
+    timeout: Optional[float] = None
+) -> Dict[Path, bool]:
+    """
+    Converte vários HTML em PDF ao mesmo tempo (config.PDF_WORKERS processos), com um prazo
+    para o lote inteiro (config.PDF_TIMEOUT_SECONDS). Cada PDF fica em cache_dir sob o
+    hash do HTML (pdf_cache_key): conteúdo já convertido é copiado sem passar pelo xhtml2pdf
+    (o PDF reaproveitado mantém o 'Gerado em' da primeira conversão).
+    documents: {caminho do PDF: HTML}
+    Returns: {caminho do PDF: sucesso}
+    """
+    timeout = timeout if timeout is not None else config.PDF_TIMEOUT_SECONDS
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    
+    cached, pending = {}, {}
+    for path, html_content in documents.items():
+        cached[path] = cache_dir / f"{pdf_cache_key(html_content, volatile)}.pdf"
+        if cached[path].exists():
+            os.utime(cached[path])
+        elif all(cached[path] != cached[other] for other in pending):
+            pending[path] = (html_content, str(cached[path].with_suffix('.tmp.pdf')))
+    
+    results = _convert_pending(pending, timeout)
+    for path, ok in results.items():
+        # Arquivo temporário + os.replace: o cache nunca guarda PDF parcial
+        tmp = Path(pending[path][1])
+        if ok:
+            os.replace(tmp, cached[path])
+        else:
+            tmp.unlink(missing_ok=True)
+    
+    converted = {}
+    for path in documents:
+        converted[path] = cached[path].exists()
+        if converted[path]:
+            shutil.copyfile(cached[path], path)
+    if pending:
+        _evict_cached_pdfs(cache_dir, keep=set(cached.values()))
+    logger.info(f"PDFs: {len(documents) - len(pending)} reaproveitados, {len(pending)} convertidos")
+    return converted
+
+
 class ReportGenerator:
     """
     Gera relatórios em HTML e PDF seguindo as diretrizes da Fase 4.
@@ -22,20 +188,13 @@ class ReportGenerator:
         # Cores do config.METRIC_COLORS
         self.colors = config.METRIC_COLORS
 
-    def _to_pdf(self, html_content: str, output_path: Path):
-        """Converte HTML string para arquivo PDF usando xhtml2pdf."""
-        try:
-            with open(output_path, "wb") as result_file:
-                # pisa.CreatePDF expects text, not bytes for the source, but binary for dest
-                pisa_status = pisa.CreatePDF(html_content, dest=result_file)
-            
-            if pisa_status.err:
-                logger.error(f"Erro ao gerar PDF: {pisa_status.err}")
-                return False
-            return True
-        except Exception as e:
-            logger.error(f"Exceção na conversão PDF (Detalhe): {e}", exc_info=True)
-            return False
+    def _to_pdf(self, html_content: str, output_path: Path, volatile: Sequence[str] = ()) -> bool:
+        """Converte HTML string para arquivo PDF usando xhtml2pdf (cache por conteúdo)."""
+        return self._to_pdfs({output_path: html_content}, volatile)[output_path]
+
+    def _to_pdfs(self, documents: Dict[Path, str], volatile: Sequence[str] = ()) -> Dict[Path, bool]:
+        """Converte os documentos em paralelo (convert_documents); volatile: trechos fora da chave do cache."""
+        return convert_documents(documents, self.output_dir / "pdf_cache", volatile)
 
     def _get_base_styles(self):
         return f"""
@@ -70,7 +229,10 @@ class ReportGenerator:
         1. Dataset (Métricas e Gráficos)
         2. Notícias (Contexto)
         """
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        now = datetime.now()
+        timestamp = now.strftime("%Y%m%d_%H%M%S")
+        # Horário exibido nos dois relatórios (fora da chave do cache de PDFs)
+        generated_at = now.strftime('%d/%m/%Y %H:%M:%S')
         generated_files = []
 
         # Extrair dados
@@ -91,6 +253,26 @@ class ReportGenerator:
         monthly_chart_path = charts.get('monthly_chart', '')
         monthly_img = str(Path(monthly_chart_path).resolve()) if monthly_chart_path else ""
 
+        # Grades small multiples por UF e faixa etária (DatabaseTool.generate_charts com grids;
+        # seção omitida quando não foram geradas)
+        grid_titles = {
+            'uf_sigla_daily_grid': 'Casos Diários por UF (30 dias)',
+            'uf_sigla_monthly_grid': 'Histórico Mensal por UF',
+            'faixa_etaria_daily_grid': 'Casos Diários por Faixa Etária (30 dias)',
+            'faixa_etaria_monthly_grid': 'Histórico Mensal por Faixa Etária',
+        }
+        grid_boxes = ''.join(
+            f"""
+                <div class="chart-box">
+                    <h3>{title}</h3>
+                    <img src="{Path(charts[key]).resolve()}" class="chart-img">
+                </div>"""
+            for key, title in grid_titles.items() if charts.get(key)
+        )
+        grid_section = f"""<section class="section">
+                <h2>Recortes por UF e Faixa Etária</h2>{grid_boxes}
+            </section>""" if grid_boxes else ""
+
         # --- 1. RELATÓRIO DE DATASET ---
         html_dataset = f"""
         <!DOCTYPE html>
@@ -103,7 +285,7 @@ class ReportGenerator:
         <body>
             <header>
                 <h1>Análise de Dados Epidemiológicos: SRAG</h1>
-                <div class="meta">Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')} | Fonte: DATASUS</div>
+                <div class="meta">Gerado em: {generated_at} | Fonte: DATASUS</div>
             </header>
 
             <section class="section">
@@ -143,6 +325,8 @@ class ReportGenerator:
                 </div>
             </section>
 
+            {grid_section}
+
             <section class="section">
                 <h2>Análise Técnica dos Dados</h2>
                 <div class="insight">
@@ -155,19 +339,13 @@ class ReportGenerator:
         </html>
         """
         
-        # Salvar HTML e PDF Dataset
+        # Salvar HTML Dataset (PDF convertido junto com o de notícias)
         base_name_data = f"relatorio_dataset_{timestamp}"
         path_html_data = self.output_dir / f"{base_name_data}.html"
         path_pdf_data = self.output_dir / f"{base_name_data}.pdf"
         
         with open(path_html_data, 'w', encoding='utf-8') as f:
             f.write(html_dataset)
-        generated_files.append(str(path_html_data))
-        
-        if self._to_pdf(html_dataset, path_pdf_data):
-            generated_files.append(str(path_pdf_data))
-        else:
-             logger.warning(f"Falha ao gerar PDF de dados: {path_pdf_data}")
 
         # --- 2. RELATÓRIO DE NOTÍCIAS ---
         html_news = f"""
@@ -181,7 +359,7 @@ class ReportGenerator:
         <body>
             <header>
                 <h1>Monitoramento de Mídia e Contexto: SRAG</h1>
-                <div class="meta">Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')} | Fontes: Gov.br, DuckDuckGo</div>
+                <div class="meta">Gerado em: {generated_at} | Fontes: Gov.br, DuckDuckGo</div>
             </header>
 
             <section class="section">
@@ -206,19 +384,26 @@ class ReportGenerator:
         </html>
         """
         
-        # Salvar HTML e PDF Notícias
+        # Salvar HTML Notícias
         base_name_news = f"relatorio_news_{timestamp}"
         path_html_news = self.output_dir / f"{base_name_news}.html"
         path_pdf_news = self.output_dir / f"{base_name_news}.pdf"
         
         with open(path_html_news, 'w', encoding='utf-8') as f:
             f.write(html_news)
-        generated_files.append(str(path_html_news))
+
+        # --- 3. PDFs (conversões em paralelo, reaproveitando HTML já convertido) ---
+        converted = self._to_pdfs({path_pdf_data: html_dataset, path_pdf_news: html_news}, volatile=[generated_at])
         
-        if self._to_pdf(html_news, path_pdf_news):
-            generated_files.append(str(path_pdf_news))
-        else:
-             logger.warning(f"Falha ao gerar PDF de notícias: {path_pdf_news}")
+        for path_html, path_pdf, label in [
+            (path_html_data, path_pdf_data, 'dados'),
+            (path_html_news, path_pdf_news, 'notícias'),
+        ]:
+            generated_files.append(str(path_html))
+            if converted[path_pdf]:
+                generated_files.append(str(path_pdf))
+            else:
+                logger.warning(f"Falha ao gerar PDF de {label}: {path_pdf}")
 
         logger.info(f"Relatórios gerados: {len(generated_files)} arquivos.")
         return generated_files
@@ -0,0 +1,156 @@
+"""
+Snapshot colunar das colunas quentes do SRAG
+Arrays de largura fixa (.npy) mapeados em memória + manifesto, gravados a cada ingestão.
+Processos diferentes abrem os mesmos arquivos sem cópia e compartilham o page cache.
+"""
+
+import os
+import json
+import shutil
+import sqlite3
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+from . import config, database
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# FORMATO
+# ============================================================
+
+MANIFEST = "manifest.json"
+
+# Coluna -> (dtype do array, valor de ausente). Datas em dias desde 1970-01-01 (int64,
+# ausente = NaT), flags em int8 -1/0/1 e UF pelo código IBGE: o formato de metrics.metrics_kernel
+ENCODINGS = {
+    'dt_notificacao': ('int64', int(np.iinfo(np.int64).min)),
+    'teve_obito': ('int8', -1),
+    'teve_uti': ('int8', -1),
+    'esta_vacinado': ('int8', -1),
+    'idade': ('int16', -1),
+    'sexo': ('int8', -1),
+    'uf_sigla': ('int8', -1),
+}
+
+READ_CHUNK_ROWS = 200_000
+
+def snapshot_dir(db_path: Path) -> Path:
+    """Diretório do snapshot de um banco (ex: srag.db -> srag_snapshot/)."""
+    db_path = Path(db_path)
+    return db_path.parent / f"{db_path.stem}_snapshot"
+
+# ============================================================
+# ESCRITA (Ingestão)
+# ============================================================
+
+def write_snapshot(conn: sqlite3.Connection, db_path: Path, generation: int) -> Path:
+    """
+    Grava o snapshot das colunas config.SNAPSHOT_COLUMNS para a geração informada.
+    Escrita atômica: arrays num diretório temporário renomeado com os.replace e,
+    por último, o manifesto (leitores nunca veem um snapshot pela metade).
+    Returns: diretório da geração gravada
+    """
+    root = snapshot_dir(db_path)
+    root.mkdir(parents=True, exist_ok=True)
+    target = root / f"g{generation}"
+    staging = root / f"g{generation}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir()
+    
+    columns = list(config.SNAPSHOT_COLUMNS)
+    rows = conn.execute(f"SELECT COUNT(*) FROM {config.TABLE_NAME}").fetchone()[0]
+    arrays = {
+        name: np.lib.format.open_memmap(
+            staging / f"{name}.npy", mode='w+', dtype=ENCODINGS[name][0], shape=(rows,)
+        )
+        for name in columns
+    }
+    
+    # Cópia em blocos (memória constante), na ordem física da tabela
+    position = 0
+    query = f"SELECT {', '.join(columns)} FROM {config.TABLE_NAME} ORDER BY rowid"
+    for chunk in pd.read_sql(query, conn, chunksize=READ_CHUNK_ROWS):
+        end = position + len(chunk)
+        for name in columns:
+            dtype, missing = ENCODINGS[name]
+            values = database._integers(chunk[name])
+            arrays[name][position:end] = values.to_numpy(dtype=np.int64, na_value=missing).astype(dtype)
+        position = end
+    for array in arrays.values():
+        array.flush()
+    del arrays
+    
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+    
+    manifest = {
+        'geracao': generation,
+        'registros': rows,
+        'diretorio': target.name,
+        'colunas': {name: {'dtype': ENCODINGS[name][0], 'ausente': ENCODINGS[name][1]} for name in columns},
+    }
+    manifest_tmp = root / f"{MANIFEST}.tmp"
+    manifest_tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(manifest_tmp, root / MANIFEST)
+    
+    # Gerações anteriores: leitores que já mapearam os arquivos continuam válidos (unlink)
+    for old in root.glob('g*'):
+        if old.name != target.name:
+            shutil.rmtree(old, ignore_errors=True)
+    
+    logger.info(f"Snapshot colunar gravado: {rows} registros em {target}")
+    return target
+
+# ============================================================
+# LEITURA (Zero-copy)
+# ============================================================
+
+# Arrays já mapeados por diretório do snapshot: (geração, {coluna: memmap})
+_opened: Dict[str, tuple] = {}
+
+def open_snapshot(db_path: Path, generation: int) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Abre o snapshot (np.load com mmap_mode='r', sem cópia) se ele corresponder à
+    geração atual do banco. Returns: {coluna: array somente leitura} ou None
+    """
+    root = snapshot_dir(db_path)
+    known = _opened.get(str(root))
+    if known is not None and known[0] == generation:
+        return known[1]
+    
+    try:
+        manifest = json.loads((root / MANIFEST).read_text())
+        if manifest['geracao'] != generation:
+            return None
+        directory = root / manifest['diretorio']
+        arrays = {
+            name: np.load(directory / f"{name}.npy", mmap_mode='r')
+            for name in manifest['colunas']
+        }
+    except (OSError, ValueError, KeyError) as e:
+        logger.debug(f"Snapshot indisponível em {root}: {e}")
+        return None
+    
+    _opened[str(root)] = (generation, arrays)
+    return arrays
+
+def to_frame(arrays: Dict[str, np.ndarray], columns: Sequence[str]) -> pd.DataFrame:
+    """Monta um DataFrame nos tipos de database.COMPACT_DTYPES a partir dos arrays do snapshot."""
+    frame = {}
+    for name in columns:
+        values = arrays[name]
+        missing = values == ENCODINGS[name][1]
+        if name == 'dt_notificacao':
+            frame[name] = pd.Series(values.view('datetime64[D]')).astype('datetime64[s]')
+        elif name == 'uf_sigla':
+            names = pd.Series(values).map(database.UF_NAMES)
+            frame[name] = names.astype('category')
+        elif database.COMPACT_DTYPES.get(name) == 'boolean':
+            frame[name] = pd.Series(pd.arrays.BooleanArray(values == 1, missing))
+        else:
+            dtype = database.COMPACT_DTYPES[name]
+            frame[name] = pd.Series(values).astype(dtype.lower()).astype(dtype).mask(missing)
+    return pd.DataFrame(frame)
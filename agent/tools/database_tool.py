@@ -3,52 +3,210 @@ Tool de interface com o banco de dados SRAG
 R301: Implementa busca de métricas e dados para gráficos
 """
 
-import sqlite3
+import abc
+import threading
 import pandas as pd
-from typing import Dict, Any, List
+from typing import Dict, Any, Optional, Sequence
 import logging
+from functools import partial
 from pathlib import Path
-from .. import config, metrics, loader, charts
+from .. import cache, config, database, metrics, loader, charts
 
 logger = logging.getLogger(__name__)
 
+# ============================================================
+# BACKENDS DE ARMAZENAMENTO (config.STORAGE_BACKEND)
+# ============================================================
+
+class StorageBackend(abc.ABC):
+    """
+    Consultas analíticas usadas pelo DatabaseTool (contagens diárias e métricas).
+    O SQLite continua sendo o banco de ingestão; outros backends leem a partir dele.
+    """
+    
+    name = 'base'
+    
+    def __init__(self, db_path: str):
+        self.db_path = Path(db_path)
+    
+    @abc.abstractmethod
+    def daily_rollup(self, group_by: Sequence[str] = ()) -> pd.DataFrame:
+        """Contagens diárias no formato de loader.load_daily_rollup."""
+    
+    def effective_end_date(self) -> Optional[pd.Timestamp]:
+        """Data efetiva (P99.5) registrada na ingestão."""
+        return loader.load_effective_end_date(self.db_path)
+    
+    def calculate_metrics(self) -> Dict[str, Any]:
+        """As 4 métricas obrigatórias a partir das contagens diárias."""
+        daily = self.daily_rollup()
+        if daily.empty:
+            return {"error": "Banco de dados vazio ou não encontrado"}
+        return metrics.calculate_all_metrics_from_daily(daily, self.effective_end_date())
+
+class SQLiteBackend(StorageBackend):
+    """Rollups gravados no SQLite durante a ingestão (ou SQL pushdown na tabela de casos)."""
+    
+    name = 'sqlite'
+    
+    def daily_rollup(self, group_by: Sequence[str] = ()) -> pd.DataFrame:
+        return loader.load_daily_rollup(group_by, db_path=self.db_path)
+    
+    def calculate_metrics(self) -> Dict[str, Any]:
+        if not self.db_path.exists():
+            return {"error": "Banco de dados vazio ou não encontrado"}
+        
+        with database.read_connection(self.db_path) as conn:
+            has_rollup = database.table_exists(conn, config.ROLLUP_TABLE)
+            if not has_rollup and database.table_exists(conn, config.TABLE_NAME):
+                # Sem rollup: agregações direto na tabela de casos (SQL pushdown)
+                return metrics.calculate_all_metrics_sql(conn)
+        if has_rollup:
+            return super().calculate_metrics()
+        
+        return {"error": "Banco de dados vazio ou não encontrado"}
+
+class DuckDBBackend(StorageBackend):
+    """
+    Motor colunar embarcado (DuckDB, arquivo local ao lado do SQLite: srag.db -> srag.duckdb).
+    A tabela de casos é espelhada do SQLite a cada nova versão do banco e as contagens
+    são agregadas direto dos casos, sem depender dos rollups.
+    """
+    
+    name = 'duckdb'
+    SYNC_CHUNK_ROWS = 500_000
+    
+    def __init__(self, db_path: str):
+        import duckdb  # dependência opcional (ImportError tratado em get_backend)
+        super().__init__(db_path)
+        self._duckdb = duckdb
+        self.duckdb_path = self.db_path.with_suffix('.duckdb')
+    
+    def _connection(self):
+        """
+        Conexão única do processo com o arquivo DuckDB (o DuckDB recusa abrir o mesmo arquivo
+        com configurações diferentes, ex: read_only, no mesmo processo); espelhamento e
+        consultas usam cursores dela.
+        """
+        with _duckdb_lock:
+            con = _duckdb_connections.get(self.duckdb_path)
+            if con is None:
+                con = _duckdb_connections[self.duckdb_path] = self._duckdb.connect(str(self.duckdb_path))
+            return con
+    
+    def _sync(self) -> bool:
+        """Espelha a tabela de casos se a versão do SQLite mudou. Returns: False se não há banco."""
+        version = cache.database_version(self.db_path)
+        if version is None:
+            return False
+        version = f"{version[0]}:{version[1]}"
+        
+        # Um espelhamento por vez (sessões do dashboard rodam em threads)
+        with _duckdb_lock:
+            con = self._connection().cursor()
+            try:
+                con.execute("CREATE TABLE IF NOT EXISTS espelho (chave VARCHAR PRIMARY KEY, valor VARCHAR)")
+                row = con.execute("SELECT valor FROM espelho WHERE chave = 'versao'").fetchone()
+                if row and row[0] == version:
+                    return True
+                
+                logger.info(f"DuckDB: espelhando {config.TABLE_NAME} de {self.db_path.name}...")
+                columns = ', '.join(database.COLUMNS)
+                con.execute("BEGIN")
+                try:
+                    con.execute(
+                        f"CREATE OR REPLACE TABLE {config.TABLE_NAME} "
+                        f"({', '.join(f'{name} BIGINT' for name in database.COLUMNS)})"
+                    )
+                    with database.read_connection(self.db_path) as source:
+                        query = f"SELECT {columns} FROM {config.TABLE_NAME}"
+                        for chunk in pd.read_sql(query, source, chunksize=self.SYNC_CHUNK_ROWS):
+                            con.register('_chunk', chunk)
+                            con.execute(f"INSERT INTO {config.TABLE_NAME} SELECT {columns} FROM _chunk")
+                            con.unregister('_chunk')
+                    con.execute("INSERT OR REPLACE INTO espelho VALUES ('versao', ?)", [version])
+                    con.execute("COMMIT")
+                except Exception:
+                    con.execute("ROLLBACK")
+                    raise
+                return True
+            finally:
+                con.close()
+    
+    def daily_rollup(self, group_by: Sequence[str] = ()) -> pd.DataFrame:
+        if not self._sync():
+            return pd.DataFrame()
+        
+        con = self._connection().cursor()
+        try:
+            source = f"({database.rollup_select()})"
+            df = con.execute(database.daily_rollup_query(source, group_by)).df()
+        finally:
+            con.close()
+        return database.decode_frame(df)
+
+# Conexões DuckDB do processo (arquivo -> conexão), compartilhadas pelas instâncias do backend
+_duckdb_connections: Dict[Path, Any] = {}
+_duckdb_lock = threading.RLock()
+
+BACKENDS = {backend.name: backend for backend in [SQLiteBackend, DuckDBBackend]}
+
+def get_backend(name: Optional[str] = None, db_path: str = str(config.DATABASE_PATH)) -> StorageBackend:
+    """Instancia o backend configurado (config.STORAGE_BACKEND); DuckDB ausente -> SQLite."""
+    name = name or config.STORAGE_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Backend de armazenamento desconhecido: {name}")
+    try:
+        return BACKENDS[name](db_path)
+    except ImportError as e:
+        logger.warning(f"Backend '{name}' indisponível ({e}). Usando SQLite.")
+        return SQLiteBackend(db_path)
+
 class DatabaseTool:
     """
     R301: Fornece métodos estruturados para o agente acessar o banco.
     """
     
-    def __init__(self, db_path: str = str(config.DATABASE_PATH)):
+    def __init__(self, db_path: str = str(config.DATABASE_PATH), backend: Optional[str] = None):
         self.db_path = db_path
+        self.backend = get_backend(backend, db_path)
+
+    def _cached(self, key, load) -> Any:
+        """Resultado derivado cacheado até a próxima ingestão (cache.data_cache)."""
+        return cache.data_cache.get_or_load(
+            Path(self.db_path), ('DatabaseTool', self.backend.name, *key), load
+        )
 
     def get_all_metrics(self) -> Dict[str, Any]:
         """
-        Calcula as 4 métricas obrigatórias a partir do banco.
+        Calcula as 4 métricas obrigatórias a partir das contagens diárias do backend
+        (no SQLite: rollup diário ou consultas agregadas na tabela de casos).
         """
-        logger.info("DatabaseTool: Calculando métricas gerais...")
-        df = loader.load_from_sqlite()
-        if df.empty:
-            return {"error": "Banco de dados vazio ou não encontrado"}
-        
-        return metrics.calculate_all_metrics(df)
+        return self._cached(('metrics',), self._compute_all_metrics)
+
+    def _compute_all_metrics(self) -> Dict[str, Any]:
+        logger.info(f"DatabaseTool: Calculando métricas gerais ({self.backend.name})...")
+        return self.backend.calculate_metrics()
 
     def get_chart_data_daily(self, last_n_days: int = 30) -> Dict[str, Any]:
         """
         Retorna dados estruturados para o gráfico diário.
         """
+        return self._cached(('daily', last_n_days), partial(self._compute_chart_data_daily, last_n_days))
+
+    def _compute_chart_data_daily(self, last_n_days: int) -> Dict[str, Any]:
         logger.info(f"DatabaseTool: Buscando dados diários ({last_n_days} dias)...")
-        df = loader.load_from_sqlite()
-        if df.empty:
+        daily = self.backend.daily_rollup()
+        if daily.empty:
             return {"error": "Dados insuficientes"}
         
         # Filtro simplificado para retorno estruturado
-        df['dt_notificacao'] = pd.to_datetime(df['dt_notificacao'])
-        max_date = df['dt_notificacao'].max()
-        df_filtered = df[df['dt_notificacao'] > (max_date - pd.Timedelta(days=last_n_days))]
-        
-        daily_counts = df_filtered.groupby(df_filtered['dt_notificacao'].dt.date).size()
+        max_date = daily['dia'].max()
+        daily = daily[daily['dia'] > (max_date - pd.Timedelta(days=last_n_days))]
+        daily_counts = daily.set_index('dia')['casos']
         
         return {
-            "dates": [str(d) for d in daily_counts.index],
+            "dates": [d.strftime('%Y-%m-%d') for d in daily_counts.index],
             "counts": [int(c) for c in daily_counts.values],
             "total": int(daily_counts.sum())
         }
@@ -57,14 +215,16 @@ class DatabaseTool:
         """
         Retorna dados estruturados para o gráfico mensal.
         """
+        return self._cached(('monthly', last_n_months), partial(self._compute_chart_data_monthly, last_n_months))
+
+    def _compute_chart_data_monthly(self, last_n_months: int) -> Dict[str, Any]:
         logger.info(f"DatabaseTool: Buscando dados mensais ({last_n_months} meses)...")
-        df = loader.load_from_sqlite()
-        if df.empty:
+        daily = self.backend.daily_rollup()
+        if daily.empty:
             return {"error": "Dados insuficientes"}
         
-        df['dt_notificacao'] = pd.to_datetime(df['dt_notificacao'])
-        df['month'] = df['dt_notificacao'].dt.to_period('M')
-        monthly_counts = df.groupby('month').size().iloc[-last_n_months:]
+        month = daily['dia'].dt.to_period('M')
+        monthly_counts = daily.groupby(month)['casos'].sum().iloc[-last_n_months:]
         
         return {
             "months": [str(m) for m in monthly_counts.index],
@@ -72,37 +232,81 @@ class DatabaseTool:
             "total": int(monthly_counts.sum())
         }
 
-    def generate_charts(self, output_dir: Path) -> Dict[str, str]:
+    def _cached_files(self, key, render) -> Any:
+        """_cached para caminhos de arquivos: renderiza de novo se algum foi apagado desde a última geração."""
+        paths = self._cached(key, render)
+        if not charts.charts_on_disk(paths):
+            cache.data_cache.discard(Path(self.db_path), ('DatabaseTool', self.backend.name, *key))
+            paths = self._cached(key, render)
+        return paths
+
+    def generate_charts(self, output_dir: Path, grids: bool = False) -> Dict[str, str]:
         """
-        Gera os arquivos de gráfico físicos e retorna seus caminhos.
+        Gera os arquivos de gráfico físicos e retorna seus caminhos: série nacional
+        ('daily_chart', 'monthly_chart') e, se grids, grades por grupo ('<dimensão>_<tipo>_grid',
+        ex: 'uf_sigla_daily_grid', uma por dimensão de charts.PACK_DIMENSIONS).
         """
+        key = ('charts', str(output_dir), grids)
+        return self._cached_files(key, partial(self._render_charts, output_dir, grids))
+
+    def _render_charts(self, output_dir: Path, grids: bool) -> Dict[str, str]:
         logger.info(f"DatabaseTool: Gerando gráficos em {output_dir}...")
-        df = loader.load_from_sqlite()
+        daily = self.backend.daily_rollup()
         
-        if df.empty:
+        if daily.empty:
             logger.warning("DatabaseTool: DataFrame vazio, gráficos não serão gerados.")
             return {}
 
-        # Criar diretório se não existir
-        output_dir.mkdir(parents=True, exist_ok=True)
+        # Contagens diárias do rollup (independe do número de casos)
+        # e data efetiva registrada na ingestão
+        daily_counts = daily.set_index('dia')['casos']
+        reference_date = self.backend.effective_end_date()
         
-        # Caminhos dos arquivos
-        daily_chart_path = output_dir / "cases_daily.png"
-        monthly_chart_path = output_dir / "cases_monthly.png"
-        
-        # Gerar Gráfico Diário
-        charts.plot_daily_cases(
-            df, 
-            save_path=str(daily_chart_path)
+        # PNGs endereçados pelo hash da série e dos parâmetros: dados inalterados reaproveitam
+        # as imagens já salvas; as ausentes são renderizadas em paralelo
+        paths = charts.render_charts_cached(
+            {"daily_chart": 'daily', "monthly_chart": 'monthly'},
+            daily_counts,
+            output_dir,
+            reference_date=reference_date
         )
+        if not grids:
+            return paths
+        # Grades small multiples por UF e faixa etária (mesma data efetiva)
+        for by in charts.PACK_DIMENSIONS:
+            pack = self._render_chart_pack(by, output_dir, individual=False, reference_date=reference_date)
+            for kind, path in pack.get('grids', {}).items():
+                paths[f"{by}_{kind}_grid"] = path
+        return paths
+
+    def generate_chart_pack(self, by: str, output_dir: Path, individual: bool = True) -> Dict[str, Dict]:
+        """
+        Pacote de gráficos de uma dimensão de charts.PACK_DIMENSIONS ('uf_sigla', 'faixa_etaria'):
+        grades small multiples e, se individual, um gráfico diário e um mensal por grupo.
+        Returns: {'grids': {tipo: caminho}, 'groups': {grupo: {tipo: caminho}}}
+        """
+        key = ('chart_pack', by, str(output_dir), individual)
+        return self._cached_files(key, partial(self._render_chart_pack, by, output_dir, individual))
+
+    def _render_chart_pack(
+        self,
+        by: str,
+        output_dir: Path,
+        individual: bool,
+        reference_date: Optional[pd.Timestamp] = None
+    ) -> Dict[str, Dict]:
+        logger.info(f"DatabaseTool: Gerando pacote de gráficos por {by} em {output_dir}...")
+        charts.pack_groups(by)  # valida a dimensão
+        rollup = self.backend.daily_rollup(group_by=[by])
+        if rollup.empty:
+            logger.warning("DatabaseTool: DataFrame vazio, pacote de gráficos não será gerado.")
+            return {}
         
-        # Gerar Gráfico Mensal
-        charts.plot_monthly_cases(
-            df,
-            save_path=str(monthly_chart_path)
+        # Agrupa uma vez (dia x grupo) e renderiza o pacote inteiro numa leva paralela
+        return charts.render_chart_pack(
+            charts.pack_counts_from_rollup(rollup, by),
+            output_dir,
+            individual=individual,
+            dimension=charts.PACK_DIMENSIONS[by],
+            reference_date=reference_date if reference_date is not None else self.backend.effective_end_date()
         )
-        
-        return {
-            "daily_chart": str(daily_chart_path),
-            "monthly_chart": str(monthly_chart_path)
-        }
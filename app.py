@@ -20,7 +20,8 @@ from components.metrics_cards import render_metrics
 from components.charts import render_charts
 from components.news_feed import render_news_feed
 from components.sidebar import render_sidebar
-from utils.data_loader import load_metrics_data, get_chart_data, fetch_agent_analysis
+from utils.data_loader import load_metrics_data, get_chart_data, load_chart_packs, fetch_agent_analysis
+from agent.cache import data_cache
 
 # Configuração de Logging para o Streamlit
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -41,6 +42,7 @@ if config_settings.get("refresh"):
     # Clear cache
     st.cache_data.clear()
     st.cache_resource.clear()
+    data_cache.clear()
     st.rerun()
 
 # MAIN CONTENT
@@ -62,7 +64,7 @@ st.markdown("---")
 st.subheader("📊 Tendências Epidemiológicas")
 if df is not None:
     chart_data = get_chart_data(df)
-    render_charts(chart_data)
+    render_charts(chart_data, load_chart_packs())
 
 # INSIGHTS SECTION
 st.markdown("---")
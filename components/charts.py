@@ -5,7 +5,7 @@ import plotly.express as px
 from datetime import datetime
 import pandas as pd
 
-def render_charts(chart_data: dict):
+def render_charts(chart_data: dict, chart_packs: dict = None):
     """Renders tabbed chart interface"""
     if not chart_data:
         st.warning("No data available for charts")
@@ -16,10 +16,11 @@ def render_charts(chart_data: dict):
          st.error("Invalid chart data structure")
          return
 
-    tab1, tab2, tab3 = st.tabs([
+    tab1, tab2, tab3, tab4 = st.tabs([
         "📅 Last 30 Days", 
         "📆 Last 12 Months",
-        "🗺️ Geographic Distribution"
+        "🗺️ Geographic Distribution",
+        "🧩 By State / Age Group"
     ])
     
     with tab1:
@@ -33,6 +34,9 @@ def render_charts(chart_data: dict):
             render_geographic_chart(chart_data['geographic'])
         else:
             st.info("Geographic data unavailable")
+    
+    with tab4:
+        render_chart_packs(chart_packs)
 
 def render_daily_chart(data):
     """Line chart: Daily cases (30 days)"""
@@ -168,3 +172,28 @@ def render_geographic_chart(data):
     )
     
     st.plotly_chart(fig, use_container_width=True)
+
+PACK_LABELS = {'uf_sigla': 'State (UF)', 'faixa_etaria': 'Age Group'}
+
+def render_chart_packs(packs: dict):
+    """Small multiples: one panel per state / age group, plus the full charts of a selected group"""
+    
+    if not packs:
+        st.info("Breakdown charts unavailable")
+        return
+    
+    dimension = st.radio(
+        "Breakdown", list(packs), format_func=lambda by: PACK_LABELS.get(by, by), horizontal=True
+    )
+    pack = packs[dimension]
+    
+    for path in pack.get('grids', {}).values():
+        st.image(path, use_container_width=True)
+    
+    groups = pack.get('groups', {})
+    if groups:
+        group = st.selectbox(PACK_LABELS.get(dimension, dimension), list(groups))
+        columns = st.columns(len(groups[group]))
+        for column, path in zip(columns, groups[group].values()):
+            with column:
+                st.image(path, use_container_width=True)
@@ -36,15 +36,13 @@ def main():
         # 1. Preparação de Dados (Fase 1)
         if not config.DATABASE_PATH.exists():
             logger.info("Banco de dados não detectado. Iniciando pipeline de preparação...")
-            df_raw = loader.load_from_csv(max_chunks=5) # 250k registros para PoC
-            df_clean = loader.clean_data(df_raw)
-            loader.ingest_to_sqlite(df_clean)
+            loader.run_pipeline(max_chunks=5) # 250k registros para PoC
         else:
             logger.info("Banco de dados existente detectado.")
 
         # 2. Execução do Agente (Fase 3)
         srag_agent = agent.SRAGAgent()
-        analysis_result = srag_agent.analyze_status()
+        analysis_result = srag_agent.analyze_status(grids=config.REPORT_GRIDS)
 
         # 3. Geração do Relatório (Fase 4)
         reporter = report_generator.ReportGenerator()
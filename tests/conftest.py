@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Pacotes do projeto (agent, utils) importáveis a partir da raiz
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,51 @@
+"""
+Paridade dos motores de leitura (config.CSV_ENGINE): pandas e pyarrow devem produzir
+os mesmos chunks transformados, inclusive com códigos sujos nas colunas DATASUS.
+"""
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from agent import config, loader
+
+pytest.importorskip('pyarrow')
+
+HEADER = ['NU_NOTIFIC', 'DT_NOTIFIC', 'DT_EVOLUCA', 'EVOLUCAO', 'UTI', 'VACINA',
+          'DOSE_1_COV', 'DOSE_2_COV', 'NU_IDADE_N', 'CS_SEXO', 'SG_UF_NOT', 'CO_MUN_NOT']
+CLEAN = [
+    ['1', '01/03/2021', '', '1.0', '2.0', '1.0', '', '', '34', 'M', 'SP', '355030'],
+    ['2', '02/03/2021', '10/03/2021', '2.0', '1.0', '', '2021-02-01', '', '71', 'F', 'RJ', '330455'],
+    ['3', '2021-03-03', '', '', '9.0', '2.0', '', '', '', 'I', 'MG', ''],
+]
+DIRTY = [
+    ['4', '04/03/2021', '', 'x', '1', '1.0', '', '', '50', 'F', 'sp', '355030'],
+    ['5', '05/03/2021', '', '3.0', 'x', '?', '', '', 'idade', 'M', 'DF', '530010'],
+]
+
+def _write_csv(path, rows):
+    lines = [config.SEPARATOR.join(HEADER)] + [config.SEPARATOR.join(row) for row in rows]
+    path.write_text('\n'.join(lines) + '\n', encoding=config.ENCODING)
+    return str(path)
+
+def _transformed(filepath, engine, monkeypatch):
+    monkeypatch.setattr(config, 'CSV_ENGINE', engine)
+    chunks = loader.iter_csv_chunks(filepath, chunk_size=2)
+    frames = [loader.transform_data(chunk, reference_date=date(2021, 3, 31)) for chunk in chunks]
+    return pd.concat(frames)
+
+@pytest.mark.parametrize('rows', [CLEAN, CLEAN + DIRTY], ids=['limpo', 'sujo'])
+def test_pyarrow_matches_pandas(tmp_path, monkeypatch, rows):
+    filepath = _write_csv(tmp_path / "INFLUD21-01.csv", rows)
+    expected = _transformed(filepath, 'pandas', monkeypatch)
+    result = _transformed(filepath, 'pyarrow', monkeypatch)
+    pd.testing.assert_frame_equal(result, expected)
+    assert len(result) == len(rows)
+
+def test_dirty_code_is_ignored(tmp_path, monkeypatch):
+    filepath = _write_csv(tmp_path / "INFLUD21-01.csv", CLEAN + DIRTY)
+    result = _transformed(filepath, 'pyarrow', monkeypatch).set_index(
+        pd.Index([row[0] for row in CLEAN + DIRTY])
+    )
+    assert pd.isna(result.loc['4', 'teve_obito'])
+    assert pd.isna(result.loc['5', 'teve_uti'])
@@ -0,0 +1,77 @@
+"""
+Lago Parquet: publicação por partição sem perder linhas de outros dumps nem meses completos.
+"""
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from agent import database, lake
+from utils import benchmark_storage
+
+pytest.importorskip('pyarrow')
+
+def _dump(year: int, rows: int = 2000, seed: int = 0) -> pd.DataFrame:
+    """Chunk sintético no formato do banco, marcado com o ano do arquivo de origem."""
+    chunk = next(benchmark_storage.synthetic_chunks(rows, seed=seed))
+    chunk['dt_notificacao'] = chunk['dt_notificacao'].dt.date
+    chunk['ano_arquivo'] = year
+    return database.encode_frame(chunk)
+
+def _rows_by_month(lake_dir, ano_arquivo=None) -> pd.Series:
+    df = lake.read_lake(columns=['dt_notificacao', 'ano_arquivo'], lake_dir=lake_dir)
+    if ano_arquivo is not None:
+        df = df[df['ano_arquivo'] == ano_arquivo]
+    return pd.to_datetime(df['dt_notificacao']).dt.to_period('M').value_counts().sort_index()
+
+def test_month_shared_by_two_dumps_keeps_both(tmp_path):
+    lake_dir = tmp_path / "lake"
+    first, second = _dump(2020, seed=1), _dump(2021, seed=2)
+    lake.write_lake([first], lake_dir)
+    lake.write_lake([second], lake_dir)
+    assert len(lake.read_lake(lake_dir=lake_dir)) == len(first) + len(second)
+
+    # Recarga do segundo dump substitui só as linhas dele
+    lake.write_lake([_dump(2021, rows=500, seed=3)], lake_dir)
+    assert _rows_by_month(lake_dir, 2020).sum() == len(first)
+    assert _rows_by_month(lake_dir, 2021).sum() == 500
+
+def test_cutoff_month_is_not_truncated(tmp_path):
+    lake_dir = tmp_path / "lake"
+    full = _dump(2021, seed=1)
+    lake.write_lake([full], lake_dir)
+    before = _rows_by_month(lake_dir)
+
+    cutoff = date(2020, 6, 15)
+    windowed = full[full['dt_notificacao'] >= database.date_to_day(cutoff)]
+    published = lake.write_lake([windowed], lake_dir, cutoff=cutoff)
+    assert 'ano=2020/mes=6/ano_arquivo=2021' not in published
+    pd.testing.assert_series_equal(_rows_by_month(lake_dir), before)
+
+def test_legacy_month_layout_is_split(tmp_path):
+    lake_dir = tmp_path / "lake"
+    first = _dump(2020, seed=1)
+    # Layout anterior: só ano/mes, com ano_arquivo dentro dos arquivos
+    legacy = lake.ds.partitioning(
+        lake.pa.schema([lake.lake_schema().field(name) for name in ['ano', 'mes']]), flavor='hive'
+    )
+    lake.ds.write_dataset(lake.to_arrow(first), lake_dir, format='parquet', partitioning=legacy)
+
+    lake.write_lake([_dump(2021, seed=2)], lake_dir)
+    assert not list(lake_dir.glob('ano=*/mes=*/*.parquet'))
+    assert _rows_by_month(lake_dir, 2020).sum() == len(first)
+    assert _rows_by_month(lake_dir, 2021).sum() == 2000
+
+def test_emptied_partition_is_removed(tmp_path):
+    lake_dir = tmp_path / "lake"
+    full = _dump(2021, seed=1)
+    lake.write_lake([full], lake_dir)
+    before = _rows_by_month(lake_dir)
+    june, july = lake.partition_path(2020, 6, 2021), lake.partition_path(2020, 7, 2021)
+    assert (lake_dir / june).exists()
+
+    # Exportação parcial (ingestão incremental): junho e julho tocados, junho sem linhas restantes
+    start, end = database.date_to_day(date(2020, 7, 1)), database.date_to_day(date(2020, 7, 31))
+    lake.write_lake([full[full['dt_notificacao'].between(start, end)]], lake_dir, partitions=[june, july])
+    assert not (lake_dir / june).exists()
+    pd.testing.assert_series_equal(_rows_by_month(lake_dir), before.drop(pd.Period('2020-06', 'M')))
@@ -0,0 +1,75 @@
+"""
+Paridade das métricas (R101-R104) entre pandas, SQL pushdown e rollup diário.
+"""
+import sqlite3
+
+import pytest
+
+from agent import cache, config, database, loader, metrics
+from agent.tools.database_tool import DatabaseTool
+from utils import benchmark_storage
+
+ROWS = 20_000
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Base sintética pequena ingerida pelo writer do loader (rollups, histograma e metadados)."""
+    monkeypatch.setattr(config, 'DATA_DATABASE', tmp_path)
+    monkeypatch.setattr(config, 'DATABASE_PATH', tmp_path / "srag.db")
+    loader._write_transformed(benchmark_storage.synthetic_chunks(ROWS, seed=7))
+    cache.data_cache.clear()
+    yield config.DATABASE_PATH
+    cache.data_cache.clear()
+
+@pytest.fixture
+def expected(db_path):
+    result = metrics.calculate_all_metrics(loader.load_from_sqlite())
+    assert len(result) == 4 and all(result.values())
+    return result
+
+def test_sql_matches_pandas(db_path, expected):
+    conn = sqlite3.connect(db_path)
+    try:
+        assert metrics.calculate_all_metrics_sql(conn) == expected
+    finally:
+        conn.close()
+
+def test_rollup_matches_pandas(db_path, expected):
+    tool = DatabaseTool(str(db_path), backend='sqlite')
+    assert tool.get_all_metrics() == expected
+
+def test_rollup_delta_matches_rebuild(db_path):
+    """update_rollups (ingestão incremental) reagrega só os dias tocados e chega ao rollup completo."""
+    conn = sqlite3.connect(db_path)
+    try:
+        days = [day for (day,) in conn.execute(
+            f"SELECT DISTINCT dt_notificacao FROM {config.TABLE_NAME} ORDER BY 1 LIMIT 40"
+        )]
+        # Janela R201 avança (dias antes de days[5]), dois dias esvaziados e um alterado
+        conn.execute(f"DELETE FROM {config.TABLE_NAME} WHERE dt_notificacao < {days[5]}")
+        conn.execute(f"DELETE FROM {config.TABLE_NAME} WHERE dt_notificacao IN ({days[10]}, {days[20]})")
+        conn.execute(f"UPDATE {config.TABLE_NAME} SET teve_obito = 1 WHERE dt_notificacao = {days[30]}")
+        database.update_rollups(conn, [days[10], days[20], days[30]], cutoff_day=days[5])
+        query = f"SELECT * FROM {config.ROLLUP_TABLE} ORDER BY 1, 2, 3, 4"
+        delta = conn.execute(query).fetchall()
+        database.build_rollups(conn)
+        assert delta == conn.execute(query).fetchall()
+    finally:
+        conn.close()
+
+def test_snapshot_matches_sqlite(tmp_path, monkeypatch):
+    """Snapshot colunar (config.SNAPSHOT) e leitura do SQLite dão as mesmas métricas."""
+    monkeypatch.setattr(config, 'SNAPSHOT', True)
+    monkeypatch.setattr(config, 'DATA_DATABASE', tmp_path)
+    monkeypatch.setattr(config, 'DATABASE_PATH', tmp_path / "srag.db")
+    loader._write_transformed(benchmark_storage.synthetic_chunks(ROWS, seed=7))
+    cache.data_cache.clear()
+    assert loader.load_snapshot() is not None
+    columns = ['dt_notificacao', 'teve_obito', 'teve_uti', 'esta_vacinado']
+    from_snapshot = loader.load_from_sqlite(columns, compact=True)
+    monkeypatch.setattr(config, 'SNAPSHOT', False)
+    cache.data_cache.clear()
+    assert loader.load_snapshot() is None
+    from_sqlite = loader.load_from_sqlite(columns, compact=True)
+    assert metrics.calculate_all_metrics(from_snapshot) == metrics.calculate_all_metrics(from_sqlite)
+    cache.data_cache.clear()
@@ -0,0 +1,101 @@
+"""
+Paridade dos classificadores vetorizados (R102-R104) com as versões por linha.
+"""
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from agent.loader import (
+    classify_icu,
+    classify_icu_series,
+    classify_outcome,
+    classify_outcome_series,
+    classify_vaccination,
+    classify_vaccination_frame,
+    clean_date,
+    clean_date_series,
+)
+
+# Códigos válidos, float, texto, fora da faixa e ausentes
+CODES = [
+    1, 2, 3, 9, 0, -1, 7, 99,
+    1.0, 2.0, 3.0, 9.0, 1.9, 2.5, 99.0,
+    '1', '2', '3', '9', ' 2 ', '1.0', '2.0', 'x', '',
+    np.nan, None, pd.NA,
+]
+
+# Datas futuras relativas ao dia da execução (clean_date compara com datetime.now())
+TOMORROW = date.today() + timedelta(days=1)
+NEXT_YEAR = date.today().year + 1
+
+# DD/MM/YYYY e ISO, anos fora da faixa (< 2019 e futuros), inválidas, brancos e tipos mistos
+DATES = {
+    'ddmmyyyy': ['15/03/2020', '01/01/2019', '31/12/2018', '01/01/1900', '29/02/2020', '31/02/2021',
+                 TOMORROW.strftime('%d/%m/%Y'), f'01/01/{NEXT_YEAR}', '1/2/2021', '15-03-2020'],
+    'iso': ['2020-03-15', '2019-01-01', '2018-12-31', '1999-07-04', TOMORROW.isoformat(),
+            f'{NEXT_YEAR}-06-01', '2021-13-01', '2020-03-15 10:30:00', '20200315'],
+    'blank': ['', ' ', '   ', '\t', '\n', ' 15/03/2020 ', '15/03/2020 ', None],
+    'mixed': ['15/03/2020', '2020-03-15', datetime(2020, 3, 15, 8), pd.Timestamp('2018-05-01'),
+              date(2021, 1, 1), 20200315, 2020.0, True, np.nan, None, pd.NA, pd.NaT, 'x', ''],
+}
+
+def _as_python(series: pd.Series) -> list:
+    return [None if pd.isna(v) else bool(v) for v in series]
+
+@pytest.mark.parametrize('kind', DATES)
+def test_date_matches_row_wise(kind):
+    # Valores repetidos: o factorize espalha o resultado de cada distinto pelas linhas
+    series = pd.Series(DATES[kind] * 2, dtype=object)
+    assert clean_date_series(series).tolist() == series.apply(clean_date).tolist()
+
+@pytest.mark.parametrize('dtype', [object, 'float64'])
+def test_outcome_matches_row_wise(dtype):
+    values = CODES if dtype == object else [v for v in CODES if isinstance(v, (int, float))]
+    series = pd.Series(values, dtype=dtype)
+    expected = [classify_outcome(v) for v in series]
+    assert _as_python(classify_outcome_series(series)) == expected
+
+@pytest.mark.parametrize('dtype', [object, 'float64'])
+def test_icu_matches_row_wise(dtype):
+    values = CODES if dtype == object else [v for v in CODES if isinstance(v, (int, float))]
+    series = pd.Series(values, dtype=dtype)
+    expected = [classify_icu(v) for v in series]
+    assert _as_python(classify_icu_series(series)) == expected
+
+def test_vaccination_matches_row_wise():
+    # Doses sempre preenchidas ou como string vazia/None: sem NaN, onde as versões coincidem
+    doses = ['2021-05-01', '', None]
+    rows = [
+        {'DOSE_1_COV': d1, 'DOSE_2_COV': d2, 'VACINA': vacina}
+        for d1 in doses for d2 in doses for vacina in CODES
+    ]
+    df = pd.DataFrame(rows, dtype=object)
+    vaccinated, counts = classify_vaccination_frame(df)
+    expected = [classify_vaccination(row) for _, row in df.iterrows()]
+    assert _as_python(vaccinated) == [flag for flag, _ in expected]
+    assert counts.tolist() == [n for _, n in expected]
+    assert counts.dtype == np.int8
+
+def test_vaccination_without_columns():
+    df = pd.DataFrame({'OUTRA': [1, 2]})
+    vaccinated, counts = classify_vaccination_frame(df)
+    assert _as_python(vaccinated) == [None, None]
+    assert counts.tolist() == [0, 0]
+
+def test_vaccination_nan_dose_is_not_a_dose():
+    # Diferença documentada: a versão por linha compara com [None, np.nan, ''] por identidade,
+    # então um NaN vindo de coluna float/texto conta como dose. A regra R104 é "sem dose".
+    df = pd.DataFrame({
+        'DOSE_1_COV': pd.Series([float('nan'), '2021-05-01'], dtype=object),
+        'DOSE_2_COV': pd.Series([float('nan'), float('nan')], dtype=object),
+        'VACINA': [2.0, np.nan],
+    })
+    vaccinated, counts = classify_vaccination_frame(df)
+    assert _as_python(vaccinated) == [False, True]
+    assert counts.tolist() == [0, 1]
+
+    missing = float('nan')  # NaN que não é o objeto np.nan
+    assert classify_vaccination({'DOSE_1_COV': missing, 'DOSE_2_COV': missing, 'VACINA': 2.0}) == (True, 2)
+    assert classify_vaccination({'DOSE_1_COV': '2021-05-01', 'DOSE_2_COV': missing, 'VACINA': 2.0}) == (True, 2)
@@ -0,0 +1,152 @@
+"""
+Benchmark dos índices da tabela de casos (database.CASE_INDEXES)
+Roda a carga padrão de consultas (KPIs, histograma, janelas de datas, dia x UF,
+dia x desfechos e rollup) com EXPLAIN QUERY PLAN e latência mediana para cada
+conjunto de índices, sobre uma base sintética ou um banco existente.
+
+Uso: python -m utils.benchmark_queries --rows 1000000
+     python -m utils.benchmark_queries --db data/database/srag.db
+"""
+
+import sys
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import pandas as pd
+from pathlib import Path
+from statistics import median
+from typing import Dict, List, Tuple
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from agent import config, database
+from utils.benchmark_storage import build_database
+
+TABLE = config.TABLE_NAME
+
+# Conjuntos comparados: sem índices, o conjunto anterior (colunas isoladas) e o atual
+INDEX_SETS: Dict[str, dict] = {
+    'nenhum': {},
+    'legado': {
+        'idx_dt_notificacao': ['dt_notificacao'],
+        'idx_ano_mes': ['ano', 'mes'],
+        'idx_teve_obito': ['teve_obito'],
+        'idx_teve_uti': ['teve_uti'],
+        'idx_registro': ['registro_id', 'row_hash'],
+    },
+    'atual': database.CASE_INDEXES,
+}
+
+def workload(end_day: int) -> Dict[str, Tuple[str, tuple]]:
+    """Consultas padrão (formato das usadas por metrics/charts) com janelas terminando em end_day."""
+    last_30 = (end_day - 29, end_day)
+    return {
+        'kpis': (f"""
+            SELECT COALESCE(SUM(teve_obito), 0), COUNT(teve_obito),
+                   COALESCE(SUM(teve_uti), 0), COUNT(teve_uti),
+                   COALESCE(SUM(esta_vacinado), 0), COUNT(esta_vacinado)
+            FROM {TABLE}""", ()),
+        'histograma': (f"""
+            SELECT dt_notificacao, COUNT(*) FROM {TABLE}
+            WHERE dt_notificacao IS NOT NULL GROUP BY dt_notificacao""", ()),
+        'janela_30d': (f"SELECT COUNT(*) FROM {TABLE} WHERE dt_notificacao BETWEEN ? AND ?", last_30),
+        'dia_x_uf_30d': (f"""
+            SELECT dt_notificacao, uf_sigla, COUNT(*) FROM {TABLE}
+            WHERE dt_notificacao BETWEEN ? AND ? GROUP BY dt_notificacao, uf_sigla""", last_30),
+        'dia_x_desfecho_30d': (f"""
+            SELECT dt_notificacao, SUM(teve_obito), COUNT(teve_obito), SUM(teve_uti), COUNT(teve_uti),
+                   SUM(esta_vacinado), COUNT(esta_vacinado)
+            FROM {TABLE} WHERE dt_notificacao BETWEEN ? AND ? GROUP BY dt_notificacao""", last_30),
+        'obitos_uf': (f"SELECT uf_sigla, SUM(teve_obito) FROM {TABLE} WHERE teve_obito = 1 GROUP BY uf_sigla", ()),
+        'rollup': (database.rollup_select(), ()),
+    }
+
+def apply_index_set(conn: sqlite3.Connection, indexes: dict):
+    """Remove os índices da tabela de casos e cria o conjunto pedido."""
+    existing = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (TABLE,)
+    )]
+    for name in existing:
+        conn.execute(f"DROP INDEX {name}")
+    conn.execute("DROP TABLE IF EXISTS sqlite_stat1")
+    if indexes:
+        database.create_indexes(conn, indexes)
+    conn.commit()
+
+def query_plan(conn: sqlite3.Connection, sql: str, params: tuple) -> str:
+    """EXPLAIN QUERY PLAN em uma linha (passos separados por ' | ')."""
+    return ' | '.join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+
+def measure(conn: sqlite3.Connection, sql: str, params: tuple, repeat: int) -> float:
+    """Mediana em ms (consulta consumida até o fim)."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return median(timings)
+
+def index_size_mb(conn: sqlite3.Connection) -> float:
+    """Espaço ocupado pelos índices da tabela de casos (dbstat, quando disponível)."""
+    try:
+        row = conn.execute(
+            "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+            "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?)", (TABLE,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return float('nan')
+    return (row[0] or 0) / 1024 / 1024
+
+def benchmark(db_path: Path, repeat: int, sets: List[str]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Returns: (latências em ms por consulta x conjunto, planos por consulta x conjunto)"""
+    conn = sqlite3.connect(db_path)
+    try:
+        end_day = conn.execute(f"SELECT MAX(dt_notificacao) FROM {TABLE}").fetchone()[0]
+        queries = workload(end_day)
+        timings, plans = {}, {}
+        for name in sets:
+            start = time.perf_counter()
+            apply_index_set(conn, INDEX_SETS[name])
+            print(f"Índices '{name}': criados em {time.perf_counter() - start:.1f}s "
+                  f"({index_size_mb(conn):.0f} MB)")
+            timings[name] = {q: measure(conn, sql, params, repeat) for q, (sql, params) in queries.items()}
+            plans[name] = {q: query_plan(conn, sql, params) for q, (sql, params) in queries.items()}
+        # Deixa o banco com o conjunto de produção
+        if sets[-1] != 'atual':
+            apply_index_set(conn, INDEX_SETS['atual'])
+    finally:
+        conn.close()
+    return pd.DataFrame(timings).round(1), pd.DataFrame(plans)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help="registros da base sintética")
+    parser.add_argument('--db', type=Path, help="banco existente (copiado; o original não é alterado)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--sets', nargs='+', default=list(INDEX_SETS), choices=list(INDEX_SETS))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.db:
+            db_path = Path(tmp) / "srag.db"
+            shutil.copyfile(args.db, db_path)
+        else:
+            start = time.perf_counter()
+            db_path = build_database(Path(tmp), args.rows)
+            print(f"{args.rows:,} registros sintéticos: ingestão em {time.perf_counter() - start:.1f}s")
+
+        timings, plans = benchmark(db_path, args.repeat, args.sets)
+
+    print("\nLatência mediana (ms):")
+    print(timings.to_string())
+    print("\nEXPLAIN QUERY PLAN:")
+    for query, row in plans.iterrows():
+        print(f"\n[{query}]")
+        for name, plan in row.items():
+            print(f"  {name:>7}: {plan}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark dos backends de armazenamento do DatabaseTool (config.STORAGE_BACKEND)
+Gera uma base sintética no schema tipado e compara a latência das consultas
+de KPIs e de gráficos entre SQLite (rollups), SQLite sem rollup e DuckDB.
+
+Uso: python -m utils.benchmark_storage --rows 1000000 10000000
+"""
+
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from statistics import median
+from typing import Callable, Dict, Iterator
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from agent import cache, config, database, loader
+from agent.tools.database_tool import DatabaseTool
+
+CHUNK_ROWS = 500_000
+END_DATE = pd.Timestamp('2021-03-15')
+
+def synthetic_chunks(rows: int, seed: int = 0) -> Iterator[pd.DataFrame]:
+    """Chunks no formato de saída de loader.transform_data (13 meses até END_DATE)."""
+    rng = np.random.default_rng(seed)
+    ufs = np.array(list(config.UF_CODES))
+    for start in range(0, rows, CHUNK_ROWS):
+        n = min(CHUNK_ROWS, rows - start)
+        # Mais notificações nos meses recentes, como nos dumps DATASUS
+        offsets = np.minimum((rng.beta(2.0, 1.2, n) * 395).astype(int), 394)
+        dates = END_DATE - pd.to_timedelta(394 - offsets, unit='D')
+        evolucao = rng.choice([1.0, 2.0, 3.0, 9.0, np.nan], n, p=[.55, .25, .05, .05, .1])
+        uti = rng.choice([1.0, 2.0, 9.0, np.nan], n, p=[.3, .5, .1, .1])
+        vacina = rng.choice([1.0, 2.0, 9.0, np.nan], n, p=[.5, .3, .1, .1])
+        doses = np.where(vacina == 1, rng.integers(1, 4, n), 0)
+
+        yield pd.DataFrame({
+            'dt_notificacao': dates,
+            'dt_obito': pd.Series(dates).where(evolucao == 2),
+            'ano': dates.year,
+            'mes': dates.month,
+            'semana_epi': dates.isocalendar().week.to_numpy(),
+            'evolucao': evolucao,
+            'teve_obito': pd.array(np.where(np.isin(evolucao, [1, 2, 3]), evolucao != 1, None), dtype='boolean'),
+            'foi_uti': uti,
+            'teve_uti': pd.array(np.where(np.isin(uti, [1, 2]), uti == 1, None), dtype='boolean'),
+            'vacina_status': vacina,
+            'esta_vacinado': pd.array(np.where(np.isin(vacina, [1, 2]), vacina == 1, None), dtype='boolean'),
+            'doses_vacina': doses,
+            'idade': rng.integers(0, 101, n),
+            'sexo': rng.choice([1, 2, 9], n, p=[.48, .48, .04]),
+            'uf_sigla': rng.choice(ufs, n),
+            'municipio_cod': rng.integers(110000, 530000, n),
+            'registro_id': rng.integers(0, 2**62, n),
+            'row_hash': rng.integers(0, 2**62, n),
+            'arquivo_id': 1,
+            'ano_arquivo': 2021,
+        })
+
+@contextmanager
+def database_at(directory: Path) -> Iterator[Path]:
+    """Aponta config.DATA_DATABASE/DATABASE_PATH para directory e restaura os valores ao sair."""
+    previous = config.DATA_DATABASE, config.DATABASE_PATH
+    config.DATA_DATABASE = directory
+    config.DATABASE_PATH = directory / "srag.db"
+    try:
+        yield config.DATABASE_PATH
+    finally:
+        config.DATA_DATABASE, config.DATABASE_PATH = previous
+
+def build_database(directory: Path, rows: int) -> Path:
+    """Ingere a base sintética pelo writer único do loader (rollups, histograma e snapshot)."""
+    with database_at(directory) as db_path:
+        loader._write_transformed(synthetic_chunks(rows))
+    return db_path
+
+def measure(run: Callable[[], object], repeat: int) -> float:
+    """Mediana em ms, sem cache em processo entre as execuções."""
+    timings = []
+    for _ in range(repeat):
+        cache.data_cache.clear()
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return median(timings)
+
+def raw_sqlite_daily(db_path: Path) -> pd.DataFrame:
+    """Contagens diárias agregadas direto da tabela de casos (SQLite sem rollup)."""
+    conn = sqlite3.connect(db_path)
+    try:
+        query = database.daily_rollup_query(f"({database.rollup_select()})")
+        return database.decode_frame(pd.read_sql(query, conn))
+    finally:
+        conn.close()
+
+def benchmark(rows: int, repeat: int) -> pd.DataFrame:
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        db_path = build_database(Path(tmp), rows)
+        print(f"\n{rows:,} registros: ingestão em {time.perf_counter() - start:.1f}s")
+
+        results: Dict[str, Dict[str, float]] = {}
+        for name in ['sqlite', 'duckdb']:
+            tool = DatabaseTool(str(db_path), backend=name)
+            if tool.backend.name != name:
+                print(f"Backend '{name}' indisponível, ignorado.")
+                continue
+            if name == 'duckdb':
+                start = time.perf_counter()
+                tool.backend.daily_rollup()
+                print(f"DuckDB: espelho inicial em {time.perf_counter() - start:.1f}s")
+            results[name] = {
+                'kpis': measure(tool.get_all_metrics, repeat),
+                'grafico_diario': measure(tool.get_chart_data_daily, repeat),
+                'grafico_mensal': measure(tool.get_chart_data_monthly, repeat),
+            }
+
+        # Mesma agregação do DuckDB (casos -> contagens diárias) no SQLite, sem rollup
+        raw = measure(lambda: raw_sqlite_daily(db_path), repeat)
+        results['sqlite (sem rollup)'] = {'kpis': raw, 'grafico_diario': raw, 'grafico_mensal': raw}
+
+    return pd.DataFrame(results).T.round(1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        table = benchmark(rows, args.repeat)
+        print(f"Latência mediana (ms), {rows:,} registros:")
+        print(table.to_string())
+
+if __name__ == "__main__":
+    main()
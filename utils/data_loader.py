@@ -2,33 +2,34 @@
 import streamlit as st
 from datetime import datetime
 from agent.agent import SRAGAgent, config
-from agent import metrics, loader
+from agent import cache, charts, metrics, loader
+from agent.tools.database_tool import DatabaseTool
 from datetime import timedelta
 import pandas as pd
-from agent.metrics import get_effective_end_date
+from agent.metrics import effective_end_date_from_counts
 
-@st.cache_data(ttl=3600)  # Cache for 1 hour
 def load_metrics_data():
     """
-    Loads raw data and calculates metrics for the dashboard.
-    Using caching to improve performance (Review: P4).
+    Loads the daily rollup (day x UF) and calculates metrics for the dashboard.
+    Cached per database version, so reruns only hit SQLite after a new ingest.
+    """
+    return _load_metrics_data(cache.database_version(config.DATABASE_PATH))
+
+@st.cache_data(max_entries=4)  # Poucas versões recentes do banco
+def _load_metrics_data(db_version):
+    """
+    Cached body of load_metrics_data (Review: P4).
+    db_version (mtime, ingest generation) is only part of the cache key.
     """
     try:
-        # Load raw data from SQLite
-        df = loader.load_from_sqlite()
+        # Load pre-aggregated daily counts from SQLite (cost depends on days, not cases)
+        df = loader.load_daily_rollup(group_by=['uf_sigla'])
         
         if df.empty:
             return None, None
-            
-        # Standardize date column
-        date_column = 'dt_notificacao'
-        if date_column not in df.columns and 'DT_NOTIFIC' in df.columns:
-            df.rename(columns={'DT_NOTIFIC': date_column}, inplace=True)
-            
-        df[date_column] = pd.to_datetime(df[date_column], errors='coerce')
         
-        # Calculate key metrics using existing logic
-        all_metrics = metrics.calculate_all_metrics(df)
+        # Calculate key metrics from the rollup
+        all_metrics = metrics.calculate_all_metrics_from_daily(df, loader.load_effective_end_date())
         
         # Determine trends (simple logic for demo, could be more complex)
         # R201 already provides growth rate
@@ -42,22 +43,23 @@ def load_metrics_data():
 @st.cache_data(ttl=3600)
 def get_chart_data(df):
     """
-    Prepares data for Plotly charts.
+    Prepares data for Plotly charts from the daily rollup (day x UF).
     """
     if df is None or df.empty:
         return {}
-        
-    date_column = 'dt_notificacao'
+    
+    # National daily counts (summed over UFs)
+    all_days = df.groupby('dia')['casos'].sum()
     
     # --- Daily Data (Last 30 Days) ---
-    max_date = get_effective_end_date(df, date_column)
+    # P99.5 reference date stored at ingest (O(1)); older databases compute it from the counts
+    max_date = loader.load_effective_end_date()
+    if max_date is None:
+        max_date = effective_end_date_from_counts(all_days.index, all_days.values)
     current_min_date = max_date - timedelta(days=30)
     
-    daily_df = df[(df[date_column] >= current_min_date) & 
-                  (df[date_column] <= max_date)].copy()
-    
-    daily_counts = daily_df.groupby(daily_df[date_column].dt.date).size()
-    daily_counts.index = pd.to_datetime(daily_counts.index)
+    daily_counts = all_days[(all_days.index >= current_min_date) & 
+                            (all_days.index <= max_date)]
     
     # Calculate 7-day moving average
     moving_avg = daily_counts.rolling(window=7, center=True).mean()
@@ -80,10 +82,9 @@ def get_chart_data(df):
     
     # --- Monthly Data (Last 12 Months) ---
     # Using existing logic logic from charts.py adapted
-    df['month'] = df[date_column].dt.to_period('M')
     # Filter up to effective date
-    monthly_df = df[df[date_column] <= max_date].copy()
-    monthly_counts = monthly_df.groupby('month').size().sort_index().tail(12)
+    monthly_days = all_days[all_days.index <= max_date]
+    monthly_counts = monthly_days.groupby(monthly_days.index.to_period('M')).sum().sort_index().tail(12)
     
     monthly_data = {
         'months': [d.strftime('%m/%Y') for d in monthly_counts.index],
@@ -96,7 +97,7 @@ def get_chart_data(df):
     }
     
     # --- Geographic Data ---
-    geo_counts = df['uf_sigla'].value_counts().reset_index()
+    geo_counts = df.groupby('uf_sigla')['casos'].sum().sort_values(ascending=False).reset_index()
     geo_counts.columns = ['state', 'cases']
     
     geographic_data = geo_counts
@@ -107,6 +108,32 @@ def get_chart_data(df):
         'geographic': geographic_data
     }
 
+def load_chart_packs():
+    """
+    Small-multiples grids and per-group charts (PNG) for each breakdown in charts.PACK_DIMENSIONS.
+    Rendered in one parallel batch per breakdown; cached per database version and on disk by content.
+    """
+    db_version = cache.database_version(config.DATABASE_PATH)
+    packs = _load_chart_packs(db_version)
+    if not charts.charts_on_disk(packs):
+        # Imagens removidas pelo limite do cache de gráficos (CHART_CACHE_MAX_FILES): gera de novo
+        _load_chart_packs.clear()
+        packs = _load_chart_packs(db_version)
+    return packs
+
+@st.cache_data(max_entries=4)
+def _load_chart_packs(db_version):
+    if db_version is None:
+        return {}
+    try:
+        tool = DatabaseTool()
+        output_dir = config.OUTPUTS / "assets"
+        packs = {by: tool.generate_chart_pack(by, output_dir) for by in charts.PACK_DIMENSIONS}
+        return {by: pack for by, pack in packs.items() if pack}
+    except Exception as e:
+        st.error(f"Error rendering chart packs: {e}")
+        return {}
+
 def fetch_agent_analysis():
     """Calls the LangChain agent for new analysis."""
     agent = SRAGAgent()